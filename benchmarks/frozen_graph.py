@@ -0,0 +1,121 @@
+"""
+Compares the memory usage and traversal time of the object graph (#Node objects that reference
+their dependencies) with the #FrozenGraph that is created when the graph is finalized.
+
+    $ python benchmarks/frozen_graph.py --nodes 200000 --edges 1000000
+"""
+
+import argparse
+import gc
+import heapq
+import random
+import time
+import tracemalloc
+import typing as t
+
+from craftr.core.graph import BaseGraph, FrozenGraph, Node
+
+
+def _build_nodes(num_nodes: int, num_edges: int, seed: int) -> t.List[Node]:
+  rnd = random.Random(seed)
+  nodes = [Node(str(i), None, []) for i in range(num_nodes)]
+  for _ in range(num_edges):
+    a, b = rnd.randrange(num_nodes), rnd.randrange(num_nodes)
+    if a != b:
+      nodes[max(a, b)].dependencies.append(nodes[min(a, b)])
+  return nodes
+
+
+def _measure_memory(func: t.Callable[[], t.Any]) -> t.Tuple[t.Any, int]:
+  gc.collect()
+  tracemalloc.start()
+  try:
+    result = func()
+    return result, tracemalloc.get_traced_memory()[0]
+  finally:
+    tracemalloc.stop()
+
+
+def _measure_time(func: t.Callable[[], t.Any], repeat: int) -> float:
+  durations = []
+  for _ in range(repeat):
+    tstart = time.perf_counter()
+    func()
+    durations.append(time.perf_counter() - tstart)
+  return min(durations)
+
+
+def _object_order(graph: BaseGraph, dependents: t.Dict[str, t.List[Node]]) -> t.List[Node]:
+  nodes = list(graph._nodes.values())
+  index = {node.id: i for i, node in enumerate(nodes)}
+  pending = {node.id: len(set(dep.id for dep in graph.dependencies_of(node))) for node in nodes}
+  ready = [index[node.id] for node in nodes if pending[node.id] == 0]
+  result = []
+  while ready:
+    node = nodes[heapq.heappop(ready)]
+    result.append(node)
+    for dependent in dependents[node.id]:
+      pending[dependent.id] -= 1
+      if pending[dependent.id] == 0:
+        heapq.heappush(ready, index[dependent.id])
+  return result
+
+
+def _object_reachable(graph: BaseGraph, dependents: t.Dict[str, t.List[Node]], start: t.List[Node]) -> t.Set[str]:
+  seen: t.Set[str] = set()
+  stack = list(start)
+  while stack:
+    node = stack.pop()
+    if node.id not in seen:
+      seen.add(node.id)
+      stack += dependents[node.id]
+  return seen
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--nodes', type=int, default=200_000)
+  parser.add_argument('--edges', type=int, default=1_000_000)
+  parser.add_argument('--repeat', type=int, default=3)
+  parser.add_argument('--seed', type=int, default=0)
+  args = parser.parse_args()
+
+  def _object_graph() -> t.Tuple[BaseGraph, t.Dict[str, t.List[Node]]]:
+    graph: BaseGraph = BaseGraph()
+    for node in _build_nodes(args.nodes, args.edges, args.seed):
+      graph._nodes[node.id] = node
+    dependents: t.Dict[str, t.List[Node]] = {node_id: [] for node_id in graph._nodes}
+    for node in graph._nodes.values():
+      for dep in {dep.id: dep for dep in graph.dependencies_of(node)}.values():
+        dependents[dep.id].append(node)
+    return graph, dependents
+
+  (graph, dependents), object_memory = _measure_memory(_object_graph)
+  frozen, frozen_memory = _measure_memory(lambda: FrozenGraph.from_graph(graph))
+
+  rnd = random.Random(args.seed)
+  start = rnd.sample(list(graph._nodes.values()), max(1, args.nodes // 100))
+  start_ids = [frozen.index[node.id] for node in start]
+
+  def _frozen_order() -> None:
+    frozen._order = None
+    frozen.execution_order()
+
+  timings = [
+    ('execution order', _measure_time(lambda: _object_order(graph, dependents), args.repeat),
+      _measure_time(_frozen_order, args.repeat)),
+    ('reachable dependents', _measure_time(lambda: _object_reachable(graph, dependents, start), args.repeat),
+      _measure_time(lambda: frozen.reachable(start_ids, dependents=True), args.repeat)),
+  ]
+
+  assert len(_object_reachable(graph, dependents, start)) == len(frozen.reachable(start_ids, dependents=True))
+
+  print(f'{len(frozen)} nodes, {len(frozen.dependencies.targets)} edges')
+  print(f'{"":24}{"objects":>12}{"frozen":>12}')
+  print(f'{"memory (MiB)":24}{object_memory / 2 ** 20:12.1f}{frozen_memory / 2 ** 20:12.1f}')
+  for name, object_time, frozen_time in timings:
+    print(f'{name + " (s)":24}{object_time:12.3f}{frozen_time:12.3f}')
+
+
+if __name__ == '__main__':
+  main()
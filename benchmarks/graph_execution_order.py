@@ -0,0 +1,59 @@
+"""
+Measures how the time to compute the execution order of a graph grows with the number of edges.
+The graphs have four edges per node, and every other node is part of a linear group. The time per
+edge should stay about the same for all sizes.
+
+    $ python benchmarks/graph_execution_order.py --edges 250000 500000 1000000
+"""
+
+import argparse
+import random
+import time
+import typing as t
+
+from craftr.core.graph import BaseGraph, Node, NodeGroup
+
+
+def _random_graph(num_nodes: int, num_edges: int, seed: int) -> BaseGraph:
+  rnd = random.Random(seed)
+  graph: BaseGraph = BaseGraph()
+  nodes = [Node(str(i), None, []) for i in range(num_nodes)]
+  group = NodeGroup('chain', [], [], linear=True)
+  graph.add(group)
+  for i, node in enumerate(nodes):
+    graph.add(node, group if i % 2 == 0 else None)
+  for _ in range(num_edges - num_nodes // 2):
+    a, b = rnd.randrange(num_nodes), rnd.randrange(num_nodes)
+    if a != b:
+      nodes[max(a, b)].dependencies.append(nodes[min(a, b)])
+  graph.finalize()
+  return graph
+
+
+def _measure(num_edges: int, repeat: int, seed: int) -> float:
+  durations: t.List[float] = []
+  for _ in range(repeat):
+    graph = _random_graph(num_edges // 4, num_edges, seed)
+    tstart = time.perf_counter()
+    order = graph.execution_order()
+    durations.append(time.perf_counter() - tstart)
+  position = {node.id: i for i, node in enumerate(order)}
+  assert all(position[dep.id] < position[node.id] for node in order for dep in graph.dependencies_of(node))
+  return min(durations)
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--edges', type=int, nargs='+', default=[250_000, 500_000, 1_000_000])
+  parser.add_argument('--repeat', type=int, default=3)
+  parser.add_argument('--seed', type=int, default=0)
+  args = parser.parse_args()
+
+  print(f'{"edges":>12}{"time (s)":>12}{"ns/edge":>12}')
+  for num_edges in args.edges:
+    duration = _measure(num_edges, args.repeat, args.seed)
+    print(f'{num_edges:12}{duration:12.3f}{duration / num_edges * 1e9:12.1f}')
+
+
+if __name__ == '__main__':
+  main()
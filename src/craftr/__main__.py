@@ -1,5 +1,6 @@
-
 import argparse
+import sys
+import typing as t
 from pathlib import Path
 
 from craftr.core.context import Context
@@ -14,26 +15,112 @@ parser.add_argument('tasks', metavar='task', nargs='*')
 parser.add_argument('-v', '--verbose', action='store_true',
   help='Enable verbose mode (like -Ocraftr.core.verbose=true).')
 parser.add_argument('-l', '--list', action='store_true', help='List all tasks.')
+parser.add_argument('--emit-ninja', metavar='FILE', type=Path,
+  help='Write a Ninja build file for the selected tasks instead of executing them. Run Ninja from '
+       'the current directory (ninja -f FILE).')
+parser.add_argument('--configuration-cache', action='store_true',
+  help='Restore the projects from the configuration cache instead of running the build scripts if '
+       'they did not change (like -Ocore.configuration_cache=true).')
+parser.add_argument('--explain', action='store_true',
+  help='Print why each task is outdated and how long it took to check (like -Ocore.explain=true).')
+parser.add_argument('--affected-by', metavar='FILE', nargs='+',
+  help='Print the tasks that must be executed again if the specified files changed, and the tasks '
+       'depending on them, instead of running a build.')
+parser.add_argument('--gc-metadata', action='store_true',
+  help='Remove the metadata of tasks and files that no longer exist, instead of running a build.')
+parser.add_argument('-j', '--jobs', type=int, metavar='N',
+  help='Execute up to N tasks concurrently (like -Ocore.jobs=N).')
+parser.add_argument('-w', '--watch', action='store_true',
+  help='Keep running and execute the tasks whose input files changed, and the tasks depending on them.')
+parser.add_argument('--daemon', action='store_true',
+  help='Run the build in a background process that keeps the projects loaded between invocations. '
+       'The process is started if it is not already running.')
+parser.add_argument('--stop-daemon', action='store_true', help='Stop the background process.')
 
 
-def main():
-  args = parser.parse_args()
-
+def load_settings(args: argparse.Namespace) -> Settings:
   settings = Settings.from_file(Path(args.settings_file))
   settings.update(Settings.parse(args.option))
   if args.verbose:
     settings.set('craftr.core.verbose', True)
+  if args.configuration_cache:
+    settings.set('core.configuration_cache', True)
+  if args.explain:
+    settings.set('core.explain', True)
+  if args.jobs is not None:
+    settings.set('core.jobs', args.jobs)
+  return settings
+
 
-  context = Context(settings=settings)
-  project = context.load_project(Path.cwd())
+def run(args: argparse.Namespace, argv: t.List[str], context: Context) -> None:
+  """
+  Runs the command specified by *args* with a *context* that has the root project loaded.
+  """
+
+  assert context.root_project is not None
 
   if args.list:
-    for task in project.tasks.all():
+    for task in context.root_project.tasks.all():
       print(task.path)
     return
 
+  if args.watch:
+    context.watch(args.tasks or None, settings_file=args.settings_file)
+    return
+
+  if args.affected_by:
+    for task_path in context.affected_tasks(args.affected_by):
+      print(task_path)
+    return
+
+  if args.gc_metadata:
+    print(context.collect_metadata_garbage().describe())
+    return
+
+  if args.emit_ninja:
+    regenerate_command = [x for x in argv if x != '--daemon']
+    context.emit_ninja(args.emit_ninja, args.tasks or None, regenerate_command, args.settings_file)
+    return
+
   context.execute(args.tasks or None)
 
 
+def main(argv: t.Optional[t.List[str]] = None) -> None:
+  argv = sys.argv[1:] if argv is None else argv
+  args = parser.parse_args(argv)
+
+  if args.daemon and args.watch:
+    parser.error('--watch cannot be combined with --daemon')
+
+  if args.daemon or args.stop_daemon:
+    from craftr.daemon import get_socket_path, run_client, stop_daemon
+    socket_path = get_socket_path(load_settings(args), Path.cwd())
+    if args.stop_daemon:
+      stop_daemon(socket_path)
+      return
+    sys.exit(run_client(socket_path, argv))
+
+  if args.affected_by and not (args.list or args.watch):
+    # A current index answers the query without loading the projects.
+    index = Context(settings=load_settings(args)).load_affected_index(Path.cwd())
+    if index is not None:
+      for task_path in index.affected_by(args.affected_by):
+        print(task_path)
+      return
+
+  while True:
+    context = Context(settings=load_settings(args))
+    context.load_project(Path.cwd())
+    try:
+      run(args, argv, context)
+    except KeyboardInterrupt:
+      if not args.watch:
+        raise
+      return
+    if not args.watch:
+      return
+    print('> Build scripts changed, reloading', flush=True)
+
+
 if __name__ == '__main__':
   main()
@@ -22,6 +22,7 @@ class DslProjectLoader(ProjectLoader):
   def load_project(self, context: Context, parent: t.Optional[Project], path: Path) -> Project:
     if (filename := path / BUILD_SCRIPT_FILENAME).exists():
       project = Project(context, parent, path)
+      project.build_script = filename
       context.initialize_project(project)
       scope = {'__file__': str(filename), '__name__': project.name}
       Closure(None, None, project, context_factory).run_code(filename.read_text(), str(filename), scope=scope)
@@ -12,10 +12,11 @@ from pathlib import Path
 
 import typing_extensions as te
 
-from craftr.core.graph import Graph
+from craftr.core.graph import BaseGraph, Node
 
 from craftr.build.lib import IExecutableProvider, ExecutableInfo, INativeLibProvider, NativeLibInfo
-from craftr.core import Action, HavingProperties, Property, ListProperty, Settings, PropertiesTask, Project
+from craftr.core import Action, ActionContext, HavingProperties, Property, ListProperty, Settings, PropertiesTask, Project
+from craftr.core.base import ACTION_METADATA_NAMESPACE
 from craftr.core.impl.actions.CommandAction import CommandAction
 from craftr.core.impl.actions.CreateDirectoryAction import CreateDirectoryAction
 from .namingscheme import NamingScheme
@@ -126,21 +127,28 @@ class CompileTask(PropertiesTask, Props, IExecutableProvider, INativeLibProvider
       else: assert False, self.produces
     super().finalize()
 
-  # Task
-  def get_actions(self, graph: Graph[Action]) -> t.List[Action]:
-    # Collect native libs from dependencies.
+  def _get_compile_actions(self, flags: t.List[str]) -> t.List[CommandAction]:
+    actions = []
+    for source_file, object_file in zip(map(str, self.sources.get()), self._get_objects_paths()):
+      language = self.language.or_else_get(lambda: self._detect_language(source_file))
+      depfile = str(object_file.with_suffix('.d'))
+      compile_command = [self._get_compiler(language)] + flags + ['-MMD', '-MF', depfile, '-c', source_file, '-o', str(object_file)]
+      actions.append(CommandAction(
+        command=compile_command, input_files=[source_file], output_files=[str(object_file)], depfile=depfile))
+    return actions
+
+  def _get_native_deps(self) -> t.List[NativeLibInfo]:
     # TODO(nrosenstein): Transitive dependencies?
     native_deps: t.List[NativeLibInfo] = self.libs.or_else([])[:]
-    for dep in self.get_dependencies():
+    for dep in self.dependencies:
       if isinstance(dep, INativeLibProvider):
         info = dep.get_native_lib_info()
         if info is not None:
           native_deps.append(info)
+    return native_deps
 
-    # Collect the include paths.
+  def _get_compile_flags(self, native_deps: t.List[NativeLibInfo]) -> t.List[str]:
     include_paths = self.include_paths.or_else([]) + self.public_include_paths.or_else([])
-
-    # Generate the compiler flags.
     flags: t.List[str] = self.build_options.or_else([])[:]
     if self.produces.get() == ProductType.SHARED_LIBRARY:
       flags += ['-shared', '-fPIC']
@@ -149,29 +157,51 @@ class CompileTask(PropertiesTask, Props, IExecutableProvider, INativeLibProvider
     for ndep in native_deps:
       flags += ['-I' + x for x in ndep.include_paths]
       flags += ['-D' + x for x in ndep.defines]
+    return flags
+
+  # Task
+  def explain_outdated(self) -> t.Optional[str]:
+    """
+    In addition to the checks of #PropertiesTask, the task is outdated if any of its object files
+    is, e.g. because a header listed in the depfile of the compiler changed.
+    """
+
+    reason = super().explain_outdated()
+    if reason is not None:
+      return reason
+    build_context = self.project.context
+    context = ActionContext(
+      verbose=False,
+      metadata=build_context.metadata_store.namespace(ACTION_METADATA_NAMESPACE),
+      digests=build_context.file_digests)
+    for action in self._get_compile_actions(self._get_compile_flags(self._get_native_deps())):
+      if action.is_outdated(context):
+        return f'object file {action.output_files[0]!r} is outdated'
+    return None
 
-    create_directories = graph.create_sequential_group('create_directories')
-    create_directories.add(
-      CreateDirectoryAction(self._get_preferred_output_directory()),
-      CreateDirectoryAction(self._get_objects_output_directory()))
+  # DefaultTask
+  def get_actions(self, graph: BaseGraph[Action]) -> None:
+    native_deps = self._get_native_deps()
+    flags = self._get_compile_flags(native_deps)
 
-    compile_object_files = graph.create_group('compile_object_files')
-    compile_object_files.depends_on(create_directories)
+    create_directories = Node('create_directories', CreateDirectoryAction(self._get_objects_output_directory()), [])
+    graph.add(create_directories)
 
     # Generate actions to compile object files.
-    languages: t.Set[Language] = set()
     object_files = self._get_objects_paths()
-    for source_file, object_file in zip(map(str, self.sources.get()), object_files):
-      language = self.language.or_else_get(lambda: self._detect_language(source_file))
-      compiler = self._get_compiler(language)
-      compile_command = [compiler] + flags + ['-c', source_file, '-o', str(object_file)]
-      compile_object_files.add(CommandAction(command=compile_command))
-      languages.add(language)
+    compile_nodes = []
+    for action in self._get_compile_actions(flags):
+      node = Node(f'compile:{action.output_files[0]}', action, [create_directories])
+      graph.add(node)
+      compile_nodes.append(node)
 
     # Generate the archive or link action.
     if self.produces.get() == ProductType.STATIC_LIBRARY:
-      archive_command = ['ar', 'rcs', str(self._get_library_path())] + list(map(str, self._get_objects_paths()))
-      actions.append(CommandAction(command=archive_command))
+      archive_command = ['ar', 'rcs', str(self._get_library_path())] + list(map(str, object_files))
+      graph.add(Node('archive', CommandAction(
+        command=archive_command,
+        input_files=list(map(str, object_files)),
+        output_files=[str(self._get_library_path())]), compile_nodes))
 
     elif self.produces.get() != ProductType.OBJECTS:
       if self.produces.get() == ProductType.EXECUTABLE:
@@ -179,14 +209,17 @@ class CompileTask(PropertiesTask, Props, IExecutableProvider, INativeLibProvider
       elif self.produces.get() == ProductType.SHARED_LIBRARY:
         product_filename = self._get_library_path()
       else: assert False, self.produces.get()
+      languages = {self.language.or_else_get(lambda: self._detect_language(str(x))) for x in self.sources.get()}
+      compiler = self._get_compiler(Language.CPP if Language.CPP in languages else Language.C)
       static_libs = [y for x in native_deps for y in x.library_files]
       for ndep in native_deps:
         flags += ['-L' + x for x in ndep.library_search_paths]
         flags += ['-l' + x for x in ndep.library_names]
       linker_command = [compiler] + flags + list(map(str, object_files)) + static_libs + ['-o', str(product_filename)]
-      actions.append(CommandAction(command=linker_command))
-
-    return actions
+      graph.add(Node('link', CommandAction(
+        command=linker_command,
+        input_files=list(map(str, object_files)) + static_libs,
+        output_files=[str(product_filename)]), compile_nodes))
 
 
 class PkgConfigError(Exception):
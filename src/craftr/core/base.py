@@ -4,6 +4,7 @@ Core classes for the Craftr build framework.
 """
 
 import abc
+import asyncio
 import dataclasses
 import typing as t
 from pathlib import Path
@@ -11,19 +12,37 @@ from pathlib import Path
 from .graph import Node, Graph
 
 if t.TYPE_CHECKING:
+  from nr.caching.api import KeyValueStore
   from .context import Context
   from .graph import Graph
   from .project import Project
   from .settings import Settings
+  from .util.digests import FileDigestCache
+  from .util.jobserver import Jobserver
 
 T = t.TypeVar('T')
 T_TaskOrAction = t.TypeVar('T_TaskOrAction', bound=t.Union['Action', 'Task'])
 
+#: The namespace in the metadata store that backs #ActionContext.metadata.
+ACTION_METADATA_NAMESPACE = 'action-metadata'
+
+#: The namespace in the metadata store in which executors record how long tasks and actions took.
+TASK_DURATION_NAMESPACE = 'task-durations'
+
 
 @dataclasses.dataclass
 class ActionContext:
   verbose: bool
 
+  #: The jobserver that child processes should draw additional job tokens from.
+  jobserver: t.Optional['Jobserver'] = None
+
+  #: A store in which actions can keep state between builds, e.g. to check if they are up to date.
+  metadata: t.Optional['KeyValueStore'] = None
+
+  #: A cache for the digests of input files.
+  digests: t.Optional['FileDigestCache'] = None
+
 
 @dataclasses.dataclass
 class Action:
@@ -34,6 +53,27 @@ class Action:
   @abc.abstractmethod
   def execute(self, context: ActionContext) -> None: ...
 
+  def is_outdated(self, context: ActionContext) -> bool:
+    """
+    Returns #True if the action needs to be executed. The default implementation always returns
+    #True.
+    """
+
+    return True
+
+  def complete(self, context: ActionContext) -> None:
+    """
+    Called after the action was executed successfully.
+    """
+
+  async def execute_async(self, context: ActionContext) -> None:
+    """
+    Execute the action from an asyncio event loop. The default implementation runs #execute() in
+    the loop's default thread pool executor.
+    """
+
+    await asyncio.get_running_loop().run_in_executor(None, self.execute, context)
+
 
 class Task(Node['Task']):
 
@@ -54,12 +94,24 @@ class Task(Node['Task']):
   @abc.abstractmethod
   def is_outdated(self) -> bool: ...
 
+  def explain_outdated(self) -> t.Optional[str]:
+    """
+    Returns a description of why the task is outdated, or #None if it is up to date. The default
+    implementation does not know the reason and only reports the result of #is_outdated().
+    """
+
+    return 'the task reported that it is outdated' if self.is_outdated() else None
+
   @abc.abstractmethod
   def complete(self) -> None: ...
 
   def get_node_id(self) -> str:
     return self.path
 
+  def __craftr_fingerprint__(self) -> str:
+    # A task that is referenced by the properties of another task is identified by its path.
+    return self.path
+
 
 class TaskSelector(abc.ABC):
 
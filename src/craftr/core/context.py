@@ -1,15 +1,28 @@
-
+import hashlib
+import os
+import sys
+import threading
 import typing as t
 from pathlib import Path
 
 from nr.caching.api import NamespaceStore
 from nr.preconditions import check_not_none
 
-from craftr.core.base import GraphExecutor, PluginLoader, ProjectLoader, Task, TaskSelector
-from craftr.core.graph import Graph
+import craftr
+from craftr.core.base import GraphExecutor, Plugin, PluginLoader, ProjectLoader, Task, TaskSelector
+from craftr.core.graph import BaseGraph
 from craftr.core.project import Project
 from craftr.core.settings import Settings
-from craftr.core.util.caching import JsonDirectoryStore
+from craftr.core.util.caching import BufferedKeyValueStore, JsonDirectoryStore, LogDirectoryStore, SqliteNamespaceStore
+from craftr.core.util.digests import FILE_DIGEST_NAMESPACE, FileDigestCache, check_hash_algorithm
+from craftr.core.util.fingerprint import fingerprint
+from craftr.core.util.snapshot import DIRECTORY_LISTING_NAMESPACE, FileSystemSnapshot
+
+if t.TYPE_CHECKING:
+  from craftr.core.util.affected import AffectedIndex
+  from craftr.core.util.configuration_cache import ConfigurationCache
+  from craftr.core.util.metadata_gc import GcReport
+  from craftr.core.util.watch import FileWatcher
 
 
 class Context:
@@ -20,15 +33,33 @@ class Context:
   # Supported Settings
 
   * `core.build_directory` (no default)
-  * `core.executor` (defaults to `craftr.core.impl.DefaultTaskGraphExecutor:DefaultTaskGraphExecutor`)
+  * `core.configuration_cache` (defaults to `false`; if enabled, the configuration of the projects
+    is cached and restored by #load_project() without running the build scripts if none of them
+    changed, see #craftr.core.util.configuration_cache)
+  * `core.digests.exclude` (a comma-separated list of patterns for files that are ignored when a
+    directory is hashed as a task or action input, e.g. `__pycache__/,*.pyc`)
+  * `core.executor` (defaults to `craftr.core.impl.DefaultTaskGraphExecutor:DefaultTaskGraphExecutor`, or to
+    `craftr.core.impl.ParallelTaskGraphExecutor:ParallelTaskGraphExecutor` if `core.jobs` or `core.remote.workers`
+    is set)
+  * `core.gc_metadata` (defaults to `false`; if enabled, stale entries are removed from the
+    metadata store in the background after every successful build, see #collect_metadata_garbage();
+    the sweep does not keep the process alive and is abandoned if it exits first)
+  * `core.hash_algorithm` (defaults to `sha1`, can be any algorithm supported by #hashlib, e.g. `blake2b`)
+  * `core.jobs` (no default)
+  * `core.metadata_store` (either `json`, `sqlite` or `log`, defaults to `json`; the `sqlite` and
+    `log` stores are faster for large builds, as they do not rewrite the whole namespace on every
+    write)
+  * `core.remote.workers` (no default)
   * `core.task_selector` (defaults to `craftr.core.impl.DefaultTaskSelector:DefaultTaskSelector`)
   """
 
   DEFAULT_EXECUTOR = 'craftr.core.impl.DefaultTaskGraphExecutor:DefaultTaskGraphExecutor'
+  PARALLEL_EXECUTOR = 'craftr.core.impl.ParallelTaskGraphExecutor:ParallelTaskGraphExecutor'
   DEFAULT_PLUGIN_LOADER = 'craftr.core.impl.DefaultPluginLoader:DefaultPluginLoader'
   DEFAULT_SELECTOR = 'craftr.core.impl.DefaultTaskSelector:DefaultTaskSelector'
   DEFAULT_PROJECT_LOADER = 'craftr.core.impl.ChainingProjectLoader:ChainingProjectLoader'
   CRAFTR_SETTINGS_FILE = Path('build.settings')
+  METADATA_STORE_TYPES = ('json', 'sqlite', 'log')
 
   def __init__(
     self, *,
@@ -43,40 +74,184 @@ class Context:
     elif settings is None:
       settings = Settings.of({})
 
+    default_executor = self.DEFAULT_EXECUTOR
+    if settings.get('core.jobs', None) is not None or settings.get('core.remote.workers', None) is not None:
+      default_executor = self.PARALLEL_EXECUTOR
+
     self._root_project: t.Optional[Project] = None
     self.settings = settings
     self.executor = executor or settings.get_instance(
-        GraphExecutor, 'core.executor', self.DEFAULT_EXECUTOR)  # type: ignore
+        GraphExecutor, 'core.executor', default_executor)  # type: ignore
     self.plugin_loader = plugin_loader or settings.get_instance(
         PluginLoader, 'core.plugin.loader', self.DEFAULT_PLUGIN_LOADER)  # type: ignore
     self.project_loader = project_loader or settings.get_instance(
         ProjectLoader, 'core.project.loader', self.DEFAULT_PROJECT_LOADER)  # type: ignore
     self.task_selector = self.settings.get_instance(
         TaskSelector, 'core.task_selector', self.DEFAULT_SELECTOR)  # type: ignore
-    self.graph = Graph[Task]()
+    self.graph = self.create_graph()
+    self.hash_algorithm = check_hash_algorithm(settings.get('core.hash_algorithm', 'sha1'))
+    self.metadata_store_type = settings.get('core.metadata_store', 'json')
+    if self.metadata_store_type not in self.METADATA_STORE_TYPES:
+      raise ValueError(f'invalid core.metadata_store: {self.metadata_store_type!r}')
+    self._lock = threading.Lock()
     self._metadata_store: t.Optional[NamespaceStore] = None
+    self._task_hashes: t.Optional[BufferedKeyValueStore] = None
+    self._file_digests: t.Optional[FileDigestCache] = None
+    self._file_snapshot: t.Optional[FileSystemSnapshot] = None
+    self._configuration_inputs: t.Optional[t.Dict[str, t.Any]] = None
+    self._gc_thread: t.Optional[threading.Thread] = None
+
+    #: The plugins that were applied to any of the projects, by name.
+    self.applied_plugins: t.Dict[str, Plugin] = {}
+
+  @property
+  def metadata_directory(self) -> Path:
+    """
+    The directory in which the metadata store and other state that is kept between builds is
+    saved, in the build directory of the root project.
+    """
+
+    assert self.root_project, 'Context.root_project is not set'
+    return self.get_default_build_directory(self.root_project) / '.craftr-metadata'
 
   @property
   def metadata_store(self) -> NamespaceStore:
     if self._metadata_store is None:
-      assert self.root_project, 'Context.root_project is not set'
-      self._metadata_store = JsonDirectoryStore(
-        str(self.get_default_build_directory(self.root_project) / '.craftr-metadata'), create_dir=True)
+      directory = self.metadata_directory
+      if self.metadata_store_type == 'sqlite':
+        self._metadata_store = SqliteNamespaceStore(str(directory / 'metadata.sqlite3'))
+      elif self.metadata_store_type == 'log':
+        self._metadata_store = LogDirectoryStore(str(directory), create_dir=True)
+      else:
+        self._metadata_store = JsonDirectoryStore(str(directory), create_dir=True)
     return self._metadata_store
 
+  def flush_metadata(self) -> None:
+    """
+    Writes the task hashes, the file digests and any pending writes of the metadata store. Called
+    by the executors at the end of a build.
+    """
+
+    if self._task_hashes is not None:
+      self._task_hashes.flush()
+    if self._file_digests is not None:
+      self._file_digests.flush()
+    if isinstance(self._metadata_store, (SqliteNamespaceStore, LogDirectoryStore)):
+      self._metadata_store.flush()
+
+  @property
+  def task_hashes(self) -> BufferedKeyValueStore:
+    """
+    The state of every task after it was last executed (see #PropertiesTask), shared by all tasks.
+    Tasks may complete concurrently, so the hashes are collected in memory and written to the
+    metadata store by #flush_metadata().
+    """
+
+    from craftr.core.impl.PropertiesTask import TASK_HASH_NAMESPACE
+
+    with self._lock:
+      if self._task_hashes is None:
+        self._task_hashes = BufferedKeyValueStore(self.metadata_store.namespace(TASK_HASH_NAMESPACE))
+      return self._task_hashes
+
+  @property
+  def file_digests(self) -> FileDigestCache:
+    """
+    The digests of the input files of tasks and actions. The digests are shared by all tasks and
+    kept in the metadata store. Executors call #FileDigestCache.flush() at the end of a build.
+    """
+
+    if self._file_digests is None:
+      exclude = [x.strip() for x in self.settings.get('core.digests.exclude', '').split(',') if x.strip()]
+      self._file_digests = FileDigestCache(
+        self.metadata_store.namespace(FILE_DIGEST_NAMESPACE), self.hash_algorithm, exclude)
+    return self._file_digests
+
+  @property
+  def file_snapshot(self) -> FileSystemSnapshot:
+    """
+    The snapshot of the file system that #Project.glob() is answered from. Directory listings are
+    kept in the metadata store and written after the projects were loaded.
+    """
+
+    if self._file_snapshot is None:
+      self._file_snapshot = FileSystemSnapshot(self.metadata_store.namespace(DIRECTORY_LISTING_NAMESPACE))
+    return self._file_snapshot
+
   @property
   def root_project(self) -> t.Optional[Project]:
     return self._root_project
 
+  @property
+  def configuration_inputs(self) -> t.Dict[str, t.Any]:
+    """
+    The inputs that the configuration of the loaded projects was created from, as they were when
+    the projects were loaded (see #craftr.core.util.configuration_cache.get_inputs()). This includes
+    the directories that were listed by #Project.glob() since. If the projects were restored from
+    the configuration cache, these are the inputs that were stored with it.
+    """
+
+    inputs = check_not_none(self._configuration_inputs, 'no root project loaded')
+    directories = dict(inputs['directories'])
+    if self._file_snapshot is not None:
+      directories.update(self._file_snapshot.listed_directories())
+    return {'files': inputs['files'], 'directories': directories}
+
+  def _get_metadata_directory(self, path: Path) -> Path:
+    # Returns the #metadata_directory of the root project in *path* before it is loaded. Its build
+    # directory is derived like in #get_default_build_directory().
+    build_directory = self.settings.get('core.build_directory', None)
+    return (Path(build_directory) if build_directory else path / '.build') / '.craftr-metadata'
+
+  def _get_configuration_cache(self, path: Path) -> 'ConfigurationCache':
+    from craftr.core.util.configuration_cache import CONFIGURATION_CACHE_FILENAME, ConfigurationCache
+
+    state = {
+      'craftr': craftr.__version__,
+      'python': sys.version,
+      'path': str(path.absolute()),
+      'settings': {key: self.settings[key] for key in self.settings},
+    }
+    filename = self._get_metadata_directory(path) / CONFIGURATION_CACHE_FILENAME
+    return ConfigurationCache(filename, hashlib.sha1(fingerprint(state)).hexdigest())
+
   def load_project(self, path: Path) -> Project:
     """
-    Initialize the root project and return it.
+    Initialize the root project and return it. If `core.configuration_cache` is enabled, the
+    projects are restored from the cache if possible, otherwise all projects are finalized after
+    their build scripts were executed and their configuration is stored in the cache.
     """
 
+    from craftr.core.util.configuration_cache import PICKLE_ERRORS, get_inputs
+
+    cache = self._get_configuration_cache(path) if self.settings.get_bool('core.configuration_cache', False) else None
+    project = cache.load(self) if cache is not None else None
+    if project is not None:
+      self._root_project = project
+      self._configuration_inputs = cache.inputs
+      return project
+
     project = self.project_loader.load_project(self, None, path)
     self._root_project = project
+    self._configuration_inputs = get_inputs(self)
+    if cache is not None:
+      project.finalize()
+      try:
+        cache.save(self, project)
+      except PICKLE_ERRORS as exc:
+        print(f'> Configuration cache not stored: {exc}', file=sys.stderr, flush=True)
+    if self._file_snapshot is not None:
+      self._file_snapshot.flush()
     return project
 
+  def create_graph(self) -> BaseGraph[Task]:
+    """
+    Returns a new graph for the tasks to execute. Tasks are nodes themselves, so the graph does not
+    need a #NodeHandler to create nodes for them.
+    """
+
+    return BaseGraph[Task]()
+
   def initialize_project(self, project: Project) -> None:
     """
     Called when a project is created. Can be overwritten by subclasses to customize what happens
@@ -98,7 +273,25 @@ class Context:
     else:
       return Path(build_directory)
 
-  def execute(self, selection: t.Union[None, str, t.List[str], Task, t.List[Task]] = None) -> None:
+  def iter_projects(self) -> t.Iterator[Project]:
+    """
+    Iterates over the root project and all of its loaded sub projects, recursively.
+    """
+
+    def _recurse(project: Project) -> t.Iterator[Project]:
+      yield project
+      for subproject in project.subprojects():
+        yield from _recurse(subproject)
+
+    if self.root_project is not None:
+      yield from _recurse(self.root_project)
+
+  def select_tasks(self, selection: t.Union[None, str, t.List[str], Task, t.List[Task]] = None) -> t.Set[Task]:
+    """
+    Finalizes the root project and returns the tasks matched by the *selection*. If no selection is
+    specified, the default tasks are returned.
+    """
+
     root_project = check_not_none(self.root_project, 'no root project initialized')
     root_project.finalize()
     selected_tasks: t.Set[Task] = set()
@@ -119,6 +312,173 @@ class Context:
         else:
           raise TypeError(f'expected str|Task, got {type(item).__name__}')
 
-    self.graph.add(*selected_tasks)
-    self.graph.ready()
+    return selected_tasks
+
+  def execute(self, selection: t.Union[None, str, t.List[str], Task, t.List[Task]] = None) -> None:
+    self.wait_for_metadata_gc()
+    selected_tasks = self.select_tasks(selection)
+    for task in selected_tasks:
+      self.graph.add(task)
+    self.graph.finalize()
     self.executor.execute(self.graph)
+    if self.settings.get_bool('core.gc_metadata', False):
+      self._gc_thread = threading.Thread(target=self._run_metadata_gc, name='craftr-metadata-gc', daemon=True)
+      self._gc_thread.start()
+
+  def collect_metadata_garbage(self) -> 'GcReport':
+    """
+    Removes the entries from the metadata store that belong to tasks that do not exist in the
+    loaded projects, or to files that no longer exist (see #craftr.core.util.metadata_gc).
+    """
+
+    from craftr.core.util.metadata_gc import collect_garbage
+    task_paths = {task.path for project in self.iter_projects() for task in project.tasks}
+    return collect_garbage(self.metadata_store, task_paths)
+
+  def _run_metadata_gc(self) -> None:
+    report = self.collect_metadata_garbage()
+    if report.removed:
+      print('>', report.describe(), flush=True)
+
+  def wait_for_metadata_gc(self) -> None:
+    """
+    Waits for the background sweep of the metadata store that was started after the last build.
+    """
+
+    if self._gc_thread is not None:
+      self._gc_thread.join()
+      self._gc_thread = None
+
+  def _affected_index_key(self, path: Path) -> str:
+    state = {
+      'craftr': craftr.__version__,
+      'path': str(path.absolute()),
+      'settings': {key: self.settings[key] for key in self.settings},
+    }
+    return hashlib.sha1(fingerprint(state)).hexdigest()
+
+  def load_affected_index(self, path: Path) -> t.Optional['AffectedIndex']:
+    """
+    Returns the cached #AffectedIndex of the projects in *path*, or #None if there is none or if
+    the settings or any of the inputs of the configuration of the projects changed since it was
+    created. The projects do not need to be loaded.
+    """
+
+    from craftr.core.util.affected import AFFECTED_INDEX_FILENAME, AffectedIndex
+    from craftr.core.util.configuration_cache import inputs_current
+
+    index = AffectedIndex.load(self._get_metadata_directory(path) / AFFECTED_INDEX_FILENAME)
+    if index is None or index.key != self._affected_index_key(path) or not inputs_current(index.inputs):
+      return None
+    return index
+
+  def affected_tasks(self, files: t.Iterable[t.Union[str, Path]]) -> t.List[str]:
+    """
+    Returns the paths of the tasks in all loaded projects that must be executed again if the
+    *files* changed, in execution order: the tasks that read any of the files (or whose build
+    script is one of them) and all tasks that depend on those (see #AffectedIndex).
+
+    The index is cached in the #metadata_directory and reused as long as the settings and the
+    inputs of the configuration of the projects (see #configuration_inputs) did not change, in
+    which case the projects are not finalized and the query only takes a few milliseconds.
+    """
+
+    from craftr.core.util.affected import AFFECTED_INDEX_FILENAME, AffectedIndex
+
+    root_project = check_not_none(self.root_project, 'no root project initialized')
+    index = self.load_affected_index(root_project.directory)
+    if index is None:
+      root_project.finalize()
+      graph = BaseGraph[Task]()
+      for project in self.iter_projects():
+        for task in project.tasks:
+          graph.add(task)
+      graph.finalize()
+      key = self._affected_index_key(root_project.directory)
+      index = AffectedIndex.from_graph(key, graph.freeze(), inputs=self.configuration_inputs)
+      index.save(self.metadata_directory / AFFECTED_INDEX_FILENAME)
+
+    return index.affected_by(files)
+
+  def watch(
+    self,
+    selection: t.Union[None, str, t.List[str], Task, t.List[Task]] = None,
+    watcher: t.Optional['FileWatcher'] = None,
+    debounce: float = 0.2,
+    settings_file: t.Optional[Path] = None,
+  ) -> None:
+    """
+    Executes the selected tasks, then waits for changes to their input files and re-executes only
+    the tasks with changed input files and the tasks that depend on them. Input directories are
+    watched recursively. A failed build does not end the loop. Returns when the build script of
+    any project or the *settings_file* changes, as the projects must be loaded again.
+    """
+
+    from craftr.core.util.task_state import get_input_files
+    from craftr.core.util.watch import create_watcher, wait_for_changes
+
+    selected_tasks = self.select_tasks(selection)
+    for task in selected_tasks:
+      self.graph.add(task)
+    self.graph.finalize()
+
+    frozen = self.graph.freeze()
+    tasks: t.List[Task] = frozen.nodes
+
+    tasks_by_file: t.Dict[Path, t.List[Task]] = {}
+    for task in tasks:
+      for path in get_input_files(task):
+        tasks_by_file.setdefault(Path(os.path.abspath(path)), []).append(task)
+    build_files = {Path(os.path.abspath(p.build_script)) for p in self.iter_projects() if p.build_script}
+    if settings_file is not None:
+      build_files.add(Path(os.path.abspath(settings_file)))
+
+    def _execute(graph: 'BaseGraph[Task]') -> None:
+      try:
+        self.executor.execute(graph)
+      except Exception as exc:
+        print('error:', exc, file=sys.stderr, flush=True)
+
+    with (watcher or create_watcher()) as watcher:
+      watcher.watch(tasks_by_file.keys())
+      watcher.watch(build_files)
+      _execute(self.graph)
+
+      while True:
+        print('> Waiting for changes', flush=True)
+        changed = wait_for_changes(watcher, debounce)
+        if changed & build_files:
+          return
+
+        changed_tasks = (frozen.index[task.id] for path in changed for task in tasks_by_file.get(path, []))
+        affected = frozen.reachable(changed_tasks, dependents=True)
+        if affected:
+          _execute(self.graph.subgraph(tasks[i] for i in affected))
+
+  def emit_ninja(
+    self,
+    output_file: Path,
+    selection: t.Union[None, str, t.List[str], Task, t.List[Task]] = None,
+    regenerate_command: t.Optional[t.List[str]] = None,
+    settings_file: t.Optional[Path] = None,
+  ) -> None:
+    """
+    Writes a Ninja build file for the selected tasks and their dependencies. If a *regenerate_command*
+    (arguments for the `craftr` command-line) is specified, the Ninja build file re-runs it when the
+    build scripts or the *settings_file* change.
+    """
+
+    from craftr.core.util.ninja import export_ninja
+
+    selected_tasks = self.select_tasks(selection)
+    for task in selected_tasks:
+      self.graph.add(task)
+    self.graph.finalize()
+
+    build_files = [p.build_script for p in self.iter_projects() if p.build_script]
+    if settings_file and settings_file.exists():
+      build_files.append(settings_file)
+
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    with output_file.open('w') as fp:
+      export_ninja(self.graph, fp, selected_tasks, build_files, regenerate_command)
@@ -1,5 +1,7 @@
 
 import dataclasses
+import heapq
+from array import array
 import typing as t
 import weakref
 
@@ -7,6 +9,17 @@ T = t.TypeVar('T')
 WhenReadyCallback = t.Callable[['BaseGraph[T]'], None]
 
 
+class CyclicDependencyError(RuntimeError):
+  """
+  Raised if the dependencies of the nodes in a graph form a cycle. The #cycle lists the nodes on
+  the cycle, where every node depends on the next one and the last node is the first node again.
+  """
+
+  def __init__(self, cycle: t.List['Node']) -> None:
+    self.cycle = cycle
+    super().__init__('cyclic dependency: ' + ' -> '.join(node.id for node in cycle))
+
+
 class _GraphElement(t.Generic[T]):
 
   _graph: t.Optional['weakref.ReferenceType[BaseGraph[T]]'] = None
@@ -35,6 +48,9 @@ class Node(_GraphElement[T]):
   def __repr__(self) -> str:
     return f'Node(id={self.id!r}, group={self.group!r})'
 
+  def __craftr_fingerprint__(self) -> str:
+    return self.id
+
 
 @dataclasses.dataclass
 class NodeGroup(_GraphElement[T]):
@@ -62,6 +78,8 @@ class BaseGraph(t.Generic[T]):
     self._finalized = False
     self._nodes: t.Dict[str, Node[T]] = {}
     self._groups: t.Dict[str, NodeGroup[T]] = {}
+    self._group_positions: t.Dict[str, t.Dict[str, int]] = {}
+    self._frozen: t.Optional[FrozenGraph[T]] = None
 
   def __contains__(self, node_id: t.Union[str, Node[T]]) -> bool:
     if isinstance(node_id, Node):
@@ -79,12 +97,18 @@ class BaseGraph(t.Generic[T]):
   def group(self, group_id: str) -> Node[T]:
     return self._groups[group_id]
 
+  def _position_in_group(self, node: Node[T], group: NodeGroup[T]) -> int:
+    positions = self._group_positions.get(group.id)
+    if positions is None or len(positions) != len(group.contents) or positions.get(node.id) is None:
+      positions = self._group_positions[group.id] = {n.id: i for i, n in enumerate(group.contents)}
+    return positions[node.id]
+
   def dependencies_of(self, node: Node[T]) -> t.Iterator[Node[T]]:
     seen: t.Set[str] = set()
 
     # Depend on the previous node in the group if the group is lienar.
     if node.group and node.group.linear:
-      index = node.group.contents.index(node)
+      index = self._position_in_group(node, node.group)
       if index > 0:
         yield node.group.contents[index - 1]
 
@@ -97,39 +121,56 @@ class BaseGraph(t.Generic[T]):
       elif isinstance(dep, NodeGroup):
         yield from dep.contents
 
-  def add(self, arg: t.Union[NodeGroup[T], Node[T]], group: t.Optional[NodeGroup[T]] = None) -> None:
-    if self._finalized:
-      raise RuntimeError('cannot add to graph because it is finalized')
-    if group is not None and not isinstance(arg, Node):
-      raise TypeError('need Node if group is specified')
+  def _register(self, arg: t.Union[NodeGroup[T], Node[T]]) -> bool:
+    """
+    Adds a node or group to the graph, without its dependencies. Returns #True if it was not
+    already in the graph.
+    """
+
     if isinstance(arg, Node):
       node = arg
-      if group is not None:
-        if node.group is not None:
-          raise RuntimeError(f'node {node.id!r} is already assigned to a group')
-        assert node not in group.contents
-        group.contents.append(node)
-        node.group = group
       if node.id in self._nodes:
         if self._nodes[node.id] is not node:
           raise RuntimeError('different Node, same id')
-      else:
-        self._nodes[node.id] = node
-        node._graph = weakref.ref(self)
+        return False
+      self._nodes[node.id] = node
+      node._graph = weakref.ref(self)
+      return True
     elif isinstance(arg, NodeGroup):
       group = arg
       if group.id in self._groups:
         if self._groups[group.id] is not group:
           raise RuntimeError('different NdoeGroup, same id')
-      else:
-        self._groups[group.id] = group
-        group._graph = weakref.ref(self)
-      for node in group.contents:
-        self.add(node)
+        return False
+      self._groups[group.id] = group
+      group._graph = weakref.ref(self)
+      return True
     else:
       raise TypeError(f'expected Node or NodeGroup, got {type(arg).__name__}')
-    for dep in arg.dependencies:
-      self.add(dep)
+
+  def add(self, arg: t.Union[NodeGroup[T], Node[T]], group: t.Optional[NodeGroup[T]] = None) -> None:
+    if self._finalized:
+      raise RuntimeError('cannot add to graph because it is finalized')
+    if group is not None and not isinstance(arg, Node):
+      raise TypeError('need Node if group is specified')
+    if isinstance(arg, Node) and group is not None:
+      if arg.group is not None:
+        raise RuntimeError(f'node {arg.id!r} is already assigned to a group')
+      group.contents.append(arg)
+      arg.group = group
+
+    # Add the dependencies of the *arg* (and the contents of groups) that are not already in the
+    # graph, and their dependencies in turn.
+    self._register(arg)
+    stack: t.List[t.Union[NodeGroup[T], Node[T]]] = [arg]
+    while stack:
+      item = stack.pop()
+      children = list(item.dependencies)
+      if isinstance(item, NodeGroup):
+        children += item.contents
+      for child in children:
+        if self._register(child):
+          stack.append(child)
 
   def finalize(self) -> None:
     """
@@ -145,29 +186,236 @@ class BaseGraph(t.Generic[T]):
     for group in self._groups.values():
       self.add(group)
 
+    self._frozen = FrozenGraph.from_graph(self)
     self._finalized = True
 
+  def freeze(self) -> 'FrozenGraph[T]':
+    """
+    Returns the #FrozenGraph of a finalized graph, which is created once by #finalize(). For a graph
+    that is not finalized, a new #FrozenGraph of its current state is returned every time.
+    """
+
+    if self._frozen is not None:
+      return self._frozen
+    return FrozenGraph.from_graph(self)
+
   def execution_order(self) -> t.List[Node[T]]:
-    result: t.List[Node[T]] = []
-    result_seen: t.Set[str] = set()
-
-    def _handle_node(node: Node[T], local_seen: t.Set[str]) -> None:
-      if node.id not in self._nodes:
-        raise RuntimeError(f'encountered node that does not exist in the graph: {node.id!r}')
-      if node.id in local_seen:
-        return #raise RuntimeError(f'cyclic dependency graph involving task {node.id!r}: {result}')
-      local_seen.add(node.id)
-      for dep in self.dependencies_of(node):
-        _handle_node(dep, local_seen)
-      if node.id not in result_seen:
-        result.append(node)
-        result_seen.add(node.id)
+    """
+    Returns the nodes of the graph in an order in which every node comes after its dependencies.
+    Of the nodes whose dependencies are satisfied, the node that was added to the graph first comes
+    first. Raises a #CyclicDependencyError if the dependencies form a cycle.
+    """
 
-    for node in self._nodes.values():
-      _handle_node(node, set())
+    frozen = self.freeze()
+    return [frozen.nodes[i] for i in frozen.execution_order()]
+
+  def subgraph(self, nodes: t.Iterable[Node[T]]) -> 'BaseGraph[T]':
+    """
+    Returns a finalized graph that contains only the specified *nodes*. Dependencies on nodes that
+    are not included are ignored.
+    """
 
+    graph = _SubGraph(self)
+    for node in nodes:
+      graph._nodes[node.id] = node
+    graph._frozen = FrozenGraph.from_graph(graph)
+    graph._finalized = True
+    return graph
+
+
+class _SubGraph(BaseGraph[T]):
+
+  def __init__(self, parent: BaseGraph[T]) -> None:
+    super().__init__()
+    self._parent = parent
+
+  def dependencies_of(self, node: Node[T]) -> t.Iterator[Node[T]]:
+    return (dep for dep in self._parent.dependencies_of(node) if dep.id in self._nodes)
+
+
+class Adjacency:
+  """
+  The edges of a #FrozenGraph in one direction, in compressed sparse row form: the neighbours of
+  node *i* are `targets[offsets[i]:offsets[i + 1]]`, in ascending order.
+  """
+
+  def __init__(self, offsets: 'array[int]', targets: 'array[int]') -> None:
+    self.offsets = offsets
+    self.targets = targets
+
+  def __len__(self) -> int:
+    return len(self.offsets) - 1
+
+  def __getitem__(self, index: int) -> 'array[int]':
+    return self.targets[self.offsets[index]:self.offsets[index + 1]]
+
+  def degrees(self) -> 'array[int]':
+    """
+    Returns the number of neighbours of every node.
+    """
+
+    offsets = self.offsets
+    return array('I', (offsets[i + 1] - offsets[i] for i in range(len(offsets) - 1)))
+
+  def reachable(self, ids: t.Iterable[int]) -> t.List[int]:
+    """
+    Returns the sorted ids of the nodes in *ids* and of all nodes that can be reached from them.
+    """
+
+    offsets, targets = self.offsets, self.targets
+    seen = bytearray(len(offsets) - 1)
+    stack = []
+    for i in ids:
+      if not seen[i]:
+        seen[i] = 1
+        stack.append(i)
+    while stack:
+      i = stack.pop()
+      for target in targets[offsets[i]:offsets[i + 1]]:
+        if not seen[target]:
+          seen[target] = 1
+          stack.append(target)
+    return [i for i, flag in enumerate(seen) if flag]
+
+
+class FrozenGraph(t.Generic[T]):
+  """
+  A compact, immutable view of the nodes of a #BaseGraph and the dependencies between them, as
+  created by #BaseGraph.finalize(). Every node is interned to an integer id, its index in #nodes,
+  and the edges are stored in `array('I')` buffers instead of lists of objects, which keeps large
+  graphs small and cheap to traverse.
+
+  The #dependencies of a node are the nodes that it depends on, the #dependents are the nodes that
+  depend on it.
+  """
+
+  def __init__(self, nodes: t.List[Node[T]], dependencies: t.Iterable[t.Iterable[int]]) -> None:
+    self.nodes = nodes
+    self.index: t.Dict[str, int] = {node.id: i for i, node in enumerate(nodes)}
+
+    offsets = array('I', [0])
+    targets = array('I')
+    for deps in dependencies:
+      targets.extend(deps)
+      offsets.append(len(targets))
+    assert len(offsets) == len(nodes) + 1
+    self.dependencies = Adjacency(offsets, targets)
+
+    # Invert the edges with a counting sort, which keeps the dependents of every node sorted.
+    counts = [0] * (len(nodes) + 1)
+    for target in targets:
+      counts[target + 1] += 1
+    for i in range(len(nodes)):
+      counts[i + 1] += counts[i]
+    reverse_offsets = array('I', counts)
+    reverse_targets = array('I', bytes(targets.itemsize * len(targets)))
+    fill = counts[:-1]
+    for i in range(len(nodes)):
+      for target in targets[offsets[i]:offsets[i + 1]]:
+        reverse_targets[fill[target]] = i
+        fill[target] += 1
+    self.dependents = Adjacency(reverse_offsets, reverse_targets)
+
+    self._order: t.Optional['array[int]'] = None
+
+  def __repr__(self) -> str:
+    return f'{type(self).__name__}(nodes={len(self.nodes)}, edges={len(self.dependencies.targets)})'
+
+  def __len__(self) -> int:
+    return len(self.nodes)
+
+  @classmethod
+  def from_graph(cls, graph: 'BaseGraph[T]') -> 'FrozenGraph[T]':
+    """
+    Creates a #FrozenGraph from the current nodes of *graph* and their #BaseGraph.dependencies_of().
+    Nodes keep the order in which they were added to the graph.
+    """
+
+    nodes = list(graph._nodes.values())
+    index = {node.id: i for i, node in enumerate(nodes)}
+
+    def _dependencies(node: Node[T]) -> t.List[int]:
+      try:
+        return sorted({index[dep.id] for dep in graph.dependencies_of(node)})
+      except KeyError as exc:
+        raise RuntimeError(f'encountered node that does not exist in the graph: {exc.args[0]!r}')
+
+    return cls(nodes, map(_dependencies, nodes))
+
+  def execution_order(self) -> 'array[int]':
+    """
+    Returns the ids of all nodes in an order in which every node comes after its dependencies. Of
+    the nodes whose dependencies are satisfied, the node with the lowest id comes first. Raises a
+    #CyclicDependencyError if the dependencies form a cycle.
+    """
+
+    if self._order is not None:
+      return self._order
+
+    # Kahn's algorithm, with the ready nodes in a heap ordered by their id.
+    dependents = self.dependents
+    pending = self.dependencies.degrees()
+    ready = [i for i, count in enumerate(pending) if count == 0]
+    order = array('I')
+    while ready:
+      i = heapq.heappop(ready)
+      order.append(i)
+      for dependent in dependents[i]:
+        pending[dependent] -= 1
+        if pending[dependent] == 0:
+          heapq.heappush(ready, dependent)
+
+    if len(order) != len(self.nodes):
+      raise CyclicDependencyError(self._find_cycle(pending))
+    self._order = order
+    return order
+
+  def _find_cycle(self, pending: t.Sequence[int]) -> t.List[Node[T]]:
+    # Every node that was not ordered has a dependency that was not ordered either, so following
+    # those dependencies from any such node must eventually lead back to a node on the path.
+    current = next(i for i, count in enumerate(pending) if count > 0)
+    path: t.List[int] = []
+    positions: t.Dict[int, int] = {}
+    while current not in positions:
+      positions[current] = len(path)
+      path.append(current)
+      current = next(dep for dep in self.dependencies[current] if pending[dep] > 0)
+    return [self.nodes[i] for i in path[positions[current]:] + [current]]
+
+  def ordered(self) -> 'FrozenGraph[T]':
+    """
+    Returns a copy of the graph in which the ids of the nodes are their position in the
+    #execution_order(), i.e. every node has a higher id than its dependencies.
+    """
+
+    order = self.execution_order()
+    position = array('I', bytes(order.itemsize * len(order)))
+    for i, node in enumerate(order):
+      position[node] = i
+    dependencies = self.dependencies
+    result = FrozenGraph([self.nodes[i] for i in order], (sorted(position[x] for x in dependencies[i]) for i in order))
+    result._order = array('I', range(len(order)))
     return result
 
+  def reachable(self, ids: t.Iterable[int], dependents: bool = False) -> t.List[int]:
+    """
+    Returns the sorted ids of the nodes in *ids* and of all nodes that they depend on, directly or
+    indirectly. If *dependents* is #True, the nodes that depend on them are returned instead.
+    """
+
+    return (self.dependents if dependents else self.dependencies).reachable(ids)
+
+  def ready(self, completed: t.AbstractSet[int]) -> t.List[int]:
+    """
+    Returns the sorted ids of the nodes that are not *completed* but all of whose dependencies are.
+    """
+
+    offsets, targets = self.dependencies.offsets, self.dependencies.targets
+    return [
+      i for i in range(len(self.nodes))
+      if i not in completed and all(x in completed for x in targets[offsets[i]:offsets[i + 1]])
+    ]
+
 
 class NodeHandler(t.Protocol[T]):
   """
@@ -11,6 +11,7 @@ from craftr.core.base import ProjectLoader
 from craftr.core.context import Context
 from craftr.core.exceptions import UnableToLoadProjectError
 from craftr.core.project import Project
+from craftr.dsl.cache import compile_cached
 
 BUILD_SCRIPT_FILENAME = Path('build.craftr.py')
 
@@ -23,8 +24,9 @@ class DefaultProjectLoader(ProjectLoader):
   def load_project(self, context: 'Context', parent: t.Optional[Project], path: Path) -> Project:
     if (filename := path / BUILD_SCRIPT_FILENAME).exists():
       project = Project(context, parent, path)
+      project.build_script = filename
       context.initialize_project(project)
       scope = {'project': project, '__file__': str(filename), '__name__': '__main__'}
-      exec(compile(filename.read_text(), str(filename), 'exec'), scope, scope)
+      exec(compile_cached(filename.read_text(), str(filename)), scope, scope)
       return project
     raise UnableToLoadProjectError(self, context, parent, path)
@@ -6,9 +6,8 @@ import weakref
 from nr.preconditions import check_instance_of, check_not_none
 
 from craftr.core.base import Action, ActionContext, Task
-from craftr.core.graph import Graph
+from craftr.core.graph import BaseGraph, Node
 from craftr.core.impl.actions.LambdaAction import LambdaAction
-from craftr.core.impl.actions.NoopAction import NoopAction
 from craftr.core.project import Project
 
 TaskDoCallback = t.Callable[['DefaultTask', ActionContext], None]
@@ -43,6 +42,11 @@ class DefaultTask(Task):
   def path(self) -> str:
     return f'{self.project.path}:{self.name}'
 
+  @property
+  def id(self) -> str:
+    # The ID of the task as a node in the task graph.
+    return self.path
+
   def init(self) -> None:
     """
     Called from #__init__().
@@ -67,20 +71,19 @@ class DefaultTask(Task):
     if callable(action):
       callback = action
       action = LambdaAction(lambda context: callback(self, context))
-    if self._do_first_actions:
-      action.depends_on(self._do_first_actions[-1])
     self._do_first_actions.append(action)
 
   def do_last(self, action: t.Union[Action, TaskDoCallback]) -> None:
     if callable(action):
       callback = action
       action = LambdaAction(lambda context: callback(self, context))
-    if self._do_last_actions:
-      action.depends_on(self._do_last_actions[-1])
     self._do_last_actions.append(action)
 
-  def get_actions(self, graph: Graph[Action]) -> None:
-    pass
+  def get_actions(self, graph: BaseGraph[Action]) -> None:
+    """
+    Called by #get_action_graph() to add the actions of the task to the *graph*, wrapped in #Node#s
+    with IDs that are unique within the task.
+    """
 
   # Task
 
@@ -93,17 +96,29 @@ class DefaultTask(Task):
       raise RuntimeError('Task already finalized')
     self.finalized = True
 
-  def get_action_graph(self) -> Graph[Action]:
-    temp_graph = Graph[Action]()
-    self.get_actions(temp_graph)
-
-    first = NoopAction()
-    first.depends_on(*self._do_first_actions)
-
-    custom = NoopAction()
-    custom.depends_on(first, *temp_graph.nodes())
-
-    last = NoopAction()
-    last.depends_on(custom, *self._do_last_actions)
+  def get_action_graph(self) -> BaseGraph[Action]:
+    """
+    Returns the finalized graph of the actions from #get_actions(). The actions registered with
+    #do_first() run one after another before them, those registered with #do_last() after them.
+    """
 
-    return Graph([last])
+    graph = BaseGraph[Action]()
+    self.get_actions(graph)
+    nodes = graph.execution_order()
+
+    previous: t.List[Node[Action]] = []
+    for index, action in enumerate(self._do_first_actions):
+      node = Node(f'do_first:{index}', action, list(previous))
+      graph.add(node)
+      previous = [node]
+    for node in nodes:
+      node.dependencies += previous
+
+    previous = nodes or previous
+    for index, action in enumerate(self._do_last_actions):
+      node = Node(f'do_last:{index}', action, list(previous))
+      graph.add(node)
+      previous = [node]
+
+    graph.finalize()
+    return graph
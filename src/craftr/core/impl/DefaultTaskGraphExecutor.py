@@ -5,9 +5,12 @@ A very simple, sequential executor.
 
 import typing as t
 
-from craftr.core.base import Action, ActionContext, GraphExecutor, Task
+from craftr.core.base import ACTION_METADATA_NAMESPACE, Action, ActionContext, GraphExecutor, Task
 from craftr.core.graph import Graph
 from craftr.core.settings import Settings
+from craftr.core.util.caching import BufferedKeyValueStore
+from craftr.core.util.scheduling import ReadyQueue
+from craftr.core.util.task_state import check_task
 
 try:
   from termcolor import colored
@@ -17,23 +20,46 @@ except ImportError:
 
 
 class DefaultTaskGraphExecutor(GraphExecutor['Task']):
+  """
+  Executes tasks one after another.
 
-  def __init__(self, verbose: bool = False) -> None:
+  # Supported Settings
+
+  * `core.verbose` (defaults to `false`)
+  * `core.explain` (print why each task is outdated and what the check cost, defaults to `false`)
+  """
+
+  def __init__(self, verbose: bool = False, explain: bool = False) -> None:
     self._verbose = verbose
+    self._explain = explain
 
   @classmethod
   def from_settings(cls, settings: 'Settings') -> 'DefaultTaskGraphExecutor':
-    return cls(settings.get_bool('core.verbose', False))
+    return cls(settings.get_bool('core.verbose', False), settings.get_bool('core.explain', False))
 
   def execute(self, graph: Graph[Task]) -> None:
-    outdated_tasks: t.Set[Task] = set()
-    context = ActionContext(verbose=self._verbose)
-    for task in graph.execution_order():
-      if task.always_outdated or task.is_outdated() or any(x in outdated_tasks for x in task.get_dependencies()):
-        outdated_tasks.add(task)
-        print('> Task', task.path, flush=True)
-        for action in task.get_action_graph().execution_order():
-          action.execute(context)
-        task.complete()
-      else:
-        print('> Task', task.path, colored('UP TO DATE', 'green'), flush=True)
+    tasks = graph.execution_order()
+    if not tasks:
+      return
+
+    outdated_tasks: t.Set[str] = set()
+    build_context = tasks[0].project.context
+    metadata = BufferedKeyValueStore(build_context.metadata_store.namespace(ACTION_METADATA_NAMESPACE))
+    context = ActionContext(verbose=self._verbose, metadata=metadata, digests=build_context.file_digests)
+    try:
+      for task in tasks:
+        check = check_task(task, [x for x in graph.dependencies_of(task) if x.path in outdated_tasks])
+        explanation = [colored(f'({check.describe()})', 'yellow')] if self._explain else []
+        if check.outdated:
+          outdated_tasks.add(task.path)
+          print('> Task', task.path, *explanation, flush=True)
+          for action in ReadyQueue(task.get_action_graph()).values:
+            if action.is_outdated(context):
+              action.execute(context)
+              action.complete(context)
+          task.complete()
+        else:
+          print('> Task', task.path, colored('UP TO DATE', 'green'), *explanation, flush=True)
+    finally:
+      metadata.flush()
+      build_context.flush_metadata()
@@ -0,0 +1,258 @@
+"""
+An executor that runs independent tasks concurrently.
+"""
+
+import asyncio
+import os
+import threading
+import time
+import typing as t
+
+from nr.caching.api import KeyDoesNotExist, KeyValueStore
+
+from craftr.core.base import ACTION_METADATA_NAMESPACE, TASK_DURATION_NAMESPACE, Action, ActionContext, GraphExecutor, \
+  LoadableFromSettings, Task
+from craftr.core.graph import Graph
+from craftr.core.settings import Settings
+from craftr.core.impl.actions.CommandAction import CommandAction
+from craftr.core.util.caching import BufferedKeyValueStore, store_many
+from craftr.core.util.jobserver import Jobserver
+from craftr.core.util.remote import RemoteExecutor
+from craftr.core.util.scheduling import EventLoopThread, JobLimit, ReadyQueue, execute_async, execute_concurrently
+from craftr.core.util.task_state import check_task
+
+try:
+  from termcolor import colored
+except ImportError:
+  def colored(s, *a, **kw):  # type: ignore
+    return str(s)
+
+
+class _Durations:
+  """
+  Loads the durations of previous task and action executions from the metadata store and collects
+  new durations to write them back at the end of the build.
+  """
+
+  def __init__(self, store: t.Optional[KeyValueStore]) -> None:
+    self._store = store
+    self._lock = threading.Lock()
+    self._recorded: t.Dict[str, float] = {}
+
+  def weights(self, keys: t.Sequence[str]) -> t.List[float]:
+    """
+    Returns the known durations for the specified keys. Unknown durations default to the average
+    of the known durations.
+    """
+
+    durations: t.List[t.Optional[float]] = []
+    with self._lock:
+      for key in keys:
+        try:
+          durations.append(float(self._store.load(key).decode()) if self._store else None)
+        except (KeyDoesNotExist, ValueError):
+          durations.append(None)
+    known = [x for x in durations if x is not None]
+    default = sum(known) / len(known) if known else 1.0
+    return [default if x is None else x for x in durations]
+
+  def record(self, key: str, seconds: float) -> None:
+    with self._lock:
+      self._recorded[key] = seconds
+
+  def save(self) -> None:
+    if self._store is not None:
+      with self._lock:
+        store_many(self._store, {key: repr(seconds).encode() for key, seconds in self._recorded.items()})
+        self._recorded.clear()
+
+
+def _action_key(task: Task, index: int, action: Action) -> str:
+  """
+  Returns the key of the duration of an *action* of a *task*. Actions are identified by their output
+  files, which do not change when other actions are added to or removed from the task. Actions
+  without output files fall back to their *index* in the action graph.
+  """
+
+  if isinstance(action, CommandAction) and action.output_files:
+    return f'{task.path}#' + os.pathsep.join(sorted(map(action.resolve_path, action.output_files)))
+  return f'{task.path}#{index}'
+
+
+class ParallelTaskGraphExecutor(GraphExecutor['Task'], LoadableFromSettings):
+  """
+  Executes tasks in a pool of threads. A task is dispatched as soon as all of its dependencies are
+  complete. A task is considered outdated if any of its dependencies were outdated. After the first
+  task fails, no new tasks are started and the error is re-raised once the running tasks finished.
+
+  Ready tasks and actions are started in the order of the longest remaining path behind them,
+  weighted by how long each task and action took in previous builds. These durations are recorded
+  in the `task-durations` namespace of the metadata store.
+
+  Actions that are up to date (see #Action.is_outdated()) are skipped, e.g. a #CommandAction is
+  only executed if its command line or the contents of its input files (including the headers
+  listed in its depfile) changed. Thus, when one source file changes, only its object file is
+  compiled again, and the link step runs only if the contents of an object file changed. File
+  digests are cached by their stat metadata in the `file-digests` namespace.
+
+  The action graph of a task is executed the same way, so independent actions of a task (e.g. the
+  compilation of object files) run concurrently. All actions of all tasks share one #JobLimit, thus
+  no more than `core.jobs` actions are running at any time.
+
+  On POSIX systems, the job limit is implemented as a GNU make #Jobserver that is passed on to the
+  commands that are executed, so that tools like `make`, `cargo` or `ninja` count their own jobs
+  against the same limit. If Craftr itself runs under a jobserver (i.e. from a `Makefile`), it
+  draws its tokens from that jobserver instead.
+
+  With the `asyncio` engine, the actions of all tasks are run from a single event loop using
+  #Action.execute_async(). A #CommandAction then runs its commands as asyncio subprocesses and
+  writes their output in one piece when it finishes.
+
+  If remote workers are configured (see `python -m craftr.worker`), every #CommandAction that
+  declares its input and output files is sent to the least loaded worker instead of being executed
+  locally (see #RemoteExecutor). Remote actions still count against `core.jobs`, so you will want
+  to raise the job count to the total capacity of the workers.
+
+  # Supported Settings
+
+  * `core.jobs` (defaults to the number of CPUs)
+  * `core.verbose` (defaults to `false`)
+  * `core.executor.engine` (either `threads` or `asyncio`, defaults to `threads`)
+  * `core.jobserver` (defaults to `true` on POSIX systems)
+  * `core.remote.workers` (a comma-separated list of `host:port` addresses of remote workers)
+  * `core.remote.token` (the token that the workers require, defaults to `$CRAFTR_WORKER_TOKEN`)
+  * `core.explain` (print why each task is outdated and what the check cost, defaults to `false`)
+  """
+
+  ENGINES = ('threads', 'asyncio')
+
+  def __init__(
+    self,
+    jobs: t.Optional[int] = None,
+    verbose: bool = False,
+    engine: str = 'threads',
+    jobserver: bool = os.name == 'posix',
+    remote_workers: t.Sequence[str] = (),
+    explain: bool = False,
+    remote_token: t.Optional[str] = None,
+  ) -> None:
+    if engine not in self.ENGINES:
+      raise ValueError(f'invalid engine: {engine!r}')
+    self._jobs = jobs or os.cpu_count() or 1
+    self._verbose = verbose
+    self._engine = engine
+    self._jobserver = jobserver
+    self._remote_workers = list(remote_workers)
+    self._explain = explain
+    self._remote_token = remote_token
+    self._print_lock = threading.Lock()
+
+  @classmethod
+  def from_settings(cls, settings: 'Settings') -> 'ParallelTaskGraphExecutor':
+    return cls(
+      settings.get_int('core.jobs', 0) or None,
+      settings.get_bool('core.verbose', False),
+      settings.get('core.executor.engine', 'threads'),
+      settings.get_bool('core.jobserver', os.name == 'posix'),
+      [x.strip() for x in settings.get('core.remote.workers', '').split(',') if x.strip()],
+      settings.get_bool('core.explain', False),
+      settings.get('core.remote.token', None) or os.environ.get('CRAFTR_WORKER_TOKEN'))
+
+  def _print(self, *args: t.Any) -> None:
+    with self._print_lock:
+      print(*args, flush=True)
+
+  def _create_job_limit(self) -> JobLimit:
+    if not self._jobserver:
+      return JobLimit(self._jobs)
+    return Jobserver.from_environ(self._jobs) or Jobserver.create(self._jobs)
+
+  def _execute_actions(
+    self,
+    task: Task,
+    context: ActionContext,
+    limit: JobLimit,
+    durations: _Durations,
+    event_loop: t.Optional[EventLoopThread],
+    remote: t.Optional[RemoteExecutor],
+  ) -> None:
+    queue = ReadyQueue(task.get_action_graph())
+    keys = [_action_key(task, i, action) for i, action in enumerate(queue.values)]
+    queue.set_weights(durations.weights(keys))
+
+    def _run_action(index: int) -> None:
+      action = queue.values[index]
+      if not action.is_outdated(context):
+        return
+      tstart = time.perf_counter()
+      if remote is not None and remote.accepts(action, context):
+        remote.execute(action, context)
+      else:
+        action.execute(context)
+      action.complete(context)
+      durations.record(keys[index], time.perf_counter() - tstart)
+
+    async def _run_action_async(index: int) -> None:
+      action = queue.values[index]
+      loop = asyncio.get_running_loop()
+      if not await loop.run_in_executor(None, action.is_outdated, context):
+        return
+      tstart = time.perf_counter()
+      if remote is not None and remote.accepts(action, context):
+        await loop.run_in_executor(None, remote.execute, action, context)
+      else:
+        await action.execute_async(context)
+      await loop.run_in_executor(None, action.complete, context)
+      durations.record(keys[index], time.perf_counter() - tstart)
+
+    if event_loop is None:
+      execute_concurrently(queue, _run_action, self._jobs, limit)
+    else:
+      event_loop.run(execute_async(queue, _run_action_async, self._jobs, limit))
+
+  def execute(self, graph: Graph[Task]) -> None:
+    queue = ReadyQueue(graph)
+    if not queue.nodes:
+      return
+
+    outdated = [False] * len(queue.nodes)
+    limit = self._create_job_limit()
+    build_context = queue.values[0].project.context
+    metadata_store = build_context.metadata_store
+    metadata = BufferedKeyValueStore(metadata_store.namespace(ACTION_METADATA_NAMESPACE))
+    context = ActionContext(
+      verbose=self._verbose,
+      jobserver=limit if isinstance(limit, Jobserver) else None,
+      metadata=metadata,
+      digests=build_context.file_digests)
+    durations = _Durations(metadata_store.namespace(TASK_DURATION_NAMESPACE))
+    queue.set_weights(durations.weights([task.path for task in queue.values]))
+
+    def _run_task(index: int) -> None:
+      task: Task = queue.values[index]
+      check = check_task(task, [queue.values[x] for x in queue.dependencies[index] if outdated[x]])
+      explanation = [colored(f'({check.describe()})', 'yellow')] if self._explain else []
+      if check.outdated:
+        outdated[index] = True
+        self._print('> Task', task.path, *explanation)
+        tstart = time.perf_counter()
+        self._execute_actions(task, context, limit, durations, event_loop, remote)
+        task.complete()
+        durations.record(task.path, time.perf_counter() - tstart)
+      else:
+        self._print('> Task', task.path, colored('UP TO DATE', 'green'), *explanation)
+
+    event_loop = EventLoopThread() if self._engine == 'asyncio' else None
+    remote = RemoteExecutor(self._remote_workers, token=self._remote_token) if self._remote_workers else None
+    try:
+      execute_concurrently(queue, _run_task, self._jobs)
+    finally:
+      if event_loop is not None:
+        event_loop.close()
+      if remote is not None:
+        remote.close()
+      if isinstance(limit, Jobserver):
+        limit.close()
+      durations.save()
+      metadata.flush()
+      build_context.flush_metadata()
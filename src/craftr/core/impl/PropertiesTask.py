@@ -8,7 +8,7 @@ from craftr.core.base import Task
 from craftr.core.property import HavingProperties, collect_properties
 from craftr.core.impl.DefaultTask import DefaultTask
 from craftr.core.util.collections import unique
-from craftr.core.util.task_state import calculate_task_hash, unwrap_file_property
+from craftr.core.util.task_state import TaskState, calculate_task_state, explain_changes, unwrap_file_property
 
 TASK_HASH_NAMESPACE = 'task-hashes'
 
@@ -27,7 +27,17 @@ class PropertiesTask(DefaultTask, HavingProperties):
 
   @property
   def _kv_namespace(self) -> KeyValueStore:
-    return self.project.context.metadata_store.namespace(TASK_HASH_NAMESPACE)
+    return self.project.context.task_hashes
+
+  def _calculate_state(self) -> TaskState:
+    context = self.project.context
+    return calculate_task_state(self, context.hash_algorithm, context.file_digests)
+
+  def _load_state(self) -> t.Optional[TaskState]:
+    try:
+      return TaskState.from_json(self._kv_namespace.load(self.path).decode())
+    except (KeyDoesNotExist, ValueError):
+      return None
 
   # Task
 
@@ -57,26 +67,29 @@ class PropertiesTask(DefaultTask, HavingProperties):
     Checks if the task is outdated.
     """
 
+    return self.explain_outdated() is not None
+
+  def explain_outdated(self) -> t.Optional[str]:
+    """
+    Returns the first reason why the task is outdated: it is always outdated, an output file does
+    not exist, or a property value or input file changed since the task was last executed.
+    """
+
     if self.always_outdated:
-      return True
+      return 'the task is always outdated'
 
     # Check if any of the output file(s) don't exist.
     for prop in self.get_properties().values():
       if prop.is_output and (files := unwrap_file_property(prop)) is not None:
-        if any(not Path(f).exists() for f in files):
-          return True
+        for f in files:
+          if not Path(f).exists():
+            return f'output file {str(f)!r} does not exist'
 
     # TODO(NiklasRosenstein): If the task has no input file properties or does not produce output
     #   files should always be considered as outdated.
 
-    try:
-      stored_hash: t.Optional[str] = self._kv_namespace.load(self.path).decode()
-    except KeyDoesNotExist:
-      stored_hash = None
-
-    hash_value = calculate_task_hash(self)
-    return hash_value != stored_hash
+    return explain_changes(self._load_state(), self._calculate_state())
 
   def complete(self) -> None:
     if not self.always_outdated:
-      self._kv_namespace.store(self.path, calculate_task_hash(self).encode())
+      self._kv_namespace.store(self.path, self._calculate_state().to_json().encode())
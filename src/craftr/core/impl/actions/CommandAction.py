@@ -1,10 +1,23 @@
-
+import asyncio
 import dataclasses
+import hashlib
+import json
+import os
 import shlex
 import subprocess as sp
+import sys
+import threading
 import typing as t
 
+from nr.caching.api import KeyDoesNotExist
+
 from craftr.core.base import Action, ActionContext
+from craftr.core.util.depfile import read_dependencies
+from craftr.core.util.digests import FileDigestCache
+
+#: Held while the buffered output of an action is written, so that the output of concurrently
+#: running actions does not interleave.
+_output_lock = threading.Lock()
 
 
 @dataclasses.dataclass
@@ -23,16 +36,157 @@ class CommandAction(Action):
   #: If this is enabled, the command that is being run is printed to stdout.
   verbose: bool = False
 
+  #: The files read by the command(s). Declaring them is optional, but it allows the action to be
+  #: exported to other build tools. Directories are hashed as a whole to check if the action is
+  #: up to date.
+  input_files: t.Optional[t.Sequence[str]] = None
+
+  #: The files produced by the command(s).
+  output_files: t.Optional[t.Sequence[str]] = None
+
+  #: A Makefile-style dependency file written by the command that lists additional input files
+  #: (e.g. the headers included by a C source file).
+  depfile: t.Optional[str] = None
+
   def format_command(self, command: t.List[str]) -> str:
     return '$ ' + ' '.join(map(shlex.quote, command))
 
-  def execute(self, context: ActionContext) -> None:
+  def get_commands(self) -> t.List[t.List[str]]:
     commands: t.List[t.List[str]] = []
     if self.command is not None:
       commands.append([str(x) for x in self.command])
     if self.commands is not None:
       commands.extend([[str(x) for x in cmd] for cmd in self.commands])
-    for command in commands:
+    return commands
+
+  def resolve_path(self, path: str) -> str:
+    """
+    Returns the absolute path of a file declared by the action. Relative paths in #input_files,
+    #output_files and #depfile are relative to the #working_directory, like the commands see them.
+    """
+
+    return os.path.abspath(os.path.join(self.working_directory or os.getcwd(), path))
+
+  def get_fingerprint(self, context: t.Optional[ActionContext] = None, dependencies: t.Sequence[str] = ()) -> str:
+    """
+    Returns a hash of the command lines, the working directory and the contents of the input files
+    and the additional *dependencies* (e.g. the headers listed in the #depfile). The digests of the
+    files are taken from the #ActionContext.digests cache if it is available.
+    """
+
+    digests = context.digests if context is not None and context.digests is not None else FileDigestCache()
+    hasher = hashlib.new(digests.hash_algo)
+    hasher.update(json.dumps([self.get_commands(), self.working_directory]).encode())
+    paths = [self.resolve_path(x) for x in [*(self.input_files or []), *dependencies]]
+    for path, digest in zip(paths, digests.digest_many(paths)):
+      hasher.update(path.encode())
+      hasher.update((digest or '-').encode())
+    return hasher.hexdigest()
+
+  def get_depfile_dependencies(self) -> t.Optional[t.List[str]]:
+    """
+    Returns the absolute paths of the files listed in the #depfile that are not already declared
+    in #input_files, or #None if there is no depfile.
+    """
+
+    depfile = self.resolve_path(self.depfile) if self.depfile else None
+    if not depfile or not os.path.isfile(depfile):
+      return None
+    inputs = set(map(self.resolve_path, self.input_files or []))
+    dependencies = (os.path.normpath(self.resolve_path(x)) for x in read_dependencies(depfile))
+    return [x for x in dependencies if x not in inputs]
+
+  def _metadata_key(self) -> str:
+    return os.pathsep.join(sorted(map(self.resolve_path, self.output_files or [])))
+
+  def is_outdated(self, context: ActionContext) -> bool:
+    """
+    The action is outdated unless it declares its output files, all of them exist and its
+    #get_fingerprint() did not change since it was last executed. The files listed in the #depfile
+    of the last execution are included in the fingerprint.
+    """
+
+    if not self.output_files or context.metadata is None:
+      return True
+    if not all(os.path.exists(self.resolve_path(x)) for x in self.output_files):
+      return True
+    state = self._load_state(context)
+    if state is None:
+      return True
+    fingerprint, dependencies = state
+    return fingerprint != self.get_fingerprint(context, dependencies)
+
+  def _load_state(self, context: ActionContext) -> t.Optional[t.Tuple[str, t.List[str]]]:
+    if not self.output_files or context.metadata is None:
+      return None
+    try:
+      state = json.loads(context.metadata.load(self._metadata_key()).decode())
+      return state['fingerprint'], list(state['dependencies'])
+    except (KeyDoesNotExist, ValueError, KeyError, TypeError):
+      return None
+
+  def get_known_dependencies(self, context: ActionContext) -> t.Optional[t.List[str]]:
+    """
+    Returns the absolute paths of the files that were listed in the #depfile when the action was
+    last executed, or #None if they are not known.
+    """
+
+    state = self._load_state(context)
+    return None if state is None else state[1]
+
+  def complete(self, context: ActionContext) -> None:
+    if not self.output_files or context.metadata is None:
+      return
+    dependencies = self.get_depfile_dependencies()
+    if dependencies is None and self.depfile:
+      return  # Without the depfile, we can not know when the action becomes outdated.
+    fingerprint = self.get_fingerprint(context, dependencies or [])
+    state = {'fingerprint': fingerprint, 'dependencies': dependencies or []}
+    context.metadata.store(self._metadata_key(), json.dumps(state).encode())
+
+  def get_subprocess_kwargs(self, context: ActionContext) -> t.Dict[str, t.Any]:
+    kwargs: t.Dict[str, t.Any] = {'cwd': self.working_directory}
+    if context.jobserver is not None:
+      kwargs.update(context.jobserver.get_subprocess_kwargs())
+    return kwargs
+
+  def execute(self, context: ActionContext) -> None:
+    kwargs = self.get_subprocess_kwargs(context)
+    for command in self.get_commands():
       if self.verbose or context.verbose:
         print(self.format_command(command))
-      sp.check_call(command, cwd=self.working_directory)
+      sp.check_call(command, **kwargs)
+
+  async def execute_async(self, context: ActionContext) -> None:
+    """
+    Runs the commands as asyncio subprocesses. The combined stdout and stderr of all commands is
+    captured and written to stdout in one piece when the action finishes (or fails).
+    """
+
+    kwargs = self.get_subprocess_kwargs(context)
+    output: t.List[bytes] = []
+    try:
+      for command in self.get_commands():
+        if self.verbose or context.verbose:
+          output.append(self.format_command(command).encode() + b'\n')
+        process = await asyncio.create_subprocess_exec(
+          *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT, **kwargs)
+        stdout, _ = await process.communicate()
+        output.append(stdout)
+        if process.returncode != 0:
+          raise sp.CalledProcessError(process.returncode, command, stdout)
+    finally:
+      _write_output(b''.join(output))
+
+
+def _write_output(data: bytes) -> None:
+  if not data:
+    return
+  with _output_lock:
+    buffer = getattr(sys.stdout, 'buffer', None)
+    if buffer is None:
+      sys.stdout.write(data.decode(errors='replace'))
+    else:
+      sys.stdout.flush()
+      buffer.write(data)
+    sys.stdout.flush()
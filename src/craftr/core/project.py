@@ -1,5 +1,4 @@
 
-import glob
 import string
 import sys
 import typing as t
@@ -43,6 +42,7 @@ class Project:
     self._context = weakref.ref(context)
     self._parent = weakref.ref(parent) if parent is not None else parent
     self.directory = Path(directory)
+    self.build_script: t.Optional[Path] = None
     self._name: t.Optional[str] = None
     self._build_directory: t.Optional[Path] = None
     self._tasks: t.Dict[str, 'Task'] = {}
@@ -58,6 +58,18 @@ class Project:
   def __repr__(self) -> str:
     return f'Project("{self.path}")'
 
+  def __getstate__(self) -> t.Dict[str, t.Any]:
+    # The extensions, exports and the on_apply handler are only used while build scripts are
+    # evaluated and usually hold functions that cannot be pickled (see #ConfigurationCache).
+    state = self.__dict__.copy()
+    state.update(extensions=None, exports=None, _on_apply=None)
+    return state
+
+  def __setstate__(self, state: t.Dict[str, t.Any]) -> None:
+    self.__dict__.update(state)
+    self.extensions = Namespace(self, 'extension')
+    self.exports = Namespace(self, 'exports')
+
   @property
   def context(self) -> 'Context':
     return check_not_none(self._context(), 'lost reference to context')
@@ -192,6 +204,7 @@ class Project:
       check_instance_of(plugin_name, str, 'plugin_name')
       plugin = self.context.plugin_loader.load_plugin(plugin_name)
       plugin.apply(self)
+      self.context.applied_plugins[plugin_name] = plugin
 
     elif from_project is not None:
       from_project = self.subproject(from_project) if isinstance(from_project, str) else from_project
@@ -207,13 +220,19 @@ class Project:
   def file(self, sub_path: str) -> Path:
     return self.directory / sub_path
 
-  def glob(self, pattern: str) -> t.List[Path]:
+  def glob(self, pattern: t.Union[str, t.Sequence[str]], exclude: t.Sequence[str] = ()) -> t.List[Path]:
     """
-    Apply the specified glob pattern relative to the project directory and return a list of the
-    matched files.
+    Apply the specified glob pattern(s) relative to the project directory and return a sorted list
+    of the matched files. A `**` component matches any number of directories (e.g. `src/**/*.cpp`).
+    Files that match any of the *exclude* patterns are skipped, as are the contents of excluded
+    directories (e.g. `.build/`). Like #glob.glob(), wildcards do not match names that start with
+    a dot. See #craftr.core.util.patterns for the pattern syntax.
+
+    The directories are listed through the #Context.file_snapshot, so each directory is only read
+    once, no matter how many projects glob it.
     """
 
-    return [Path(f) for f in glob.glob(str(self.directory / pattern))]
+    return self.context.file_snapshot.glob(self.directory, pattern, exclude)
 
   def finalize(self) -> None:
     for task in self.tasks:
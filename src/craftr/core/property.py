@@ -6,6 +6,7 @@ from pathlib import Path
 
 from nr.preconditions import check_not_none
 
+from craftr.core.util.fingerprint import fingerprint
 from craftr.core.util.typing import unpack_type_hint, type_repr
 from .provider import Box, NoValueError, Provider, T, visit_captured_providers
 
@@ -133,6 +134,7 @@ class Property(Provider[T]):
     self._value: t.Optional[Provider[T]] = None
     self._finalized = False
     self._finalized_value: t.Optional[Box[T]] = None
+    self._fingerprint: t.Optional[bytes] = None
 
     #: The object that owns the property.
     self._owner: t.Optional['weakref.ReferenceType[HavingProperties]'] = None
@@ -177,6 +179,19 @@ class Property(Provider[T]):
         pass
       self._finalized = True
 
+  def fingerprint(self) -> bytes:
+    """
+    Returns the canonical encoding of the property value (see #craftr.core.util.fingerprint), or
+    of #None if the property has no value. The result is cached once the property is finalized.
+    """
+
+    if self._fingerprint is not None:
+      return self._fingerprint
+    result = fingerprint(self.or_none())
+    if self._finalized:
+      self._fingerprint = result
+    return result
+
   def make_instance(self, owner: 'HavingProperties') -> None:
     prop = type(self)(
       type_=self.type,
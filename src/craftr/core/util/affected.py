@@ -0,0 +1,175 @@
+"""
+A reverse index from input files to the tasks that read them, used to find the tasks that must be
+rebuilt (and tested) when a set of files changed, e.g. for the changed files of a commit in CI.
+"""
+
+import base64
+import bisect
+import json
+import os
+import typing as t
+from array import array
+from pathlib import Path
+
+from craftr.core.graph import Adjacency
+from craftr.core.util.task_state import get_input_files
+
+if t.TYPE_CHECKING:
+  from craftr.core.base import Task
+  from craftr.core.graph import FrozenGraph
+
+#: The name of the file in the metadata directory in which the index is cached between invocations.
+#: The index is not kept in the metadata store, as a single large value is slow to load from the
+#: `json` store.
+AFFECTED_INDEX_FILENAME = 'affected-index.json'
+
+
+def _encode_array(values: 'array[int]') -> str:
+  return base64.b64encode(values.tobytes()).decode('ascii')
+
+
+def _decode_array(data: str) -> 'array[int]':
+  values = array('I')
+  values.frombytes(base64.b64decode(data))
+  return values
+
+
+class AffectedIndex:
+  """
+  Maps the absolute paths of the input files of tasks, and of the build scripts of their projects,
+  to the tasks that read them, and every task to the tasks that depend on it. Tasks are identified
+  by their position in the execution order, so the tasks returned by #affected_by() are already
+  in execution order.
+
+  The *files* are sorted and the tasks that read the file at index *i* are `file_tasks[i]`. The
+  index is stored as a few large strings rather than a mapping, which makes loading it fast even
+  for hundreds of thousands of files. The *key* identifies the settings that the projects were
+  loaded with and the *inputs* are the inputs of their configuration (see
+  #craftr.core.util.configuration_cache.get_inputs()), so that the index can be checked without
+  loading the projects (see #Context.load_affected_index()).
+  """
+
+  def __init__(
+    self,
+    key: str,
+    tasks: t.List[str],
+    files: t.List[str],
+    file_tasks: Adjacency,
+    dependents: Adjacency,
+    inputs: t.Optional[t.Dict[str, t.Any]] = None,
+  ) -> None:
+    self.key = key
+    self.inputs = inputs if inputs is not None else {'files': {}, 'directories': {}}
+    self.tasks = tasks
+    self.files = files
+    self.file_tasks = file_tasks
+    self.dependents = dependents
+
+  def __repr__(self) -> str:
+    return f'{type(self).__name__}(tasks={len(self.tasks)}, files={len(self.files)})'
+
+  @classmethod
+  def from_graph(
+    cls,
+    key: str,
+    graph: 'FrozenGraph[Task]',
+    input_files: t.Callable[['Task'], t.Iterable[Path]] = get_input_files,
+    inputs: t.Optional[t.Dict[str, t.Any]] = None,
+  ) -> 'AffectedIndex':
+    """
+    Creates the index for all tasks in *graph*, reading the files of every task with *input_files*.
+    Input directories are indexed by their own path and match any changed file inside of them.
+    """
+
+    graph = graph.ordered()
+    readers: t.Dict[str, t.List[int]] = {}
+    for i, task in enumerate(graph.nodes):
+      paths = set(input_files(task))
+      if task.project.build_script:
+        paths.add(task.project.build_script)
+      for path in paths:
+        readers.setdefault(os.path.abspath(path), []).append(i)
+
+    files = sorted(readers)
+    offsets = array('I', [0])
+    targets = array('I')
+    for path in files:
+      targets.extend(readers[path])
+      offsets.append(len(targets))
+    return cls(key, [task.path for task in graph.nodes], files, Adjacency(offsets, targets), graph.dependents, inputs)
+
+  def to_json(self) -> str:
+    return json.dumps({
+      'key': self.key,
+      'inputs': self.inputs,
+      'tasks': '\0'.join(self.tasks),
+      'files': '\0'.join(self.files),
+      'file_tasks': [_encode_array(self.file_tasks.offsets), _encode_array(self.file_tasks.targets)],
+      'dependents': [_encode_array(self.dependents.offsets), _encode_array(self.dependents.targets)],
+    })
+
+  @classmethod
+  def from_json(cls, data: str) -> 'AffectedIndex':
+    """
+    Parses an index from a string that was returned by #to_json(). Raises a #ValueError if the
+    string is not a valid index.
+    """
+
+    try:
+      payload = json.loads(data)
+      tasks = payload['tasks'].split('\0') if payload['tasks'] else []
+      files = payload['files'].split('\0') if payload['files'] else []
+      file_tasks = Adjacency(*map(_decode_array, payload['file_tasks']))
+      dependents = Adjacency(*map(_decode_array, payload['dependents']))
+      index = cls(payload['key'], tasks, files, file_tasks, dependents, payload['inputs'])
+    except (KeyError, TypeError, AttributeError) as exc:
+      raise ValueError(f'invalid affected index: {exc}')
+    if len(index.dependents) != len(index.tasks) or len(index.file_tasks) != len(index.files):
+      raise ValueError('invalid affected index: inconsistent number of entries')
+    return index
+
+  @classmethod
+  def load(cls, path: Path) -> t.Optional['AffectedIndex']:
+    """
+    Loads the index from the file at *path*. Returns #None if the file does not exist or is not a
+    valid index.
+    """
+
+    try:
+      return cls.from_json(path.read_text())
+    except (FileNotFoundError, ValueError):
+      return None
+
+  def save(self, path: Path) -> None:
+    """
+    Writes the index to the file at *path*. The file is replaced atomically.
+    """
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_text(self.to_json())
+    os.replace(tmp, path)
+
+  def _readers(self, path: str) -> t.Iterable[int]:
+    i = bisect.bisect_left(self.files, path)
+    if i < len(self.files) and self.files[i] == path:
+      return self.file_tasks[i]
+    return ()
+
+  def affected_by(self, paths: t.Iterable[t.Union[str, Path]]) -> t.List[str]:
+    """
+    Returns the paths of the tasks that read any of the files at *paths* (or a directory that
+    contains one of them), and of all tasks that depend on those, in execution order. Relative
+    paths are relative to the current working directory.
+    """
+
+    ids: t.Set[int] = set()
+    for path in paths:
+      path = os.path.abspath(path)
+      while True:
+        ids.update(self._readers(path))
+        parent = os.path.dirname(path)
+        if parent == path:
+          break
+        path = parent
+    return [self.tasks[i] for i in self.dependents.reachable(ids)]
@@ -1,13 +1,80 @@
 
 # Something to move into nr.caching maybe.
 
+import abc
+import array
+import atexit
 import base64
+import contextlib
+import itertools
 import json
+import math
 import os
+import sqlite3
+import struct
+import sys
+import threading
 import time
 import typing as t
+import weakref
+import zlib
 from nr.caching.api import KeyDoesNotExist, KeyValueStore, NamespaceStore
 
+try:
+  import fcntl
+except ImportError:
+  fcntl = None  # type: ignore
+
+#: Stores with pending writes that are committed when the interpreter exits.
+_unflushed_stores: 't.MutableSet[t.Union[SqliteNamespaceStore, LogFileStore]]' = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_stores() -> None:
+  for store in list(_unflushed_stores):
+    store.flush()
+
+
+class BatchStore(KeyValueStore):
+  """
+  A key value store that can store many values at once. The default implementation of
+  #store_many() stores them one after another, stores that write more than the stored value on
+  every update override it to write only once.
+  """
+
+  def store_many(self, values: t.Mapping[str, bytes]) -> None:
+    """
+    Stores all *values* (without expiration).
+    """
+
+    for key, value in values.items():
+      self.store(key, value)
+
+
+def store_many(store: KeyValueStore, values: t.Mapping[str, bytes]) -> None:
+  """
+  Stores all *values* in *store*, at once if it is a #BatchStore.
+  """
+
+  if isinstance(store, BatchStore):
+    store.store_many(values)
+  else:
+    for key, value in values.items():
+      store.store(key, value)
+
+
+class PrunableStore(BatchStore):
+  """
+  A key value store that can remove all keys that are no longer needed.
+  """
+
+  @abc.abstractmethod
+  def prune(self, keep: t.Callable[[str], bool]) -> t.Tuple[int, int]:
+    """
+    Removes all keys for which *keep* returns #False. Returns the number of removed keys and the
+    size of their keys and values in bytes.
+    """
+
 
 class JsonDirectoryStore(NamespaceStore):
   """
@@ -35,7 +102,7 @@ class JsonDirectoryStore(NamespaceStore):
           self.namespace(name[:-5]).expunge()
 
 
-class JsonFileStore(KeyValueStore):
+class JsonFileStore(PrunableStore):
   """
   A very simple key value store backed by a JSON file. Really doesn't do anything fancy. Writes
   the JSON on every update. Not supported in a threading or multiprocessing context.
@@ -54,8 +121,11 @@ class JsonFileStore(KeyValueStore):
     return self._values
 
   def _save(self) -> None:
-    with open(self._filename, 'w') as fp:
+    # Replace the file atomically, a process may exit while a background thread writes it.
+    tmp = f'{self._filename}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp, 'w') as fp:
       json.dump(self._values, fp)
+    os.replace(tmp, self._filename)
 
   def load(self, key: str) -> bytes:
     try:
@@ -73,6 +143,14 @@ class JsonFileStore(KeyValueStore):
     self._get_values()[key] = {'val': base64.b85encode(value).decode('ascii'), 'exp': exp}
     self._save()
 
+  def store_many(self, values: t.Mapping[str, bytes]) -> None:
+    if not values:
+      return
+    data = self._get_values()
+    for key, value in values.items():
+      data[key] = {'val': base64.b85encode(value).decode('ascii'), 'exp': None}
+    self._save()
+
   def expunge(self) -> None:
     t = time.time()
     data = self._get_values()
@@ -84,3 +162,549 @@ class JsonFileStore(KeyValueStore):
         has_deleted = True
     if has_deleted:
       self._save()
+
+  def prune(self, keep: t.Callable[[str], bool]) -> t.Tuple[int, int]:
+    data = self._get_values()
+    removed = [key for key in data if not keep(key)]
+    size = sum(len(key.encode()) + len(data[key]['val']) for key in removed)
+    for key in removed:
+      del data[key]
+    if removed:
+      self._save()
+    return len(removed), size
+
+
+class BufferedKeyValueStore(BatchStore):
+  """
+  Wraps another key value store, caching the values that were loaded and collecting the values
+  that are stored until #flush() is called. Unlike most stores, this class is thread safe.
+  """
+
+  def __init__(self, store: KeyValueStore) -> None:
+    self._store = store
+    self._lock = threading.Lock()
+    self._values: t.Dict[str, t.Optional[bytes]] = {}
+    self._pending: t.Dict[str, bytes] = {}
+
+  def load(self, key: str) -> bytes:
+    with self._lock:
+      if key not in self._values:
+        try:
+          self._values[key] = self._store.load(key)
+        except KeyDoesNotExist:
+          self._values[key] = None
+      value = self._values[key]
+    if value is None:
+      raise KeyDoesNotExist(key)
+    return value
+
+  def store(self, key: str, value: bytes, expires_in: t.Optional[int] = None) -> None:
+    assert expires_in is None, 'BufferedKeyValueStore does not support expiration'
+    with self._lock:
+      self._values[key] = value
+      self._pending[key] = value
+
+  def store_many(self, values: t.Mapping[str, bytes]) -> None:
+    with self._lock:
+      self._values.update(values)
+      self._pending.update(values)
+
+  def expunge(self) -> None:
+    self._store.expunge()
+
+  def flush(self) -> None:
+    """ Writes the stored values to the underlying store at once (see #store_many()). """
+
+    with self._lock:
+      pending, self._pending = self._pending, {}
+      store_many(self._store, pending)
+
+
+class SqliteNamespaceStore(NamespaceStore):
+  """
+  A namespace store backed by an SQLite database in WAL mode, with all namespaces in one table.
+  Unlike the #JsonDirectoryStore, a write does not rewrite all other values. Writes are collected
+  and committed in one transaction once *batch_size* writes are pending, when the oldest pending
+  write is older than *flush_interval* seconds, or when #flush() is called. Loads see the pending
+  writes.
+
+  The store can be used from many threads (each thread uses its own connection) and from many
+  processes at once (SQLite locks the database for the duration of a transaction, and concurrent
+  writers wait for up to *timeout* seconds).
+  """
+
+  def __init__(
+    self,
+    filename: str,
+    batch_size: int = 1000,
+    flush_interval: float = 1.0,
+    timeout: float = 30.0,
+  ) -> None:
+    self._filename = filename
+    self._batch_size = batch_size
+    self._flush_interval = flush_interval
+    self._timeout = timeout
+    self._local = threading.local()
+    self._lock = threading.Lock()
+    self._flush_lock = threading.Lock()
+    self._pending: t.Dict[t.Tuple[str, str], t.Tuple[t.Optional[bytes], t.Optional[float]]] = {}
+    self._pending_since: t.Optional[float] = None
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    with self._connection() as conn:
+      conn.execute(
+        'CREATE TABLE IF NOT EXISTS entries (namespace TEXT NOT NULL, key TEXT NOT NULL, '
+        'value BLOB NOT NULL, expires_at REAL, PRIMARY KEY (namespace, key)) WITHOUT ROWID')
+    _unflushed_stores.add(self)
+
+  def _connection(self) -> sqlite3.Connection:
+    conn: t.Optional[sqlite3.Connection] = getattr(self._local, 'conn', None)
+    if conn is None:
+      conn = self._local.conn = sqlite3.connect(self._filename, timeout=self._timeout, isolation_level=None)
+      conn.execute('PRAGMA journal_mode=WAL')
+      conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+  def namespace(self, namespace: str) -> KeyValueStore:
+    return _SqliteNamespace(self, namespace)
+
+  def expunge(self, namespace: t.Optional[str] = None) -> None:
+    self.flush()
+    with self._connection() as conn:
+      if namespace is None:
+        conn.execute('DELETE FROM entries WHERE expires_at < ?', (time.time(),))
+      else:
+        conn.execute('DELETE FROM entries WHERE namespace = ? AND expires_at < ?', (namespace, time.time()))
+
+  def load(self, namespace: str, key: str) -> bytes:
+    with self._lock:
+      pending = self._pending.get((namespace, key))
+    if pending is not None:
+      value, expires_at = pending
+    else:
+      row = self._connection().execute(
+        'SELECT value, expires_at FROM entries WHERE namespace = ? AND key = ?', (namespace, key)).fetchone()
+      value, expires_at = row if row is not None else (None, None)
+    if value is None or (expires_at is not None and expires_at < time.time()):
+      raise KeyDoesNotExist(key)
+    return bytes(value)
+
+  def store(self, namespace: str, key: str, value: t.Optional[bytes], expires_in: t.Optional[int] = None) -> None:
+    """
+    Stores a value in the specified *namespace*. If *value* is #None or *expires_in* is zero, the
+    key is deleted.
+    """
+
+    if expires_in == 0:
+      value = None
+    expires_at = time.time() + expires_in if expires_in is not None else None
+    with self._lock:
+      self._pending[(namespace, key)] = (value, expires_at)
+      if self._pending_since is None:
+        self._pending_since = time.perf_counter()
+      flush = len(self._pending) >= self._batch_size or \
+        time.perf_counter() - self._pending_since >= self._flush_interval
+    if flush:
+      self.flush()
+
+  def prune(self, namespace: str, keep: t.Callable[[str], bool]) -> t.Tuple[int, int]:
+    """
+    Deletes the keys in *namespace* for which *keep* returns #False. See #PrunableStore.prune().
+    """
+
+    self.flush()
+    conn = self._connection()
+    rows = conn.execute('SELECT key, length(value) FROM entries WHERE namespace = ?', (namespace,)).fetchall()
+    removed = [(key, size) for key, size in rows if not keep(key)]
+    if removed:
+      conn.execute('BEGIN IMMEDIATE')
+      conn.executemany('DELETE FROM entries WHERE namespace = ? AND key = ?', [(namespace, k) for k, _ in removed])
+      conn.execute('COMMIT')
+    return len(removed), sum(len(k.encode()) + size for k, size in removed)
+
+  def flush(self) -> None:
+    """
+    Commits the pending writes in a single transaction.
+    """
+
+    with self._flush_lock:
+      with self._lock:
+        pending, self._pending = self._pending, {}
+        self._pending_since = None
+      if not pending:
+        return
+      conn = self._connection()
+      try:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.executemany('DELETE FROM entries WHERE namespace = ? AND key = ?',
+          [k for k, (v, _) in pending.items() if v is None])
+        conn.executemany('INSERT OR REPLACE INTO entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)',
+          [(*k, v, e) for k, (v, e) in pending.items() if v is not None])
+        conn.execute('COMMIT')
+      except BaseException:
+        if conn.in_transaction:
+          conn.execute('ROLLBACK')
+        # Keep the writes that were not committed, unless they were overwritten in the meantime.
+        with self._lock:
+          self._pending = {**pending, **self._pending}
+          self._pending_since = self._pending_since or time.perf_counter()
+        raise
+
+
+class _SqliteNamespace(PrunableStore):
+
+  def __init__(self, store: SqliteNamespaceStore, namespace: str) -> None:
+    self._store = store
+    self._namespace = namespace
+
+  def load(self, key: str) -> bytes:
+    return self._store.load(self._namespace, key)
+
+  def store(self, key: str, value: bytes, expires_in: t.Optional[int] = None) -> None:
+    self._store.store(self._namespace, key, value, expires_in)
+
+  def expunge(self) -> None:
+    self._store.expunge(self._namespace)
+
+  def prune(self, keep: t.Callable[[str], bool]) -> t.Tuple[int, int]:
+    return self._store.prune(self._namespace, keep)
+
+
+class LogDirectoryStore(NamespaceStore):
+  """
+  A namespace store that maps one namespace to an append-only binary log file (see #LogFileStore).
+  Each namespace is loaded once and shared by all users of the store.
+  """
+
+  def __init__(self, directory: str, create_dir: bool = False) -> None:
+    self._directory = directory
+    self._lock = threading.Lock()
+    self._namespaces: t.Dict[str, LogFileStore] = {}
+    if create_dir:
+      os.makedirs(directory, exist_ok=True)
+
+  def namespace(self, namespace: str) -> 'LogFileStore':
+    with self._lock:
+      if namespace not in self._namespaces:
+        self._namespaces[namespace] = LogFileStore(os.path.join(self._directory, namespace + '.log'))
+      return self._namespaces[namespace]
+
+  def expunge(self, namespace: t.Optional[str] = None) -> None:
+    if namespace:
+      self.namespace(namespace).expunge()
+    else:
+      try:
+        names = os.listdir(self._directory)
+      except (FileNotFoundError, NotADirectoryError):
+        names = []
+      for name in names:
+        if name.endswith('.log'):
+          self.namespace(name[:-4]).expunge()
+
+  def flush(self) -> None:
+    with self._lock:
+      stores = list(self._namespaces.values())
+    for store in stores:
+      store.flush()
+
+
+class LogFileStore(PrunableStore):
+  """
+  A key value store backed by an append-only binary log, similar to the `.ninja_log`. The log is
+  read once when the store is first used, and every write appends one record to it. Records
+  carry a checksum, so a record that was only partially written when the process crashed is
+  discarded the next time the log is loaded.
+
+  Appended records are collected and written (and synced to disk) in one piece once
+  *batch_size* records are pending, when the oldest pending record is older than
+  *flush_interval* seconds, or when #flush() is called. Other processes that use the same log
+  concurrently append to it under a file lock, but only see each other's records after loading
+  the log again.
+
+  The log is compacted when more than *compaction_ratio* of its records are outdated, or when
+  more records were appended than the log contained after it was last compacted. Compaction
+  rewrites the log as a single checkpoint record that is loaded in bulk, without decoding every
+  record in Python, so a log with a hundred thousand keys loads in tens of milliseconds.
+
+  Keys must not contain NUL characters.
+  """
+
+  MAGIC = b'craftr-log:2\n'
+
+  #: `(checksum, type, payload length)` followed by the payload. The checksum covers the type,
+  #: length and payload.
+  _HEADER = struct.Struct('>IcI')
+
+  #: The payload of a #_SET record, followed by the key and value. The expiration time is NaN if
+  #: the value does not expire.
+  _SET = b'S'
+  _SET_HEADER = struct.Struct('>Id')
+
+  #: The payload of a #_DELETE record is the key.
+  _DELETE = b'D'
+
+  #: The payload of a #_CHECKPOINT record is `(count, length of keys, number of expiring keys)`,
+  #: followed by the value lengths (`count` little-endian 32-bit integers), the indices of the
+  #: expiring keys (little-endian 32-bit integers) and their expiration times (little-endian
+  #: doubles), the NUL-separated keys and the concatenated values.
+  _CHECKPOINT = b'C'
+  _CHECKPOINT_HEADER = struct.Struct('>III')
+
+  #: Logs with fewer records than this are never compacted.
+  MIN_COMPACTION_RECORDS = 1000
+
+  def __init__(
+    self,
+    filename: str,
+    batch_size: int = 1000,
+    flush_interval: float = 1.0,
+    compaction_ratio: float = 0.5,
+  ) -> None:
+    self._filename = filename
+    self._batch_size = batch_size
+    self._flush_interval = flush_interval
+    self._compaction_ratio = compaction_ratio
+    self._lock = threading.RLock()
+    self._values: t.Optional[t.Dict[str, bytes]] = None
+    self._expirations: t.Dict[str, float] = {}
+    self._records = 0  #: The number of keys in the checkpoint plus the number of appended records.
+    self._appended = 0  #: The number of records appended after the checkpoint.
+    self._pending = bytearray()
+    self._pending_records = 0
+    self._pending_since: t.Optional[float] = None
+    _unflushed_stores.add(self)
+
+  @classmethod
+  def _record(cls, type_: bytes, payload: bytes) -> bytes:
+    header = type_ + struct.pack('>I', len(payload))
+    return struct.pack('>I', zlib.crc32(payload, zlib.crc32(header))) + header + payload
+
+  @classmethod
+  def _encode(cls, key: str, value: t.Optional[bytes], expires_at: t.Optional[float]) -> bytes:
+    key_bytes = key.encode('utf-8', 'surrogateescape')
+    if value is None:
+      return cls._record(cls._DELETE, key_bytes)
+    expiration = math.nan if expires_at is None else expires_at
+    return cls._record(cls._SET, cls._SET_HEADER.pack(len(key_bytes), expiration) + key_bytes + value)
+
+  @classmethod
+  def _encode_checkpoint(cls, values: t.Dict[str, bytes], expirations: t.Dict[str, float]) -> bytes:
+    lengths = array.array('I', map(len, values.values()))
+    indices = array.array('I', (i for i, k in enumerate(values) if k in expirations))
+    times = array.array('d', (expirations[k] for k in values if k in expirations))
+    if sys.byteorder == 'big':
+      lengths.byteswap()
+      indices.byteswap()
+      times.byteswap()
+    keys = '\0'.join(values).encode('utf-8', 'surrogateescape')
+    payload = b''.join([
+      cls._CHECKPOINT_HEADER.pack(len(values), len(keys), len(indices)),
+      lengths.tobytes(),
+      indices.tobytes(),
+      times.tobytes(),
+      keys,
+      *values.values()])
+    return cls._record(cls._CHECKPOINT, payload)
+
+  @classmethod
+  def _decode_checkpoint(cls, data: bytes, offset: int) -> t.Tuple[t.Dict[str, bytes], t.Dict[str, float]]:
+    count, keys_length, expiring = cls._CHECKPOINT_HEADER.unpack_from(data, offset)
+    if count == 0:
+      return {}, {}
+    offset += cls._CHECKPOINT_HEADER.size
+    lengths, indices, times = array.array('I'), array.array('I'), array.array('d')
+    for arr, size in ((lengths, 4 * count), (indices, 4 * expiring), (times, 8 * expiring)):
+      arr.frombytes(data[offset:offset + size])
+      offset += size
+      if sys.byteorder == 'big':
+        arr.byteswap()
+    keys = data[offset:offset + keys_length].decode('utf-8', 'surrogateescape').split('\0')
+    offset += keys_length
+    ends = list(itertools.accumulate(lengths, initial=offset))
+    values = [data[a:b] for a, b in zip(ends, ends[1:])]
+    return dict(zip(keys, values)), {keys[i]: e for i, e in zip(indices, times)}
+
+  @classmethod
+  def _parse(cls, data: bytes) -> t.Tuple[t.Dict[str, bytes], t.Dict[str, float], int, int, bool]:
+    """
+    Parses the records in *data*. Returns the values, the expiration times, the number of records,
+    the number of records after the last checkpoint and whether all of the data was valid.
+    """
+
+    values: t.Dict[str, bytes] = {}
+    expirations: t.Dict[str, float] = {}
+    records = appended = 0
+    if not data.startswith(cls.MAGIC):
+      return values, expirations, records, appended, not data
+
+    offset = len(cls.MAGIC)
+    header_size = cls._HEADER.size
+    while offset + header_size <= len(data):
+      checksum, type_, length = cls._HEADER.unpack_from(data, offset)
+      start = offset + header_size
+      end = start + length
+      if end > len(data) or zlib.crc32(data[offset + 4:end]) != checksum:
+        break  # A torn write at the end of the log.
+      if type_ == cls._CHECKPOINT:
+        values, expirations = cls._decode_checkpoint(data, start)
+        records, appended = len(values), 0
+      else:
+        if type_ == cls._SET:
+          key_length, expiration = cls._SET_HEADER.unpack_from(data, start)
+          key_start = start + cls._SET_HEADER.size
+          key = data[key_start:key_start + key_length].decode('utf-8', 'surrogateescape')
+          values[key] = data[key_start + key_length:end]
+          if expiration == expiration:
+            expirations[key] = expiration
+          else:
+            expirations.pop(key, None)
+        elif type_ == cls._DELETE:
+          key = data[start:end].decode('utf-8', 'surrogateescape')
+          values.pop(key, None)
+          expirations.pop(key, None)
+        records += 1
+        appended += 1
+      offset = end
+
+    return values, expirations, records, appended, offset == len(data)
+
+  def _read(self) -> bytes:
+    try:
+      with open(self._filename, 'rb') as fp:
+        return fp.read()
+    except FileNotFoundError:
+      return b''
+
+  def _load(self) -> t.Dict[str, bytes]:
+    if self._values is None:
+      self._values, self._expirations, self._records, self._appended, valid = self._parse(self._read())
+      if not valid or self._should_compact():
+        self._compact()
+    return self._values
+
+  def _should_compact(self) -> bool:
+    assert self._values is not None
+    if self._records < self.MIN_COMPACTION_RECORDS:
+      return False
+    dead = self._records - len(self._values)
+    return dead > self._records * self._compaction_ratio or self._appended > self._records - self._appended
+
+  @contextlib.contextmanager
+  def _locked_file(self) -> t.Iterator[t.BinaryIO]:
+    """
+    Opens the log for appending while holding an exclusive lock on it.
+    """
+
+    os.makedirs(os.path.dirname(os.path.abspath(self._filename)), exist_ok=True)
+    while True:
+      fp = open(self._filename, 'ab')
+      if fcntl is not None:
+        fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+        # If another process compacted the log while we waited for the lock, we hold the lock
+        # on the replaced file.
+        try:
+          replaced = os.fstat(fp.fileno()).st_ino != os.stat(self._filename).st_ino
+        except FileNotFoundError:
+          replaced = True
+        if replaced:
+          fp.close()
+          continue
+      break
+    with fp:
+      yield t.cast(t.BinaryIO, fp)
+
+  def _compact(self, keep: t.Optional[t.Callable[[str], bool]] = None) -> t.Tuple[int, int]:
+    """
+    Rewrites the log as a single checkpoint of the keys that are not expired (and for which *keep*
+    returns #True, if specified). The log is read again while it is locked, so records that other
+    processes appended are preserved. Returns the number and size of the removed keys.
+    """
+
+    with self._locked_file():
+      self._values, self._expirations = self._parse(self._read())[:2]
+      now = time.time()
+      for key in [k for k, e in self._expirations.items() if e < now]:
+        del self._values[key], self._expirations[key]
+      removed = [k for k in self._values if not keep(k)] if keep is not None else []
+      size = sum(len(k.encode('utf-8', 'surrogateescape')) + len(self._values[k]) for k in removed)
+      for key in removed:
+        del self._values[key]
+        self._expirations.pop(key, None)
+      tmp = f'{self._filename}.{os.getpid()}.tmp'
+      with open(tmp, 'wb') as fp:
+        fp.write(self.MAGIC + self._encode_checkpoint(self._values, self._expirations))
+        fp.flush()
+        os.fsync(fp.fileno())
+      os.replace(tmp, self._filename)
+    self._records = len(self._values)
+    self._appended = 0
+    return len(removed), size
+
+  def load(self, key: str) -> bytes:
+    with self._lock:
+      try:
+        value = self._load()[key]
+      except KeyError:
+        raise KeyDoesNotExist(key)
+      expires_at = self._expirations.get(key)
+    if expires_at is not None and expires_at < time.time():
+      raise KeyDoesNotExist(key)
+    return value
+
+  def store(self, key: str, value: bytes, expires_in: t.Optional[int] = None) -> None:
+    if '\0' in key:
+      raise ValueError('key must not contain NUL characters')
+    expires_at = time.time() + expires_in if expires_in is not None else None
+    with self._lock:
+      values = self._load()
+      if expires_in == 0:
+        self._expirations.pop(key, None)
+        if values.pop(key, None) is None:
+          return
+        self._pending += self._encode(key, None, None)
+      else:
+        values[key] = value
+        if expires_at is None:
+          self._expirations.pop(key, None)
+        else:
+          self._expirations[key] = expires_at
+        self._pending += self._encode(key, value, expires_at)
+      self._records += 1
+      self._appended += 1
+      self._pending_records += 1
+      if self._pending_since is None:
+        self._pending_since = time.perf_counter()
+      if self._pending_records >= self._batch_size or time.perf_counter() - self._pending_since >= self._flush_interval:
+        self.flush()
+
+  def expunge(self) -> None:
+    with self._lock:
+      self.flush()
+      self._load()
+      self._compact()
+
+  def prune(self, keep: t.Callable[[str], bool]) -> t.Tuple[int, int]:
+    with self._lock:
+      self.flush()
+      if all(keep(key) for key in self._load()):
+        return 0, 0
+      return self._compact(keep)
+
+  def flush(self) -> None:
+    """
+    Appends the pending records to the log and syncs it to disk.
+    """
+
+    with self._lock:
+      if not self._pending:
+        return
+      pending, self._pending = bytes(self._pending), bytearray()
+      self._pending_records = 0
+      self._pending_since = None
+      with self._locked_file() as fp:
+        if fp.tell() == 0:
+          fp.write(self.MAGIC)
+        fp.write(pending)
+        fp.flush()
+        os.fsync(fp.fileno())
+      if self._should_compact():
+        self._compact()
@@ -0,0 +1,236 @@
+"""
+Caches the configuration of a build, i.e. the projects and their finalized tasks, so that later
+invocations can restore it instead of evaluating the build scripts again.
+
+The cache stores the whole project tree with #pickle: the task types (by reference, so they must
+be importable), the dependencies between tasks, their actions and the finalized values of their
+properties. The #Context is not stored but referenced as a persistent object and replaced by the
+current context when the projects are restored. Properties only keep their finalized value, not
+the providers that it was computed from.
+
+The configuration is restored if the *key* (see #ConfigurationCache) did not change and none of
+its inputs changed: the build scripts, the modules that the applied plugins are defined in and the
+directories that were listed by #Project.glob(). Other files that are read by a build script, or
+modules that it imports, are not tracked.
+
+A configuration can only be stored if all of its parts can be pickled. Actions that wrap a
+function defined in a build script (e.g. with #DefaultTask.do_last()) or task types defined in a
+build script prevent the configuration from being cached.
+"""
+
+import copyreg
+import inspect
+import io
+import os
+import pickle
+import typing as t
+import weakref
+from pathlib import Path
+
+from craftr.core.property import HavingProperties, Property
+from craftr.core.provider import Box, NoValueError
+
+if t.TYPE_CHECKING:
+  from craftr.core.context import Context
+  from craftr.core.project import Project
+
+#: The name of the file in the metadata directory that contains the cached configuration.
+CONFIGURATION_CACHE_FILENAME = 'configuration-cache.pickle'
+
+#: Incremented when the format of the cache changes.
+_VERSION = 1
+
+#: The exceptions that are raised if a configuration cannot be pickled.
+PICKLE_ERRORS = (pickle.PicklingError, TypeError, AttributeError)
+
+_CONTEXT_ID = 'context'
+
+
+def _restore_weakref(obj: t.Any) -> t.Any:
+  return None if obj is None else weakref.ref(obj)
+
+
+class _Pickler(pickle.Pickler):
+
+  def __init__(self, file: t.BinaryIO, context: 'Context') -> None:
+    super().__init__(file, pickle.HIGHEST_PROTOCOL)
+    self._context = context
+
+  def persistent_id(self, obj: t.Any) -> t.Optional[str]:
+    return _CONTEXT_ID if obj is self._context else None
+
+  def reducer_override(self, obj: t.Any) -> t.Any:
+    if type(obj) is weakref.ref:
+      return _restore_weakref, (obj(),)
+    if isinstance(obj, Property):
+      # Only the finalized value is stored, the providers it was computed from may reference
+      # functions defined in the build script.
+      state = dict(obj.__dict__, _value=None, default=None, default_factory=None, _finalized=True,
+        _finalized_value=_finalized_box(obj), _fingerprint=None)
+      return copyreg.__newobj__, (type(obj),), state
+    return NotImplemented
+
+
+class _Unpickler(pickle.Unpickler):
+
+  def __init__(self, file: t.BinaryIO, context: 'Context') -> None:
+    super().__init__(file)
+    self._context = context
+
+  def persistent_load(self, pid: t.Any) -> t.Any:
+    if pid == _CONTEXT_ID:
+      return self._context
+    raise pickle.UnpicklingError(f'unsupported persistent object: {pid!r}')
+
+
+def _finalized_box(prop: Property) -> t.Optional[Box]:
+  try:
+    return Box(prop.get())
+  except NoValueError:
+    return None
+
+
+def _stat(path: str) -> t.Optional[t.Tuple[int, int]]:
+  try:
+    stat = os.stat(path)
+  except OSError:
+    return None
+  return (stat.st_mtime_ns, stat.st_size)
+
+
+def _directory_mtime(path: str) -> int:
+  try:
+    return os.stat(path).st_mtime_ns if os.path.isdir(path) else -1
+  except OSError:
+    return -1
+
+
+def get_plugin_file(plugin: t.Any) -> t.Optional[str]:
+  """
+  Returns the file that a plugin (a module, class, function or an instance of a class) is defined
+  in, or #None if it is not defined in a file.
+  """
+
+  for obj in (plugin, type(plugin)):
+    try:
+      return inspect.getfile(obj)
+    except TypeError:
+      pass
+  return None
+
+
+def get_inputs(context: 'Context') -> t.Dict[str, t.Any]:
+  """
+  Returns the inputs of the configuration of the projects loaded in *context*: the modification
+  times and sizes of the build scripts and of the modules that the applied plugins are defined in,
+  and the modification times of the directories that were listed by #Project.glob().
+  """
+
+  files: t.Dict[str, t.Optional[t.Tuple[int, int]]] = {}
+  for project in context.iter_projects():
+    if project.build_script:
+      files[str(project.build_script)] = _stat(str(project.build_script))
+  for plugin in context.applied_plugins.values():
+    filename = get_plugin_file(plugin)
+    if filename is not None:
+      files[filename] = _stat(filename)
+  directories = context.file_snapshot.listed_directories()
+  return {'files': files, 'directories': directories}
+
+
+def inputs_current(inputs: t.Dict[str, t.Any]) -> bool:
+  """
+  Returns #True if none of the *inputs* returned by #get_inputs() changed since.
+  """
+
+  return (
+    all(_stat(path) == (tuple(stat) if stat is not None else None) for path, stat in inputs['files'].items()) and
+    all(_directory_mtime(path) == mtime for path, mtime in inputs['directories'].items())
+  )
+
+
+class ConfigurationCache:
+  """
+  Reads and writes the cached configuration in *filename*. The *key* is a string that identifies
+  everything that the configuration depends on apart from the files that are tracked automatically,
+  e.g. the settings and the version of Craftr.
+  """
+
+  def __init__(self, filename: Path, key: str) -> None:
+    self.filename = filename
+    self.key = key
+    #: The inputs of the configuration that was restored by the last call to #load().
+    self.inputs: t.Optional[t.Dict[str, t.Any]] = None
+
+  def __repr__(self) -> str:
+    return f'{type(self).__name__}(filename={str(self.filename)!r})'
+
+  def load(self, context: 'Context') -> t.Optional['Project']:
+    """
+    Restores the root project from the cache. Returns #None if there is no cached configuration,
+    if it was stored with a different key or if any of its inputs changed.
+    """
+
+    try:
+      with self.filename.open('rb') as fp:
+        header = pickle.load(fp)
+        if header.get('version') != _VERSION or header.get('key') != self.key:
+          return None
+        if not inputs_current(header['inputs']):
+          return None
+        root_project, properties = _Unpickler(fp, context).load()
+        inputs = header['inputs']
+    except FileNotFoundError:
+      return None
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, KeyError, TypeError, ValueError):
+      return None
+
+    # Properties that are declared on the class and not instantiated per task are not part of the
+    # pickled tasks, so every task gets its own finalized property with the stored value.
+    for task, values in properties:
+      declared = task.get_properties()
+      for name, box in values.items():
+        prop = declared[name].make_instance(task)
+        prop._finalized_value = box
+        prop._finalized = True
+        object.__setattr__(task, name, prop)
+
+    self.inputs = inputs
+    return root_project
+
+  def save(self, context: 'Context', root_project: 'Project') -> None:
+    """
+    Stores the configuration of the *root_project* and all of its subprojects, which must be
+    finalized. Raises one of the #PICKLE_ERRORS if the configuration cannot be pickled, in which
+    case the cache file is removed.
+    """
+
+    properties = []
+    for project in context.iter_projects():
+      for task in project.tasks:
+        if isinstance(task, HavingProperties):
+          properties.append((task, {name: _finalized_box(getattr(task, name)) for name in task.get_properties()}))
+
+    header = {'version': _VERSION, 'key': self.key, 'inputs': get_inputs(context)}
+    buffer = io.BytesIO()
+    pickle.dump(header, buffer, pickle.HIGHEST_PROTOCOL)
+    try:
+      _Pickler(buffer, context).dump((root_project, properties))
+    except PICKLE_ERRORS:
+      self.discard()
+      raise
+
+    self.filename.parent.mkdir(parents=True, exist_ok=True)
+    tmp = self.filename.with_name(self.filename.name + '.tmp')
+    tmp.write_bytes(buffer.getvalue())
+    os.replace(tmp, self.filename)
+
+  def discard(self) -> None:
+    """
+    Removes the cached configuration.
+    """
+
+    try:
+      self.filename.unlink()
+    except FileNotFoundError:
+      pass
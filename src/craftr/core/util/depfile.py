@@ -0,0 +1,87 @@
+"""
+Parser for the Makefile-style dependency files that compilers write with `-MD`/`-MMD`.
+"""
+
+import typing as t
+
+
+class DepfileError(Exception):
+  pass
+
+
+def _split_words(line: str) -> t.List[str]:
+  words: t.List[str] = []
+  current: t.List[str] = []
+  i = 0
+  while i < len(line):
+    char = line[i]
+    if char == '\\' and i + 1 < len(line) and line[i + 1] in ' \\#':
+      # Escaped space, backslash or hash.
+      current.append(line[i + 1])
+      i += 2
+      continue
+    if char == '$' and i + 1 < len(line) and line[i + 1] == '$':
+      current.append('$')
+      i += 2
+      continue
+    if char.isspace():
+      if current:
+        words.append(''.join(current))
+        current = []
+    else:
+      current.append(char)
+    i += 1
+  if current:
+    words.append(''.join(current))
+  return words
+
+
+def parse_depfile(text: str) -> t.Dict[str, t.List[str]]:
+  """
+  Parses the rules in a dependency file and returns the prerequisites of every target.
+  """
+
+  # Join continuation lines.
+  logical_lines: t.List[str] = []
+  buffer = ''
+  for line in text.splitlines():
+    if line.endswith('\\') and not line.endswith('\\\\'):
+      buffer += line[:-1] + ' '
+    else:
+      logical_lines.append(buffer + line)
+      buffer = ''
+  if buffer:
+    logical_lines.append(buffer)
+
+  result: t.Dict[str, t.Dict[str, None]] = {}
+  for line in logical_lines:
+    if not line.strip() or line.lstrip().startswith('#'):
+      continue
+    # Find the colon that separates the targets from the prerequisites. A colon that is followed by
+    # a backslash is part of a Windows path (e.g. `C:\\foo.h`).
+    index = 0
+    while True:
+      index = line.find(':', index)
+      if index < 0:
+        raise DepfileError(f'expected a rule, got {line!r}')
+      if line[index + 1:index + 2] not in ('\\', '/') or index == len(line) - 1:
+        break
+      index += 1
+    targets = _split_words(line[:index])
+    prerequisites = _split_words(line[index + 1:])
+    for target in targets:
+      result.setdefault(target, {}).update(dict.fromkeys(prerequisites))
+  return {target: list(deps) for target, deps in result.items()}
+
+
+def read_dependencies(filename: str) -> t.List[str]:
+  """
+  Reads a dependency file and returns the prerequisites of all of its rules.
+  """
+
+  with open(filename) as fp:
+    rules = parse_depfile(fp.read())
+  dependencies: t.Dict[str, None] = {}
+  for deps in rules.values():
+    dependencies.update(dict.fromkeys(deps))
+  return list(dependencies)
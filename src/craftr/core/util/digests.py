@@ -0,0 +1,384 @@
+"""
+Hashing of input files. Files are read through #mmap or with #io.RawIOBase.readinto() into a
+reused buffer, and many files are hashed concurrently in a thread pool (#hashlib releases the GIL
+while it digests large buffers).
+
+The #FileDigestCache caches the digests of files by their stat metadata, so that a file is hashed
+only when it changed. A file that is read by many actions or tasks (e.g. a header included by many
+C source files) is hashed at most once per build, and an unchanged file is never opened.
+
+Directories are hashed as Merkle trees: the digest of a directory is calculated from the names and
+digests of its entries. Every directory node is stored with a signature of the stat metadata of
+all files below it, so a subtree in which no file changed reuses its digest without reading any
+file, and a change to one file in a large tree only reads that file.
+"""
+
+import concurrent.futures
+import contextlib
+import contextvars
+import dataclasses
+import hashlib
+import mmap
+import os
+import stat as _stat
+import threading
+import time
+import typing as t
+from pathlib import Path
+
+from nr.caching.api import KeyDoesNotExist, KeyValueStore
+
+from craftr.core.util.caching import store_many
+from craftr.core.util.patterns import PathFilter
+
+#: The namespace in the metadata store in which file digests are persisted.
+FILE_DIGEST_NAMESPACE = 'file-digests'
+
+#: Files of at least this size are hashed through a memory map.
+MMAP_THRESHOLD = 4 * 1024 * 1024
+
+#: The size of the per-thread buffer that smaller files are read into.
+BUFFER_SIZE = 256 * 1024
+
+#: Digests of files that were modified less than this many nanoseconds ago are not persisted.
+_RACY_NS = 2 * 10 ** 9
+
+#: The stat metadata that a digest is valid for: `(st_size, st_mtime_ns, st_ino, st_ctime_ns)`.
+StatKey = t.Tuple[int, int, int, int]
+
+_local = threading.local()
+_stats: 'contextvars.ContextVar[t.Optional[DigestStats]]' = contextvars.ContextVar('_stats', default=None)
+_pool: t.Optional[concurrent.futures.ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+class _IHasher(t.Protocol):
+  def update(self, data: t.Any) -> None:  # NOSONAR
+    pass
+
+
+@dataclasses.dataclass
+class DigestStats:
+  """
+  Counts the files that were checked and hashed by #FileDigestCache.digest_many() while the
+  stats are active (see #record_stats()).
+  """
+
+  #: The number of files whose digest was requested.
+  files_checked: int = 0
+
+  #: The number of files that were read and hashed because their digest was not in the index.
+  files_hashed: int = 0
+
+  #: The number of bytes that were read and hashed.
+  bytes_hashed: int = 0
+
+
+@contextlib.contextmanager
+def record_stats() -> t.Iterator[DigestStats]:
+  """
+  Records the work done by #FileDigestCache.digest_many() in the current thread into a new
+  #DigestStats object until the context manager exits.
+  """
+
+  stats = DigestStats()
+  token = _stats.set(stats)
+  try:
+    yield stats
+  finally:
+    _stats.reset(token)
+
+
+class _TreeNode(t.NamedTuple):
+  #: A digest of the names and stat metadata of all entries in the subtree.
+  signature: str
+  #: A digest of the names and contents of all entries in the subtree.
+  digest: str
+  #: Whether any file in the subtree was modified too recently for its digest to be persisted.
+  racy: bool
+
+
+def _get_pool() -> concurrent.futures.ThreadPoolExecutor:
+  global _pool
+  with _pool_lock:
+    if _pool is None:
+      _pool = concurrent.futures.ThreadPoolExecutor(min(32, os.cpu_count() or 1), thread_name_prefix='craftr-hash')
+    return _pool
+
+
+def check_hash_algorithm(hash_algo: str) -> str:
+  """
+  Raises a #ValueError if *hash_algo* is not supported by #hashlib.
+  """
+
+  try:
+    hashlib.new(hash_algo)
+  except ValueError:
+    raise ValueError(f'unsupported hash algorithm: {hash_algo!r}')
+  return hash_algo
+
+
+def hash_file(hasher: _IHasher, path: t.Union[str, Path]) -> None:
+  """
+  Updates *hasher* with the contents of the file at *path*.
+  """
+
+  with open(path, 'rb', buffering=0) as fp:
+    size = os.fstat(fp.fileno()).st_size
+    if size >= MMAP_THRESHOLD:
+      with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        hasher.update(mapped)
+      return
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None:
+      buffer = _local.buffer = memoryview(bytearray(BUFFER_SIZE))
+    while True:
+      n = fp.readinto(buffer)
+      if not n:
+        break
+      hasher.update(buffer[:n])
+
+
+def file_digest(path: t.Union[str, Path], hash_algo: str = 'sha1') -> str:
+  hasher = hashlib.new(hash_algo)
+  hash_file(hasher, path)
+  return hasher.hexdigest()
+
+
+def stat_key(st: os.stat_result) -> StatKey:
+  return (st.st_size, st.st_mtime_ns, st.st_ino, st.st_ctime_ns)
+
+
+class FileDigestCache:
+  """
+  An index of file digests, validated by the size, modification time, inode and change time of
+  each file. A file whose stat metadata did not change reuses its digest without being read.
+  Files that need to be hashed are hashed concurrently by #digest_many().
+
+  If a *store* is specified, the index is loaded from it lazily, and new digests are written to it
+  when #flush() is called. This class is thread safe.
+
+  Paths that refer to directories are hashed with #digest_tree(). The *exclude* patterns apply to
+  all directories (see #craftr.core.util.patterns).
+  """
+
+  def __init__(
+    self,
+    store: t.Optional[KeyValueStore] = None,
+    hash_algo: str = 'sha1',
+    exclude: t.Sequence[str] = (),
+  ) -> None:
+    self.hash_algo = check_hash_algorithm(hash_algo)
+    self.exclude = list(exclude)
+    self._store = store
+    self._lock = threading.Lock()
+    self._entries: t.Dict[str, t.Optional[t.Tuple[StatKey, str]]] = {}
+    self._pending: t.Set[str] = set()
+    self._inflight: t.Dict[t.Tuple[str, StatKey], 'concurrent.futures.Future[t.Optional[str]]'] = {}
+    self._trees: t.Dict[str, t.Optional[t.Tuple[str, str]]] = {}
+    self._pending_trees: t.Set[str] = set()
+
+  def _load_entry(self, path: str) -> t.Optional[t.Tuple[StatKey, str]]:
+    if path in self._entries:
+      return self._entries[path]
+    entry = None
+    if self._store is not None:
+      try:
+        hash_algo, *key, digest = self._store.load(path).decode().split(':')
+        if hash_algo == self.hash_algo:
+          entry = (t.cast(StatKey, tuple(map(int, key))), digest)
+      except (KeyDoesNotExist, ValueError):
+        pass
+    self._entries[path] = entry
+    return entry
+
+  def _hash(self, path: str, st: os.stat_result) -> str:
+    digest = file_digest(path, self.hash_algo)
+    with self._lock:
+      self._entries[path] = (stat_key(st), digest)
+      self._inflight.pop((path, stat_key(st)), None)
+      # A file modified very recently could be modified again without changing its stat metadata.
+      # We keep it in memory, but don't persist it, so the next build hashes it again.
+      if time.time_ns() - max(st.st_mtime_ns, st.st_ctime_ns) >= _RACY_NS:
+        self._pending.add(path)
+    return digest
+
+  def digest(self, path: t.Union[str, Path]) -> t.Optional[str]:
+    """
+    Returns the digest of the file at *path*, or #None if the file does not exist.
+    """
+
+    return self.digest_many([path])[0]
+
+  def digest_many(self, paths: t.Sequence[t.Union[str, Path]]) -> t.List[t.Optional[str]]:
+    """
+    Returns the digests of the files at *paths* in the same order, with #None for files that do
+    not exist. Files that are not in the index are hashed concurrently. The digests of directories
+    are calculated with #digest_tree().
+    """
+
+    results: t.List[t.Optional[str]] = [None] * len(paths)
+    futures: t.List[t.Tuple[int, 'concurrent.futures.Future[t.Optional[str]]']] = []
+    directories: t.List[t.Tuple[int, str]] = []
+    misses: t.List[t.Tuple[str, os.stat_result, 'concurrent.futures.Future[t.Optional[str]]']] = []
+    stats = _stats.get()
+    if stats is not None:
+      stats.files_checked += len(paths)
+
+    for index, path in enumerate(map(os.path.abspath, paths)):
+      try:
+        st = os.stat(path)
+      except (FileNotFoundError, NotADirectoryError):
+        continue
+      if _stat.S_ISDIR(st.st_mode):
+        directories.append((index, path))
+        continue
+      key = stat_key(st)
+      with self._lock:
+        entry = self._load_entry(path)
+        if entry is not None and entry[0] == key:
+          results[index] = entry[1]
+          continue
+        future = self._inflight.get((path, key))
+        if future is None:
+          # Nobody else is hashing the file at the moment.
+          future = self._inflight[(path, key)] = concurrent.futures.Future()
+          misses.append((path, st, future))
+      futures.append((index, future))
+
+    if stats is not None:
+      stats.files_hashed += len(misses)
+      stats.bytes_hashed += sum(st.st_size for _, st, _ in misses)
+
+    if len(misses) == 1:
+      self._run(*misses[0])
+    elif misses:
+      pool = _get_pool()
+      for miss in misses:
+        pool.submit(self._run, *miss)
+
+    for index, path in directories:
+      results[index] = self.digest_tree(path)
+    for index, future in futures:
+      results[index] = future.result()
+    return results
+
+  def digest_tree(
+    self,
+    path: t.Union[str, Path],
+    include: t.Sequence[str] = (),
+    exclude: t.Sequence[str] = (),
+  ) -> t.Optional[str]:
+    """
+    Returns the Merkle tree digest of the directory at *path*, or #None if the directory does not
+    exist. Only the files that match the *include* patterns (if any) and none of the *exclude*
+    patterns are considered. Patterns are matched against the paths relative to *path*.
+
+    Symbolic links to files are hashed like files, other symbolic links by their target. Only the
+    files in subtrees that changed since the last call are looked up in the index.
+    """
+
+    path_filter = PathFilter(include, [*self.exclude, *exclude])
+    try:
+      return self._digest_directory(os.path.abspath(path), '', path_filter).digest
+    except (FileNotFoundError, NotADirectoryError):
+      return None
+
+  def _load_tree(self, key: str) -> t.Optional[t.Tuple[str, str]]:
+    with self._lock:
+      if key in self._trees:
+        return self._trees[key]
+      node = None
+      if self._store is not None:
+        try:
+          hash_algo, signature, digest = self._store.load(key).decode().split(':')
+          if hash_algo == self.hash_algo:
+            node = (signature, digest)
+        except (KeyDoesNotExist, ValueError):
+          pass
+      self._trees[key] = node
+      return node
+
+  def _digest_directory(self, path: str, relpath: str, path_filter: PathFilter) -> _TreeNode:
+    with os.scandir(path) as it:
+      entries = sorted(it, key=lambda e: e.name)
+
+    now = time.time_ns()
+    racy = False
+    signature = hashlib.new(self.hash_algo)
+    files: t.List[t.Tuple[str, str]] = []
+    children: t.List[t.Tuple[str, str, str]] = []  # (kind, name, digest or target)
+    for entry in entries:
+      entry_relpath = f'{relpath}/{entry.name}' if relpath else entry.name
+      if entry.is_dir(follow_symlinks=False):
+        if path_filter.is_excluded(entry_relpath, True):
+          continue
+        node = self._digest_directory(entry.path, entry_relpath, path_filter)
+        signature.update(f'd {entry.name} {node.signature}\n'.encode('utf-8', 'surrogateescape'))
+        children.append(('d', entry.name, node.digest))
+        racy = racy or node.racy
+      elif entry.is_file():
+        if not path_filter.selects_file(entry_relpath):
+          continue
+        st = entry.stat()
+        signature.update(f'f {entry.name} {stat_key(st)}\n'.encode('utf-8', 'surrogateescape'))
+        files.append((entry.name, entry.path))
+        racy = racy or now - max(st.st_mtime_ns, st.st_ctime_ns) < _RACY_NS
+      elif entry.is_symlink():
+        if path_filter.is_excluded(entry_relpath, False):
+          continue
+        target = os.readlink(entry.path)
+        signature.update(f'l {entry.name} {target}\n'.encode('utf-8', 'surrogateescape'))
+        children.append(('l', entry.name, target))
+
+    key = f'{path}{os.sep}#{path_filter.key}'
+    stored = self._load_tree(key)
+    if stored is not None and stored[0] == signature.hexdigest():
+      return _TreeNode(stored[0], stored[1], racy)
+
+    for (name, _), digest in zip(files, self.digest_many([p for _, p in files])):
+      children.append(('f', name, digest or '-'))
+    children.sort(key=lambda x: x[1])
+    hasher = hashlib.new(self.hash_algo)
+    for kind, name, value in children:
+      hasher.update(f'{kind} {name} {value}\n'.encode('utf-8', 'surrogateescape'))
+
+    node = _TreeNode(signature.hexdigest(), hasher.hexdigest(), racy)
+    with self._lock:
+      self._trees[key] = (node.signature, node.digest)
+      if not racy:
+        self._pending_trees.add(key)
+    return node
+
+  def _run(self, path: str, st: os.stat_result, future: 'concurrent.futures.Future[t.Optional[str]]') -> None:
+    try:
+      future.set_result(self._hash(path, st))
+    except BaseException as exc:
+      with self._lock:
+        self._inflight.pop((path, stat_key(st)), None)
+      if isinstance(exc, FileNotFoundError):
+        future.set_result(None)
+      else:
+        future.set_exception(exc)
+
+  def flush(self) -> None:
+    """
+    Writes the digests that were computed since the last flush to the store at once (see
+    #craftr.core.util.caching.store_many()).
+    """
+
+    if self._store is None:
+      return
+    with self._lock:
+      values: t.Dict[str, bytes] = {}
+      pending, self._pending = self._pending, set()
+      for path in sorted(pending):
+        entry = self._entries[path]
+        assert entry is not None
+        values[path] = ':'.join(map(str, [self.hash_algo, *entry[0], entry[1]])).encode()
+      pending_trees, self._pending_trees = self._pending_trees, set()
+      for key in sorted(pending_trees):
+        node = self._trees[key]
+        assert node is not None
+        values[key] = f'{self.hash_algo}:{node[0]}:{node[1]}'.encode()
+      store_many(self._store, values)
@@ -0,0 +1,103 @@
+"""
+A canonical binary encoding of values, used to detect if the inputs of a task changed. Unlike
+#repr(), the encoding does not depend on the order of set elements or dictionary keys and is
+supported for the following types:
+
+* `None`, #bool, #int, #float, #str, #bytes
+* #pathlib.PurePath
+* #enum.Enum
+* #list, #tuple, #set, #frozenset, #dict
+* dataclasses (by their #repr() if not all of their fields are set)
+* objects that implement a `__craftr_fingerprint__()` method, which must return a value that can
+  be encoded in place of the object (e.g. tasks, which are encoded by their path)
+* objects of other types are encoded by their #repr(), but only if their class overrides the
+  default `object.__repr__()` (which includes the address of the object)
+"""
+
+import dataclasses
+import enum
+import struct
+import typing as t
+from pathlib import PurePath
+
+_LENGTH = struct.Struct('>I')
+_FLOAT = struct.Struct('>d')
+
+
+class _Encoder:
+
+  def __init__(self) -> None:
+    self.buffer = bytearray()
+
+  def _bytes(self, tag: bytes, data: bytes) -> None:
+    self.buffer += tag
+    self.buffer += _LENGTH.pack(len(data))
+    self.buffer += data
+
+  def _type_name(self, tag: bytes, type_: type) -> None:
+    self._bytes(tag, f'{type_.__module__}.{type_.__qualname__}'.encode())
+
+  def encode(self, value: t.Any) -> None:
+    if value is None:
+      self.buffer += b'N'
+    elif value is True:
+      self.buffer += b'T'
+    elif value is False:
+      self.buffer += b'F'
+    elif hasattr(value, '__craftr_fingerprint__'):
+      self._type_name(b'h', type(value))
+      self.encode(value.__craftr_fingerprint__())
+    elif isinstance(value, enum.Enum):
+      self._type_name(b'e', type(value))
+      self._bytes(b'', value.name.encode())
+    elif isinstance(value, int):
+      self._bytes(b'i', str(value).encode())
+    elif isinstance(value, float):
+      self.buffer += b'f' + _FLOAT.pack(value)
+    elif isinstance(value, str):
+      self._bytes(b's', value.encode('utf-8', 'surrogatepass'))
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+      self._bytes(b'b', bytes(value))
+    elif isinstance(value, PurePath):
+      self._bytes(b'p', str(value).encode('utf-8', 'surrogateescape'))
+    elif isinstance(value, (list, tuple)):
+      self.buffer += b'l' + _LENGTH.pack(len(value))
+      for item in value:
+        self.encode(item)
+    elif isinstance(value, (set, frozenset)):
+      self.buffer += b'S' + _LENGTH.pack(len(value))
+      for item in sorted(map(fingerprint, value)):
+        self.buffer += item
+    elif isinstance(value, dict):
+      self.buffer += b'd' + _LENGTH.pack(len(value))
+      for key, item in sorted((fingerprint(k), fingerprint(v)) for k, v in value.items()):
+        self.buffer += key
+        self.buffer += item
+    elif dataclasses.is_dataclass(value) and not isinstance(value, type):
+      try:
+        fields = [(field.name, getattr(value, field.name)) for field in dataclasses.fields(value)]
+      except AttributeError:
+        self._repr(value)
+      else:
+        self._type_name(b'D', type(value))
+        for name, item in fields:
+          self._bytes(b'', name.encode())
+          self.encode(item)
+    else:
+      self._repr(value)
+
+  def _repr(self, value: t.Any) -> None:
+    if type(value).__repr__ is object.__repr__:
+      raise TypeError(f'cannot fingerprint value of type {type(value).__name__} (implement __craftr_fingerprint__())')
+    self._type_name(b'r', type(value))
+    self._bytes(b'', repr(value).encode())
+
+
+def fingerprint(value: t.Any) -> bytes:
+  """
+  Returns the canonical encoding of *value*. Equal values have the same encoding.
+  """
+
+  encoder = _Encoder()
+  encoder.encode(value)
+  return bytes(encoder.buffer)
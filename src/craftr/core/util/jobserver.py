@@ -0,0 +1,202 @@
+"""
+Support for the POSIX jobserver protocol of GNU make. Child processes such as `make`, `cargo` or
+`ninja` that support the protocol draw their additional job tokens from the same pipe, so that the
+total load stays within the configured job count.
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import re
+import select
+import threading
+import typing as t
+
+from craftr.core.util.scheduling import JobLimit
+
+_JOBSERVER_ARG = re.compile(r'--jobserver-(?:auth|fds)=(?:(\d+),(\d+)|fifo:(\S+))')
+_JOBS_ARG = re.compile(r'^-j\d*$|^--jobserver-(?:auth|fds)=')
+
+
+class Jobserver(JobLimit):
+  """
+  A #JobLimit that draws tokens from a GNU make jobserver pipe. Like every client of a jobserver,
+  the process owns one implicit token that is not stored in the pipe. Use #create() to become the
+  jobserver for child processes, or #from_environ() to act as a client of an outer `make`.
+
+  Additionally, no more than *jobs* slots are handed out by this process.
+  """
+
+  def __init__(
+    self,
+    read_fd: int,
+    write_fd: int,
+    jobs: int,
+    fifo: t.Optional[str] = None,
+    owned: bool = False,
+  ) -> None:
+    super().__init__(jobs)
+    self.read_fd = read_fd
+    self.write_fd = write_fd
+    self.fifo = fifo
+    self._owned = owned
+    self._lock = threading.Lock()
+    self._implicit_taken = False
+    self._tokens: t.List[bytes] = []
+    self._nonblock_fd, self._nonblocking = _open_nonblocking(read_fd, fifo)
+    self._wake_read, self._wake_write = os.pipe()
+    os.set_blocking(self._wake_read, False)
+    os.set_blocking(self._wake_write, False)
+    self._pool: t.Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+  def __repr__(self) -> str:
+    return f'{type(self).__name__}(read_fd={self.read_fd!r}, write_fd={self.write_fd!r}, jobs={self.jobs!r})'
+
+  @classmethod
+  def create(cls, jobs: int) -> 'Jobserver':
+    """
+    Create a new jobserver pipe that holds `jobs - 1` tokens (the last job is the implicit token
+    of this process).
+    """
+
+    read_fd, write_fd = os.pipe()
+    os.set_inheritable(read_fd, True)
+    os.set_inheritable(write_fd, True)
+    os.write(write_fd, b'+' * (jobs - 1))
+    return cls(read_fd, write_fd, jobs, owned=True)
+
+  @classmethod
+  def from_environ(cls, jobs: int, environ: t.Optional[t.Mapping[str, str]] = None) -> t.Optional['Jobserver']:
+    """
+    Returns a client for the jobserver described in the `MAKEFLAGS` environment variable, or #None
+    if there is no jobserver or if its file descriptors were not passed to this process.
+    """
+
+    makeflags = (os.environ if environ is None else environ).get('MAKEFLAGS', '')
+    match = None
+    for match in _JOBSERVER_ARG.finditer(makeflags):
+      pass  # The last occurrence takes precedence.
+    if match is None:
+      return None
+    if match.group(3):
+      try:
+        fd = os.open(match.group(3), os.O_RDWR)
+      except OSError:
+        return None
+      return cls(fd, fd, jobs, fifo=match.group(3), owned=True)
+    read_fd, write_fd = int(match.group(1)), int(match.group(2))
+    try:
+      os.fstat(read_fd)
+      os.fstat(write_fd)
+    except OSError:
+      return None
+    return cls(read_fd, write_fd, jobs)
+
+  @property
+  def makeflags(self) -> str:
+    """ The jobserver arguments to pass to child processes in `MAKEFLAGS`. """
+
+    if self.fifo:
+      return f'-j{self.jobs} --jobserver-auth=fifo:{self.fifo}'
+    fds = f'{self.read_fd},{self.write_fd}'
+    return f'-j{self.jobs} --jobserver-fds={fds} --jobserver-auth={fds}'
+
+  def get_subprocess_kwargs(self, environ: t.Optional[t.Mapping[str, str]] = None) -> t.Dict[str, t.Any]:
+    """
+    Returns the `env` and `pass_fds` keyword arguments for #subprocess.Popen() to make the
+    jobserver available to the child process.
+    """
+
+    env = dict(os.environ if environ is None else environ)
+    flags = [x for x in env.get('MAKEFLAGS', '').split() if not _JOBS_ARG.match(x)]
+    env['MAKEFLAGS'] = ' '.join(flags + [self.makeflags])
+    return {'env': env, 'pass_fds': () if self.fifo else (self.read_fd, self.write_fd)}
+
+  def _try_take(self) -> bool:
+    with self._lock:
+      if not self._implicit_taken:
+        self._implicit_taken = True
+        return True
+    if not self._nonblocking and not select.select([self._nonblock_fd], [], [], 0)[0]:
+      return False
+    try:
+      token = os.read(self._nonblock_fd, 1)
+    except BlockingIOError:
+      return False
+    if not token:
+      raise RuntimeError('jobserver pipe was closed')
+    with self._lock:
+      self._tokens.append(token)
+    return True
+
+  def _wait_for_token(self) -> None:
+    while not self._try_take():
+      select.select([self._nonblock_fd, self._wake_read], [], [])
+      try:
+        os.read(self._wake_read, 1024)
+      except BlockingIOError:
+        pass
+
+  def acquire(self) -> None:
+    super().acquire()
+    try:
+      self._wait_for_token()
+    except BaseException:
+      super().release()
+      raise
+
+  async def acquire_async(self) -> None:
+    await super().acquire_async()
+    try:
+      if not self._try_take():
+        # Wait in a thread of our own, not in the default executor of the event loop, which the
+        # holders of job slots may need in order to finish their jobs and give the tokens back. At
+        # most *jobs* coroutines hold a slot and wait for a token at the same time.
+        with self._lock:
+          if self._pool is None:
+            self._pool = concurrent.futures.ThreadPoolExecutor(self.jobs, thread_name_prefix='craftr-jobserver')
+          pool = self._pool
+        await asyncio.get_running_loop().run_in_executor(pool, self._wait_for_token)
+    except BaseException:
+      super().release()
+      raise
+
+  def release(self) -> None:
+    with self._lock:
+      if self._tokens:
+        os.write(self.write_fd, self._tokens.pop())
+      else:
+        assert self._implicit_taken
+        self._implicit_taken = False
+        try:
+          os.write(self._wake_write, b'.')
+        except BlockingIOError:
+          pass  # Enough wake-ups are pending already.
+    super().release()
+
+  def close(self) -> None:
+    """ Close the file descriptors that were opened by this object. """
+
+    if self._pool is not None:
+      self._pool.shutdown()
+    fds = {self._nonblock_fd, self._wake_read, self._wake_write}
+    if self._owned:
+      fds |= {self.read_fd, self.write_fd}
+    for fd in fds:
+      os.close(fd)
+
+
+def _open_nonblocking(read_fd: int, fifo: t.Optional[str]) -> t.Tuple[int, bool]:
+  """
+  Opens a new, non-blocking file description for the read end of the jobserver pipe. We can't set
+  `O_NONBLOCK` on the shared file description because it would also affect child processes.
+  Returns the file descriptor and whether it is non-blocking.
+  """
+
+  path = fifo or f'/proc/self/fd/{read_fd}'
+  try:
+    return os.open(path, os.O_RDONLY | os.O_NONBLOCK), True
+  except OSError:
+    # Without a private file description, fall back to a duplicate of the shared one. Another
+    # process may then take the token between our select() and read(), making us wait longer.
+    return os.dup(read_fd), False
@@ -0,0 +1,63 @@
+"""
+Removes the entries of the metadata store that belong to tasks or files that no longer exist.
+"""
+
+import dataclasses
+import os
+import typing as t
+
+from nr.caching.api import NamespaceStore
+
+from craftr.core.base import ACTION_METADATA_NAMESPACE, TASK_DURATION_NAMESPACE
+from craftr.core.impl.PropertiesTask import TASK_HASH_NAMESPACE
+from craftr.core.util.caching import PrunableStore
+from craftr.core.util.digests import FILE_DIGEST_NAMESPACE
+from craftr.core.util.snapshot import DIRECTORY_LISTING_NAMESPACE
+from craftr.core.util.task_state import format_size
+
+
+@dataclasses.dataclass
+class GcReport:
+  #: The number of removed entries and their size in bytes by namespace.
+  namespaces: t.Dict[str, t.Tuple[int, int]] = dataclasses.field(default_factory=dict)
+
+  @property
+  def removed(self) -> int:
+    return sum(x[0] for x in self.namespaces.values())
+
+  @property
+  def size(self) -> int:
+    return sum(x[1] for x in self.namespaces.values())
+
+  def describe(self) -> str:
+    return f'Removed {self.removed} stale metadata entries ({format_size(self.size)})'
+
+
+def _file_path(key: str) -> str:
+  # Directory nodes are stored as `<path>/#<filter>` (see #FileDigestCache.digest_tree()).
+  return key.rpartition(os.sep + '#')[0] if os.sep + '#' in key else key
+
+
+def collect_garbage(store: NamespaceStore, task_paths: t.Collection[str]) -> GcReport:
+  """
+  Removes the task hashes and durations of tasks whose path is not in *task_paths*, the file
+  digests and directory listings of paths that no longer exist, and the action metadata of
+  actions whose output files all no longer exist. Namespaces of stores that do not implement
+  #PrunableStore are skipped.
+  """
+
+  task_paths = set(task_paths)
+  keep_functions: t.Dict[str, t.Callable[[str], bool]] = {
+    TASK_HASH_NAMESPACE: lambda key: key in task_paths,
+    TASK_DURATION_NAMESPACE: lambda key: key.partition('#')[0] in task_paths,
+    FILE_DIGEST_NAMESPACE: lambda key: os.path.exists(_file_path(key)),
+    DIRECTORY_LISTING_NAMESPACE: os.path.isdir,
+    ACTION_METADATA_NAMESPACE: lambda key: any(os.path.exists(x) for x in key.split(os.pathsep)),
+  }
+
+  report = GcReport()
+  for namespace, keep in keep_functions.items():
+    kv_store = store.namespace(namespace)
+    if isinstance(kv_store, PrunableStore):
+      report.namespaces[namespace] = kv_store.prune(keep)
+  return report
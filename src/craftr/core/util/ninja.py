@@ -0,0 +1,250 @@
+"""
+Export the tasks and actions of a build to a Ninja build file, so that the build can be configured
+with Craftr and then be executed with `ninja`.
+"""
+
+import base64
+import locale
+import os
+import shlex
+import sys
+import typing as t
+from pathlib import Path
+
+from craftr.core.base import Action, Task
+from craftr.core.impl.actions.CommandAction import CommandAction
+from craftr.core.impl.actions.CreateDirectoryAction import CreateDirectoryAction
+from craftr.core.impl.actions.NoopAction import NoopAction
+from craftr.core.impl.actions.WriteFileAction import WriteFileAction
+from craftr.core.util.scheduling import ReadyQueue
+
+if t.TYPE_CHECKING:
+  from craftr.core.graph import BaseGraph
+
+REGENERATE_TARGET = 'craftr-regenerate'
+
+#: The Python code that writes the contents of a #WriteFileAction (base64 encoded in `sys.argv[2]`)
+#: to the file at `sys.argv[1]`.
+_WRITE_FILE_SCRIPT = (
+  'import base64, os, sys; os.makedirs(os.path.dirname(sys.argv[1]), exist_ok=True); '
+  'open(sys.argv[1], "wb").write(base64.b64decode(sys.argv[2]))'
+)
+
+
+class NinjaExportError(Exception):
+  pass
+
+
+def escape(value: str) -> str:
+  """ Escape a value for use in a Ninja variable. """
+
+  assert '\n' not in value, 'Ninja variables cannot contain newlines'
+  return value.replace('$', '$$')
+
+
+def escape_path(path: str) -> str:
+  """ Escape a path for use in a Ninja `build` statement. """
+
+  return escape(path).replace(' ', '$ ').replace(':', '$:')
+
+
+class NinjaWriter:
+  """
+  A minimal writer for Ninja build files.
+  """
+
+  def __init__(self, fp: t.TextIO) -> None:
+    self._fp = fp
+
+  def newline(self) -> None:
+    self._fp.write('\n')
+
+  def comment(self, text: str) -> None:
+    for line in text.splitlines():
+      self._fp.write(f'# {line}\n')
+
+  def variable(self, key: str, value: str, indent: int = 0) -> None:
+    self._fp.write(f'{"  " * indent}{key} = {escape(value)}\n')
+
+  def rule(self, name: str, command: str, **variables: t.Union[str, int]) -> None:
+    self._fp.write(f'rule {name}\n')
+    self._fp.write(f'  command = {command}\n')
+    for key, value in variables.items():
+      self._fp.write(f'  {key} = {value}\n')
+
+  def build(
+    self,
+    outputs: t.Sequence[str],
+    rule: str,
+    inputs: t.Sequence[str] = (),
+    implicit: t.Sequence[str] = (),
+    order_only: t.Sequence[str] = (),
+    variables: t.Optional[t.Dict[str, str]] = None,
+  ) -> None:
+    line = 'build ' + ' '.join(map(escape_path, outputs)) + ': ' + rule
+    if inputs:
+      line += ' ' + ' '.join(map(escape_path, inputs))
+    if implicit:
+      line += ' | ' + ' '.join(map(escape_path, implicit))
+    if order_only:
+      line += ' || ' + ' '.join(map(escape_path, order_only))
+    self._fp.write(line + '\n')
+    for key, value in (variables or {}).items():
+      self.variable(key, value, 1)
+
+  def default(self, targets: t.Sequence[str]) -> None:
+    self._fp.write('default ' + ' '.join(map(escape_path, targets)) + '\n')
+
+
+class _Exporter:
+
+  def __init__(self, writer: NinjaWriter) -> None:
+    self.writer = writer
+    self.cwd = os.getcwd()
+
+  def _shell_command(self, commands: t.List[t.List[str]], working_directory: t.Optional[str]) -> str:
+    cd = 'cd ' + shlex.quote(os.path.abspath(working_directory or self.cwd))
+    return ' && '.join([cd] + [' '.join(map(shlex.quote, command)) for command in commands])
+
+  def _abspaths(self, paths: t.Optional[t.Sequence[str]], working_directory: t.Optional[str]) -> t.List[str]:
+    # Relative paths are relative to the directory that the commands run in.
+    directory = os.path.abspath(working_directory or self.cwd)
+    return [os.path.normpath(os.path.join(directory, p)) for p in (paths or [])]
+
+  def _write_file_command(self, task: Task, action: WriteFileAction) -> t.List[str]:
+    if action.text is not None and action.data is not None:
+      raise NinjaExportError(f'WriteFileAction in task {task.path!r} has both text and data')
+    if action.text is not None:
+      data = action.text.encode(action.encoding or locale.getpreferredencoding(False))
+    elif action.data is not None:
+      data = action.data
+    else:
+      raise NinjaExportError(f'WriteFileAction in task {task.path!r} has no text or data')
+    path = os.path.abspath(action.file_path)
+    return [sys.executable, '-c', _WRITE_FILE_SCRIPT, path, base64.b64encode(data).decode('ascii')]
+
+  def export_task(self, task: Task, dependency_targets: t.List[str]) -> t.List[str]:
+    """
+    Writes the build edges for all actions of the *task* and returns the outputs of the task.
+    """
+
+    queue = ReadyQueue(task.get_action_graph())
+    outputs: t.List[t.List[str]] = []
+    task_outputs: t.List[str] = []
+
+    for index, action in enumerate(queue.values):
+      # Outputs of the actions that this action depends on become order-only dependencies. Actions
+      # that produce no edge pass on the outputs of their own dependencies.
+      order_only = list(dependency_targets)
+      for dep in queue.dependencies[index]:
+        order_only += [x for x in outputs[dep] if x not in order_only]
+
+      edge_outputs = self._export_action(task, index, action, order_only)
+      if edge_outputs is None:
+        outputs.append(order_only)
+      else:
+        outputs.append(edge_outputs)
+        task_outputs += edge_outputs
+
+    return task_outputs
+
+  def _export_action(self, task: Task, index: int, action: Action, order_only: t.List[str]) -> t.Optional[t.List[str]]:
+    description = f'{task.path} [{index}]'
+    inputs: t.List[str]
+    outputs: t.List[str]
+
+    if isinstance(action, NoopAction):
+      return None
+
+    if isinstance(action, WriteFileAction):
+      # The contents are known at configure time and passed on the command line. Ninja executes the
+      # command again when the contents (and thus the command) change.
+      commands = [self._write_file_command(task, action)]
+      inputs = []
+      outputs = [os.path.abspath(action.file_path)]
+      depfile = None
+      working_directory = None
+      description = f'Writing {outputs[0]}'
+    elif isinstance(action, CreateDirectoryAction):
+      commands = [['mkdir', '-p', os.path.abspath(action.path)]]
+      inputs = []
+      outputs = []
+      depfile = None
+      working_directory = None
+    elif isinstance(action, CommandAction):
+      commands = action.get_commands()
+      working_directory = action.working_directory
+      inputs = self._abspaths(action.input_files, working_directory)
+      outputs = self._abspaths(action.output_files, working_directory)
+      depfile = self._abspaths([action.depfile], working_directory)[0] if action.depfile else None
+      description = ' '.join(commands[0]) if commands else description
+    else:
+      raise NinjaExportError(f'action of type {type(action).__name__} in task {task.path!r} cannot be exported')
+
+    variables = {'cmd': self._shell_command(commands, working_directory), 'desc': description}
+    if not outputs:
+      # Without declared outputs, the action runs every time (like a phony target with a command).
+      outputs = [f'{task.path}#{index}']
+    if depfile:
+      variables['depfile'] = depfile
+    self.writer.build(
+      outputs, 'command_with_depfile' if depfile else 'command', inputs,
+      order_only=[x for x in order_only if x not in inputs], variables=variables)
+    return outputs
+
+
+def export_ninja(
+  graph: 'BaseGraph[Task]',
+  fp: t.TextIO,
+  default_tasks: t.Collection[Task] = (),
+  build_files: t.Sequence[Path] = (),
+  regenerate_command: t.Optional[t.List[str]] = None,
+) -> None:
+  """
+  Writes a Ninja build file for all tasks in *graph* to *fp*. Every #CommandAction becomes a build
+  edge with its declared input and output files and depfile, every task becomes a phony target
+  that depends on the outputs of its actions. Dependencies between actions and tasks are expressed
+  as order-only dependencies. Actions other than #CommandAction, #CreateDirectoryAction,
+  #WriteFileAction and #NoopAction can not be exported and raise a #NinjaExportError. Relative
+  paths of a #CommandAction are relative to its working directory. Exporting does not execute any
+  action, the file of a #WriteFileAction is written by Ninja.
+
+  All paths in the build file are absolute, except for the path of the build file itself in the
+  regenerate edge. If a *regenerate_command* is specified, a rule is added that re-runs the command
+  when any of the *build_files* change (i.e. the build scripts and settings that the Ninja file was
+  generated from). Ninja must then be run from the current working directory (e.g. with
+  `ninja -f out/build.ninja`), as it finds the edge that regenerates the build file by the path
+  that it was given.
+  """
+
+  writer = NinjaWriter(fp)
+  writer.comment('This file was generated by Craftr. Do not edit.')
+  writer.variable('ninja_required_version', '1.3')
+  writer.newline()
+  writer.rule('command', '$cmd', description='$desc')
+  writer.rule('command_with_depfile', '$cmd', description='$desc', depfile='$depfile', deps='gcc')
+
+  if regenerate_command:
+    command = ' '.join(map(shlex.quote, [sys.executable, '-m', 'craftr'] + regenerate_command))
+    writer.rule('regenerate', escape('cd ' + shlex.quote(os.getcwd()) + ' && ' + command),
+      description='Regenerating the Ninja build file', generator=1)
+  writer.newline()
+
+  exporter = _Exporter(writer)
+  queue = ReadyQueue(graph)
+  for index, task in enumerate(queue.values):
+    writer.comment(f'Task {task.path}')
+    dependency_targets = [queue.values[x].path for x in queue.dependencies[index]]
+    outputs = exporter.export_task(task, dependency_targets)
+    writer.build([task.path], 'phony', outputs, order_only=dependency_targets)
+    writer.newline()
+
+  if regenerate_command:
+    # Ninja refers to the build file by the path it was given, relative to the directory it runs in.
+    output_file = os.path.relpath(os.path.abspath(getattr(fp, 'name', 'build.ninja')))
+    writer.build([output_file], 'regenerate', [os.path.abspath(f) for f in build_files])
+    writer.build([REGENERATE_TARGET], 'phony', [output_file])
+    writer.newline()
+
+  if default_tasks:
+    writer.default([task.path for task in default_tasks])
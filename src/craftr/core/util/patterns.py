@@ -0,0 +1,130 @@
+"""
+Matching of relative paths against glob patterns, as used for the include and exclude patterns of
+directory inputs and for #Project.glob().
+
+* `*` matches any number of characters except `/`, `?` matches a single character except `/`
+  and `[...]` matches a character class
+* `**` as a full path component matches zero or more directories
+* a pattern that contains no `/` (except for a trailing one) matches the name of a file or
+  directory at any level, e.g. `*.pyc` or `__pycache__/` (unless the pattern is *anchored*, as
+  the patterns passed to #Project.glob() are)
+* a pattern that ends with `/` only matches directories (a directory that matches an exclude
+  pattern is not descended into)
+* unless *match_hidden* is enabled, names that start with `.` are only matched by a pattern
+  component that starts with `.` (like #glob.glob()), e.g. `**/*.c` does not match `.build/a.c`
+
+Paths are always matched with `/` as the separator.
+"""
+
+import hashlib
+import re
+import typing as t
+
+
+def _translate_component(component: str) -> str:
+  result = []
+  i = 0
+  while i < len(component):
+    char = component[i]
+    if char == '*':
+      result.append('[^/]*')
+    elif char == '?':
+      result.append('[^/]')
+    elif char == '[':
+      end = component.find(']', i + 2)
+      if end < 0:
+        result.append(re.escape(char))
+      else:
+        body = component[i + 1:end]
+        if body.startswith('!'):
+          body = '^' + body[1:]
+        result.append('[' + body.replace('\\', '\\\\') + ']')
+        i = end
+    else:
+      result.append(re.escape(char))
+    i += 1
+  return ''.join(result)
+
+
+def translate(pattern: str, match_hidden: bool = True) -> str:
+  """
+  Translates a pattern that is matched against the full relative path to a regular expression.
+  """
+
+  name = '[^/]+' if match_hidden else r'(?!\.)[^/]+'
+  components = pattern.split('/')
+  parts = []
+  for index, component in enumerate(components):
+    last = index == len(components) - 1
+    if component == '**':
+      if match_hidden:
+        parts.append('.*' if last else '(?:[^/]+/)*')
+      else:
+        parts.append(f'(?:{name}(?:/{name})*)?' if last else f'(?:{name}/)*')
+    else:
+      prefix = '' if match_hidden or component.startswith('.') else r'(?!\.)'
+      parts.append(prefix + _translate_component(component) + ('' if last else '/'))
+  return '(?s:' + ''.join(parts) + r')\Z'
+
+
+class PathPattern:
+  """
+  A compiled glob pattern. An *anchored* pattern is always matched against the full relative path.
+  If *match_hidden* is disabled, wildcards do not match names that start with `.`.
+  """
+
+  def __init__(self, pattern: str, anchored: bool = False, match_hidden: bool = True) -> None:
+    self.pattern = pattern
+    self.directory_only = pattern.endswith('/')
+    pattern = pattern.rstrip('/')
+    if '/' not in pattern and not anchored:
+      pattern = '**/' + pattern
+    self._regex = re.compile(translate(pattern.lstrip('/'), match_hidden))
+
+  def __repr__(self) -> str:
+    return f'PathPattern({self.pattern!r})'
+
+  def matches(self, path: str, is_dir: bool = False) -> bool:
+    """
+    Returns #True if the relative *path* matches the pattern.
+    """
+
+    if self.directory_only and not is_dir:
+      return False
+    return self._regex.match(path) is not None
+
+
+class PathFilter:
+  """
+  Selects the files in a directory tree by *include* and *exclude* patterns. If no include patterns
+  are specified, all files that are not excluded are selected.
+  """
+
+  def __init__(self, include: t.Sequence[str] = (), exclude: t.Sequence[str] = ()) -> None:
+    self.include = [PathPattern(x) for x in include]
+    self.exclude = [PathPattern(x) for x in exclude]
+
+  def __repr__(self) -> str:
+    return f'PathFilter(include={[x.pattern for x in self.include]!r}, exclude={[x.pattern for x in self.exclude]!r})'
+
+  @property
+  def key(self) -> str:
+    """
+    A short string that identifies the patterns of the filter.
+    """
+
+    patterns = '\0'.join(x.pattern for x in self.include) + '\1' + '\0'.join(x.pattern for x in self.exclude)
+    return hashlib.sha1(patterns.encode()).hexdigest()[:12]
+
+  def is_excluded(self, path: str, is_dir: bool) -> bool:
+    return any(x.matches(path, is_dir) for x in self.exclude)
+
+  def selects_file(self, path: str) -> bool:
+    """
+    Returns #True if the file at the relative *path* is selected by the filter. Note that this does
+    not check if any of the parent directories are excluded.
+    """
+
+    if self.is_excluded(path, False):
+      return False
+    return not self.include or any(x.matches(path) for x in self.include)
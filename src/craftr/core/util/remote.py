@@ -0,0 +1,307 @@
+"""
+Client side of the remote execution protocol. A #CommandAction that declares its input and output
+files can be sent to a worker process (see #craftr.worker), which runs the commands in a sandbox
+directory and sends the output files back.
+
+Messages are JSON objects, each prefixed with its length as a 4-byte big-endian integer. After
+connecting, the client sends a `hello` message with the shared token of the worker (if it requires
+one) and the worker responds with the number of actions it executes concurrently, or with an
+`error` before it closes the connection. Then the client sends `execute` requests, one at a time
+per connection:
+
+    {"type": "execute", "root": "/home/me/project", "working_directory": "/home/me/project",
+     "commands": [["gcc", "-MD", "-c", "/home/me/project/main.c", "-o", "/home/me/project/main.o"]],
+     "inputs": {"/home/me/project/main.c": "<base64>", "/home/me/project/main.h": "<base64>"},
+     "outputs": ["/home/me/project/main.o", "/home/me/project/main.d"],
+     "depfile": "/home/me/project/main.d"}
+
+The inputs are the declared input files of the action and the files in the *root* directory that
+its depfile listed when the action was last executed (e.g. included headers). Files outside of the
+*root* directory, like system headers, must exist on the worker. The worker replaces the *root*
+directory in the command arguments and paths with its sandbox directory and responds with
+
+    {"returncode": 0, "failed_command": null, "output": "<base64>",
+     "outputs": {"/home/me/project/main.o": "<base64>", "/home/me/project/main.d": "<base64>"}}
+
+The sandbox directory is replaced with the *root* directory again in the command output and in the
+depfile.
+"""
+
+import base64
+import json
+import os
+import re
+import socket
+import struct
+import subprocess as sp
+import threading
+import typing as t
+
+from craftr.core.base import Action, ActionContext
+from craftr.core.impl.actions.CommandAction import CommandAction, _write_output
+
+PROTOCOL_VERSION = 2
+_HEADER = struct.Struct('>I')
+
+#: Matches the end of a directory in a path: a path separator, or a character that does not
+#: belong to a file name (or the end of the string).
+_DIRECTORY_END = r'(?![^/\\\s\'":;,=)\]}>])'
+
+
+class RemoteExecutionError(Exception):
+  pass
+
+
+def parse_address(address: str) -> t.Tuple[str, int]:
+  """ Parses a `host:port` string. """
+
+  host, sep, port = address.rpartition(':')
+  if not sep or not port.isdigit():
+    raise ValueError(f'invalid address: {address!r}')
+  return host or '127.0.0.1', int(port)
+
+
+def send_message(sock: socket.socket, message: t.Dict[str, t.Any]) -> None:
+  data = json.dumps(message).encode()
+  sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> t.Optional[bytes]:
+  buffer = bytearray()
+  while len(buffer) < size:
+    chunk = sock.recv(min(size - len(buffer), 1 << 20))
+    if not chunk:
+      if buffer:
+        raise RemoteExecutionError('connection closed in the middle of a message')
+      return None
+    buffer += chunk
+  return bytes(buffer)
+
+
+def recv_message(sock: socket.socket) -> t.Optional[t.Dict[str, t.Any]]:
+  """ Receives the next message from *sock*. Returns #None if the connection was closed. """
+
+  header = _recv_exactly(sock, _HEADER.size)
+  if header is None:
+    return None
+  data = _recv_exactly(sock, _HEADER.unpack(header)[0])
+  if data is None:
+    raise RemoteExecutionError('connection closed in the middle of a message')
+  return json.loads(data.decode())
+
+
+def encode_file(path: str) -> str:
+  with open(path, 'rb') as fp:
+    return base64.b64encode(fp.read()).decode('ascii')
+
+
+def decode_file(path: str, data: str) -> None:
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  with open(path, 'wb') as fp:
+    fp.write(base64.b64decode(data))
+
+
+def is_within(path: str, root: str) -> bool:
+  return os.path.commonpath([path, root]) == root
+
+
+def replace_directory(value: t.AnyStr, old: t.AnyStr, new: t.AnyStr) -> t.AnyStr:
+  """
+  Replaces the directory *old* with *new* in *value* (e.g. a command line argument or the output
+  of a command). Only occurrences of *old* that are followed by a path separator, or that do not
+  continue with another character of a file name, are replaced, thus `/proj` is not replaced in
+  `/proj2/a.c`.
+  """
+
+  suffix = _DIRECTORY_END.encode() if isinstance(old, bytes) else _DIRECTORY_END
+  pattern = re.escape(old) + suffix
+  return re.sub(pattern, lambda _: new, value)
+
+
+class RemoteWorker:
+  """
+  A connection pool for one worker process that also tracks how many actions are currently running
+  on the worker.
+  """
+
+  def __init__(
+    self,
+    address: t.Tuple[str, int],
+    timeout: t.Optional[float] = None,
+    token: t.Optional[str] = None,
+  ) -> None:
+    self.address = address
+    self.timeout = timeout
+    self.token = token
+    self.capacity = 1
+    self.running = 0
+    self.available = True
+    self._idle: t.List[socket.socket] = []
+    self._lock = threading.Lock()
+
+  def __repr__(self) -> str:
+    return f'{type(self).__name__}(address={self.address!r}, running={self.running!r}, capacity={self.capacity!r})'
+
+  @property
+  def load(self) -> float:
+    return self.running / self.capacity
+
+  def _connect(self) -> socket.socket:
+    sock = socket.create_connection(self.address, self.timeout)
+    try:
+      send_message(sock, {'type': 'hello', 'version': PROTOCOL_VERSION, 'token': self.token})
+      response = recv_message(sock)
+      if response is not None and 'error' in response:
+        raise RemoteExecutionError(f'worker {self.address} rejected the connection: {response["error"]}')
+      if response is None or response.get('version') != PROTOCOL_VERSION:
+        raise RemoteExecutionError(f'worker {self.address} speaks an incompatible protocol')
+      self.capacity = max(1, int(response['jobs']))
+    except BaseException:
+      sock.close()
+      raise
+    return sock
+
+  def request(self, message: t.Dict[str, t.Any]) -> t.Dict[str, t.Any]:
+    """
+    Sends *message* to the worker and returns the response. Raises an #OSError if the worker can
+    not be reached.
+    """
+
+    with self._lock:
+      sock = self._idle.pop() if self._idle else None
+    if sock is None:
+      sock = self._connect()
+    try:
+      send_message(sock, message)
+      response = recv_message(sock)
+      if response is None:
+        raise RemoteExecutionError(f'worker {self.address} closed the connection')
+    except BaseException:
+      sock.close()
+      raise
+    with self._lock:
+      self._idle.append(sock)
+    return response
+
+  def close(self) -> None:
+    with self._lock:
+      for sock in self._idle:
+        sock.close()
+      self._idle.clear()
+
+
+class RemoteExecutor:
+  """
+  Executes actions on a set of remote workers. Every action is sent to the worker with the lowest
+  load (the number of actions running on it relative to its capacity). A worker that can not be
+  reached is not used again, and if no worker is available, the action is executed locally.
+
+  Only #CommandAction#s that declare their output files and whose files are all located in the
+  *root* directory are executed remotely, all other actions are executed locally. An action with a
+  depfile is executed locally until its dependencies are known from a previous execution. If it
+  fails remotely, it is executed again locally, as it may have read a file that it did not read
+  before (e.g. a new header).
+
+  The *token* is sent to the workers to authenticate (see `python -m craftr.worker --help`).
+  """
+
+  def __init__(
+    self,
+    workers: t.Sequence[str],
+    root: t.Optional[str] = None,
+    timeout: t.Optional[float] = None,
+    token: t.Optional[str] = None,
+  ) -> None:
+    self.workers = [RemoteWorker(parse_address(x), timeout, token) for x in workers]
+    self.root = os.path.abspath(root or os.getcwd())
+    self._lock = threading.Lock()
+
+  def accepts(self, action: Action, context: ActionContext) -> bool:
+    """ Returns #True if the *action* can be executed remotely. """
+
+    if not isinstance(action, CommandAction) or not action.output_files:
+      return False
+    paths = [action.resolve_path(x) for x in [*(action.input_files or []), *action.output_files]]
+    paths.append(os.path.abspath(action.working_directory or self.root))
+    if action.depfile:
+      if action.get_known_dependencies(context) is None:
+        return False
+      paths.append(action.resolve_path(action.depfile))
+    return all(is_within(x, self.root) for x in paths)
+
+  def _acquire_worker(self) -> t.Optional[RemoteWorker]:
+    with self._lock:
+      workers = [w for w in self.workers if w.available]
+      if not workers:
+        return None
+      worker = min(workers, key=lambda w: w.load)
+      worker.running += 1
+      return worker
+
+  def _release_worker(self, worker: RemoteWorker) -> None:
+    with self._lock:
+      worker.running -= 1
+
+  def encode_request(self, action: CommandAction, context: ActionContext) -> t.Dict[str, t.Any]:
+    outputs = [action.resolve_path(x) for x in action.output_files or []]
+    inputs = [action.resolve_path(x) for x in action.input_files or []]
+    depfile = action.resolve_path(action.depfile) if action.depfile else None
+    if depfile:
+      outputs.append(depfile)
+      dependencies = action.get_known_dependencies(context) or []
+      inputs += [x for x in dependencies if is_within(x, self.root) and os.path.isfile(x)]
+    return {
+      'type': 'execute',
+      'root': self.root,
+      'working_directory': os.path.abspath(action.working_directory or self.root),
+      'commands': action.get_commands(),
+      'inputs': {x: encode_file(x) for x in dict.fromkeys(inputs)},
+      'outputs': outputs,
+      'depfile': depfile,
+    }
+
+  def execute(self, action: Action, context: ActionContext) -> None:
+    """
+    Executes the *action* on the least loaded worker, or locally if it can not be executed
+    remotely. Raises a #subprocess.CalledProcessError if a command fails.
+    """
+
+    if not self.accepts(action, context):
+      action.execute(context)
+      return
+
+    assert isinstance(action, CommandAction)
+    request = self.encode_request(action, context)
+    while True:
+      worker = self._acquire_worker()
+      if worker is None:
+        action.execute(context)
+        return
+      try:
+        response = worker.request(request)
+      except (OSError, RemoteExecutionError):
+        worker.available = False
+        worker.close()
+        continue
+      finally:
+        self._release_worker(worker)
+      break
+
+    if response['returncode'] != 0 and request['depfile']:
+      action.execute(context)
+      return
+
+    output = base64.b64decode(response['output'])
+    if action.verbose or context.verbose:
+      commands = [action.format_command(x).encode() + b'\n' for x in request['commands']]
+      output = b''.join(commands) + output
+    _write_output(output)
+    if response['returncode'] != 0:
+      raise sp.CalledProcessError(response['returncode'], response['failed_command'], output)
+    for path, data in response['outputs'].items():
+      if path in request['outputs']:
+        decode_file(path, data)
+
+  def close(self) -> None:
+    for worker in self.workers:
+      worker.close()
@@ -0,0 +1,275 @@
+"""
+Helpers to execute the nodes of a #BaseGraph concurrently while respecting their dependencies.
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import heapq
+import threading
+import typing as t
+
+from craftr.core.graph import Node
+
+if t.TYPE_CHECKING:
+  from craftr.core.graph import Adjacency, BaseGraph
+
+T = t.TypeVar('T')
+
+
+class ReadyQueue(t.Generic[T]):
+  """
+  Keeps track of which nodes of a graph are ready to be executed, i.e. all of their dependencies
+  have been completed. Nodes are identified by their index in #BaseGraph.execution_order(), which
+  is available as #nodes. The values wrapped by the nodes are available as #values (objects that
+  are nodes themselves, like a #Task, are their own value). The #dependencies and #dependents of
+  every node are read from the #FrozenGraph of the graph.
+
+  Ready nodes are returned in the order of their #priorities, and in execution order for equal
+  priorities. Use #set_weights() to prioritize nodes on the critical path of the graph.
+  """
+
+  def __init__(self, graph: 'BaseGraph[T]') -> None:
+    frozen = graph.freeze().ordered()
+    self.nodes: t.List[t.Any] = frozen.nodes
+    self.values: t.List[T] = [node.contents if type(node) is Node else node for node in self.nodes]
+    self.dependencies: 'Adjacency' = frozen.dependencies
+    self.dependents: 'Adjacency' = frozen.dependents
+    self.priorities: t.List[float] = [0.0] * len(self.nodes)
+    self._pending = self.dependencies.degrees()
+    self._ready: t.List[t.Tuple[float, int]] = [(0.0, i) for i, count in enumerate(self._pending) if count == 0]
+    self._remaining = len(self.nodes)
+
+  def __len__(self) -> int:
+    """ Returns the number of nodes that are ready to be executed. """
+
+    return len(self._ready)
+
+  @property
+  def done(self) -> bool:
+    """ True if all nodes have been completed. """
+
+    return self._remaining == 0
+
+  def set_weights(self, weights: t.Sequence[float]) -> None:
+    """
+    Assigns every node the priority of the longest path from the node to the end of the graph,
+    where every node on the path contributes its weight (e.g. its expected duration). Nodes that
+    start long chains of work are thus returned first by #pop().
+    """
+
+    assert len(weights) == len(self.nodes)
+    for i in reversed(range(len(self.nodes))):
+      self.priorities[i] = weights[i] + max((self.priorities[x] for x in self.dependents[i]), default=0.0)
+    self._ready = [(-self.priorities[i], i) for _, i in self._ready]
+    heapq.heapify(self._ready)
+
+  def pop(self) -> int:
+    """ Returns the index of the next node that is ready to be executed. """
+
+    return heapq.heappop(self._ready)[1]
+
+  def complete(self, index: int) -> None:
+    """ Mark the node at *index* as completed, possibly making its dependents ready. """
+
+    self._remaining -= 1
+    for dependent in self.dependents[index]:
+      self._pending[dependent] -= 1
+      if self._pending[dependent] == 0:
+        heapq.heappush(self._ready, (-self.priorities[dependent], dependent))
+
+
+class JobLimit:
+  """
+  Limits the number of jobs that may run at the same time. A single instance is shared by all
+  users that need to count against the same limit, e.g. the actions of all tasks in a build.
+
+  Threads wait for a slot with #acquire() and coroutines with #acquire_async(), which does not
+  occupy a thread while it waits. Slots are handed to the waiters in the order they arrived.
+  """
+
+  def __init__(self, jobs: int) -> None:
+    self.jobs = jobs
+    self._slot_lock = threading.Lock()
+    self._available = jobs
+    self._waiters: t.Deque[t.Callable[[], None]] = collections.deque()
+
+  def __repr__(self) -> str:
+    return f'{type(self).__name__}(jobs={self.jobs!r})'
+
+  def __enter__(self) -> None:
+    self.acquire()
+
+  def __exit__(self, *args: t.Any) -> None:
+    self.release()
+
+  def acquire(self) -> None:
+    """ Block until a job slot is available and claim it. """
+
+    with self._slot_lock:
+      if self._available > 0:
+        self._available -= 1
+        return
+      event = threading.Event()
+      self._waiters.append(event.set)
+    event.wait()
+
+  async def acquire_async(self) -> None:
+    """ Like #acquire(), but waits for a job slot without blocking the event loop. """
+
+    loop = asyncio.get_running_loop()
+    with self._slot_lock:
+      if self._available > 0:
+        self._available -= 1
+        return
+      future = loop.create_future()
+      self._waiters.append(lambda: loop.call_soon_threadsafe(self._hand_over, future))
+    try:
+      await future
+    except asyncio.CancelledError:
+      # The slot was handed over, but the waiting coroutine was cancelled before it resumed.
+      if future.done() and not future.cancelled():
+        self._release_slot()
+      raise
+
+  def _hand_over(self, future: 'asyncio.Future[None]') -> None:
+    if future.cancelled():
+      self._release_slot()
+    else:
+      future.set_result(None)
+
+  def release(self) -> None:
+    """ Give back a job slot claimed with #acquire(). The slot is handed to the next waiter. """
+
+    self._release_slot()
+
+  def _release_slot(self) -> None:
+    with self._slot_lock:
+      while self._waiters:
+        try:
+          self._waiters.popleft()()
+        except RuntimeError:
+          continue  # The event loop of the waiter was closed.
+        return
+      if self._available >= self.jobs:
+        raise ValueError(f'{type(self).__name__} released too many times')
+      self._available += 1
+
+
+def execute_concurrently(
+  queue: ReadyQueue,
+  func: t.Callable[[int], None],
+  jobs: int,
+  limit: t.Optional[JobLimit] = None,
+) -> None:
+  """
+  Calls *func* with the index of every node in *queue* using up to *jobs* threads. A node is
+  dispatched as soon as all of its dependencies have completed. If *func* raises an exception,
+  no further nodes are dispatched, the nodes that are already running are waited for and the
+  first exception is re-raised.
+
+  If a *limit* is specified, every call to *func* must claim a slot from it first.
+  """
+
+  def _call(index: int) -> None:
+    if limit is None:
+      func(index)
+    else:
+      with limit:
+        func(index)
+
+  running: t.Dict['concurrent.futures.Future[None]', int] = {}
+  error: t.Optional[BaseException] = None
+
+  with concurrent.futures.ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+    while True:
+      while error is None and len(queue) and len(running) < jobs:
+        index = queue.pop()
+        running[pool.submit(_call, index)] = index
+      if not running:
+        break
+      done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+      for future in done:
+        index = running.pop(future)
+        exc = future.exception()
+        if exc is not None:
+          error = error or exc
+        else:
+          queue.complete(index)
+
+  if error is not None:
+    raise error
+
+
+async def execute_async(
+  queue: ReadyQueue,
+  func: t.Callable[[int], t.Awaitable[None]],
+  jobs: int,
+  limit: t.Optional[JobLimit] = None,
+) -> None:
+  """
+  Like #execute_concurrently(), but awaits the coroutines returned by *func* in the current event
+  loop instead of calling it in threads.
+  """
+
+  async def _call(index: int) -> None:
+    if limit is None:
+      await func(index)
+    else:
+      await limit.acquire_async()
+      try:
+        await func(index)
+      finally:
+        limit.release()
+
+  running: t.Dict['asyncio.Future[None]', int] = {}
+  error: t.Optional[BaseException] = None
+
+  while True:
+    while error is None and len(queue) and len(running) < jobs:
+      index = queue.pop()
+      running[asyncio.ensure_future(_call(index))] = index
+    if not running:
+      break
+    done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+    for future in done:
+      index = running.pop(future)
+      exc = future.exception()
+      if exc is not None:
+        error = error or exc
+      else:
+        queue.complete(index)
+
+  if error is not None:
+    raise error
+
+
+class EventLoopThread:
+  """
+  Runs an asyncio event loop in a background thread. Any other thread can run a coroutine in that
+  loop with #run(), which allows many threads to share the same loop (e.g. to run subprocesses
+  without occupying a thread per process).
+  """
+
+  def __init__(self) -> None:
+    self._loop = asyncio.new_event_loop()
+    self._thread = threading.Thread(target=self._loop.run_forever, name='EventLoopThread', daemon=True)
+    self._thread.start()
+
+  def __enter__(self) -> 'EventLoopThread':
+    return self
+
+  def __exit__(self, *args: t.Any) -> None:
+    self.close()
+
+  def run(self, coro: t.Awaitable[T]) -> T:
+    """ Run the coroutine in the event loop and block until it is done. """
+
+    return asyncio.run_coroutine_threadsafe(coro, self._loop).result()  # type: ignore
+
+  def close(self) -> None:
+    """ Stop the event loop and wait for the thread to finish. """
+
+    self._loop.call_soon_threadsafe(self._loop.stop)
+    self._thread.join()
+    self._loop.close()
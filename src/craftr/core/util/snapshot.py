@@ -0,0 +1,192 @@
+"""
+A cached view of the directories in the file system that answers glob patterns.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import typing as t
+from pathlib import Path
+
+from nr.caching.api import KeyDoesNotExist, KeyValueStore
+
+from craftr.core.util.caching import store_many
+from craftr.core.util.patterns import PathFilter, PathPattern
+
+#: The namespace in the metadata store in which directory listings are persisted.
+DIRECTORY_LISTING_NAMESPACE = 'directory-listings'
+
+#: Listings of directories that were modified less than this many nanoseconds ago are not persisted.
+_RACY_NS = 2 * 10 ** 9
+
+_WILDCARD = re.compile(r'[*?[]')
+
+
+class Listing(t.NamedTuple):
+  #: The modification time of the directory when it was listed.
+  mtime_ns: int
+  #: The names of the subdirectories. Symbolic links to directories are not included.
+  directories: t.List[str]
+  #: The names of all other entries.
+  files: t.List[str]
+
+
+class FileSystemSnapshot:
+  """
+  Lists every directory at most once and answers any number of glob patterns from the listings.
+  The listings are kept for the lifetime of the snapshot, so the results of #glob() are consistent
+  with each other even if files are created while the projects are loaded.
+
+  If a *store* is specified, listings are persisted to it by #flush() and reused in later builds
+  if the modification time of the directory did not change (the modification time of a directory
+  changes when an entry is added, removed or renamed).
+  """
+
+  def __init__(self, store: t.Optional[KeyValueStore] = None) -> None:
+    self._store = store
+    self._lock = threading.Lock()
+    self._listings: t.Dict[str, t.Optional[Listing]] = {}
+    self._pending: t.Set[str] = set()
+    self._globs: t.Dict[t.Tuple[str, t.Tuple[str, ...], t.Tuple[str, ...]], t.List[Path]] = {}
+
+  def _load(self, path: str, mtime_ns: int) -> t.Optional[Listing]:
+    if self._store is None:
+      return None
+    try:
+      payload = json.loads(self._store.load(path).decode())
+      listing = Listing(payload['mtime'], payload['directories'], payload['files'])
+    except (KeyDoesNotExist, ValueError, KeyError, TypeError):
+      return None
+    return listing if listing.mtime_ns == mtime_ns else None
+
+  def listdir(self, path: t.Union[str, Path]) -> t.Optional[Listing]:
+    """
+    Returns the listing of the directory at *path*, or #None if it is not a directory.
+    """
+
+    path = os.path.abspath(path)
+    with self._lock:
+      if path in self._listings:
+        return self._listings[path]
+
+    try:
+      mtime_ns = os.stat(path).st_mtime_ns
+      listing = self._load(path, mtime_ns)
+      if listing is None:
+        directories: t.List[str] = []
+        files: t.List[str] = []
+        with os.scandir(path) as it:
+          for entry in it:
+            (directories if entry.is_dir(follow_symlinks=False) else files).append(entry.name)
+        listing = Listing(mtime_ns, sorted(directories), sorted(files))
+        if time.time_ns() - mtime_ns >= _RACY_NS:
+          with self._lock:
+            self._pending.add(path)
+    except (FileNotFoundError, NotADirectoryError):
+      listing = None
+
+    with self._lock:
+      self._listings[path] = listing
+    return listing
+
+  def glob(
+    self,
+    directory: t.Union[str, Path],
+    patterns: t.Union[str, t.Sequence[str]],
+    exclude: t.Sequence[str] = (),
+  ) -> t.List[Path]:
+    """
+    Returns the sorted paths of the files and directories that match any of the *patterns*
+    relative to *directory* (see #craftr.core.util.patterns), except for those that match one of
+    the *exclude* patterns or are inside an excluded directory. Exclude patterns are matched
+    against the paths relative to *directory*.
+    """
+
+    if isinstance(patterns, str):
+      patterns = [patterns]
+    directory = os.path.abspath(directory)
+    cache_key = (directory, tuple(patterns), tuple(exclude))
+    with self._lock:
+      if cache_key in self._globs:
+        return list(self._globs[cache_key])
+
+    path_filter = PathFilter(exclude=exclude)
+    results: t.Set[str] = set()
+    for pattern in patterns:
+      results.update(self._glob(directory, pattern, path_filter))
+
+    paths = [Path(x) for x in sorted(results)]
+    with self._lock:
+      self._globs[cache_key] = paths
+    return list(paths)
+
+  def _glob(self, directory: str, pattern: str, path_filter: PathFilter) -> t.Iterator[str]:
+    # Start walking from the longest prefix of the pattern that contains no wildcards.
+    components = pattern.replace(os.sep, '/').split('/')
+    index = next((i for i, c in enumerate(components) if c == '**' or _WILDCARD.search(c)), len(components))
+    base = os.path.normpath(os.path.join(directory, *components[:index]))
+    remainder = [c for c in components[index:] if c]
+    if not remainder:
+      if os.path.lexists(base) and not self._is_excluded(directory, base, os.path.isdir(base), path_filter):
+        yield base
+      return
+
+    # Like glob.glob(), names that start with a dot are only matched by components that start with
+    # a dot. If there are none, hidden files and directories are skipped without being listed.
+    regex = PathPattern('/'.join(remainder), anchored=True, match_hidden=False)
+    max_depth = None if '**' in remainder else len(remainder)
+    skip_hidden = not any(c.startswith('.') for c in remainder)
+
+    def _walk(path: str, relpath: str, depth: int) -> t.Iterator[str]:
+      listing = self.listdir(path)
+      if listing is None:
+        return
+      for names, is_dir in ((listing.directories, True), (listing.files, False)):
+        for name in names:
+          if skip_hidden and name.startswith('.'):
+            continue
+          child = os.path.join(path, name)
+          child_relpath = f'{relpath}/{name}' if relpath else name
+          if self._is_excluded(directory, child, is_dir, path_filter):
+            continue
+          if regex.matches(child_relpath, is_dir):
+            yield child
+          if is_dir and (max_depth is None or depth + 1 < max_depth):
+            yield from _walk(child, child_relpath, depth + 1)
+
+    yield from _walk(base, '', 0)
+
+  def _is_excluded(self, directory: str, path: str, is_dir: bool, path_filter: PathFilter) -> bool:
+    if not path_filter.exclude:
+      return False
+    return path_filter.is_excluded(os.path.relpath(path, directory).replace(os.sep, '/'), is_dir)
+
+  def listed_directories(self) -> t.Dict[str, int]:
+    """
+    Returns the modification times of all directories that were listed so far by their path, or -1
+    for paths that were not directories. If none of them changed, the same #glob() calls return the
+    same results.
+    """
+
+    with self._lock:
+      return {path: -1 if listing is None else listing.mtime_ns for path, listing in self._listings.items()}
+
+  def flush(self) -> None:
+    """
+    Writes the listings that were created since the last flush to the store at once (see
+    #craftr.core.util.caching.store_many()).
+    """
+
+    if self._store is None:
+      return
+    with self._lock:
+      values: t.Dict[str, bytes] = {}
+      pending, self._pending = self._pending, set()
+      for path in sorted(pending):
+        listing = self._listings[path]
+        if listing is not None:
+          payload = {'mtime': listing.mtime_ns, 'directories': listing.directories, 'files': listing.files}
+          values[path] = json.dumps(payload).encode()
+      store_many(self._store, values)
@@ -1,29 +1,20 @@
 
+import dataclasses
 import hashlib
+import json
+import time
 import typing as t
 from pathlib import Path
 
-from craftr.core.property import ListProperty, Property
+from craftr.core.property import HavingProperties, ListProperty, Property
+from craftr.core.util.digests import DigestStats, FileDigestCache, record_stats
 from craftr.core.util.typing import unpack_type_hint
 
 if t.TYPE_CHECKING:
+  from craftr.core.base import Task
   from .task import DefaultTask
 
 
-class _IHasher(t.Protocol):
-  def update(self, data: bytes) -> None:  # NOSONAR
-    pass
-
-
-def _hash_file(hasher: _IHasher, path: Path) -> None:
-  with path.open('rb') as fp:
-    while True:
-      chunk = fp.read(8048)
-      hasher.update(chunk)
-      if not chunk:
-        break
-
-
 def check_file_property(prop: Property) -> t.Tuple[bool, bool, bool]:
   item_type = unpack_type_hint(prop.type)[1]
   is_sequence = isinstance(prop, ListProperty)
@@ -45,27 +36,185 @@ def unwrap_file_property(prop: Property) -> t.Tuple[bool, bool, t.List[Path]]:
   return result
 
 
-def calculate_task_hash(task: 'DefaultTask', hash_algo: str = 'sha1') -> str:  # NOSONAR
+def get_input_files(task: 'Task') -> t.List[Path]:
+  """
+  Returns the files of all input file properties of the *task*. Tasks without properties have no
+  known input files.
   """
-  Calculates a hash for the task that represents the state of it's inputs (property values
-  and input file contents). That hash is used to determine if the task is up to date with
-  it's previous execution or if it needs to be executed.
 
-  > Implementation detail: Expects that all important information of a property value is
-  > included in it's #repr(), and that the #repr() is consistent.
+  if not isinstance(task, HavingProperties):
+    return []
+  files: t.List[Path] = []
+  for prop in task.get_properties().values():
+    if prop.is_input:
+      files += map(Path, unwrap_file_property(prop))
+  return files
+
+
+@dataclasses.dataclass
+class TaskState:
+  """
+  The state of the inputs of a task, as calculated by #calculate_task_state(). The state is
+  stored after a task was executed, and compared with the current state to check if the task is
+  up to date (see #explain_changes()).
+  """
+
+  #: A hash that represents the state of all inputs.
+  hash: str
+
+  #: The digests of the property values by property name.
+  properties: t.Dict[str, str] = dataclasses.field(default_factory=dict)
+
+  #: The digests of the input files by path. A file that does not exist has no digest.
+  files: t.Dict[str, t.Optional[str]] = dataclasses.field(default_factory=dict)
+
+  def to_json(self) -> str:
+    return json.dumps({'hash': self.hash, 'properties': self.properties, 'files': self.files})
+
+  @classmethod
+  def from_json(cls, data: str) -> 'TaskState':
+    """
+    Parses the state from a string that was returned by #to_json(). Raises a #ValueError if the
+    string is not a valid state.
+    """
+
+    payload = json.loads(data)
+    if not isinstance(payload, dict) or not isinstance(payload.get('hash'), str):
+      raise ValueError('invalid task state')
+    return cls(payload['hash'], dict(payload.get('properties', {})), dict(payload.get('files', {})))
+
+
+def calculate_task_state(
+  task: 'DefaultTask',
+  hash_algo: str = 'sha1',
+  digests: t.Optional['FileDigestCache'] = None,
+) -> TaskState:  # NOSONAR
+  """
+  Calculates the state of the inputs of a task (property values and input file contents). The
+  state is used to determine if the task is up to date with it's previous execution or if it
+  needs to be executed.
+
+  The input files are hashed concurrently. If a #FileDigestCache is specified, the digests of
+  the input files are taken from it instead of reading the files. The file digests are combined
+  in the order of the properties (sorted by name) and of the files in each property. Input paths
+  that refer to directories are hashed as a whole (see #FileDigestCache.digest_tree()).
+
+  Property values are included through #Property.fingerprint().
   """
 
   hasher = hashlib.new(hash_algo)
   encoding = 'utf-8'
+  properties: t.Dict[str, str] = {}
+  files: t.List[Path] = []
 
   for prop in sorted(task.get_properties().values(), key=lambda p: p.name):
+    fingerprint = prop.fingerprint()
     hasher.update(prop.name.encode(encoding))
-    hasher.update(repr(prop.or_none()).encode(encoding))
+    hasher.update(fingerprint)
+    properties[prop.name] = hashlib.new(hash_algo, fingerprint).hexdigest()
 
     if prop.is_input:
-      files = unwrap_file_property(prop)
-      for path in map(Path, files):
-        if path.is_file():
-          _hash_file(hasher, path)
+      files += map(Path, unwrap_file_property(prop))
+
+  if digests is None:
+    digests = FileDigestCache(hash_algo=hash_algo)
+  file_digests: t.Dict[str, t.Optional[str]] = {}
+  for path, digest in zip(files, digests.digest_many(files)):
+    hasher.update(str(path).encode(encoding))
+    hasher.update((digest or '-').encode(encoding))
+    file_digests[str(path)] = digest
+
+  return TaskState(hasher.hexdigest(), properties, file_digests)
+
+
+def calculate_task_hash(
+  task: 'DefaultTask',
+  hash_algo: str = 'sha1',
+  digests: t.Optional['FileDigestCache'] = None,
+) -> str:
+  """
+  Calculates a hash for the task that represents the state of it's inputs. See
+  #calculate_task_state().
+  """
+
+  return calculate_task_state(task, hash_algo, digests).hash
+
+
+def explain_changes(old: t.Optional[TaskState], new: TaskState) -> t.Optional[str]:
+  """
+  Returns a description of the first difference between the *old* and *new* state of a task, or
+  #None if the states are equal.
+  """
+
+  if old is None:
+    return 'no previous execution was recorded'
+  if old.hash == new.hash:
+    return None
+  for name in sorted(old.properties.keys() | new.properties.keys()):
+    if old.properties.get(name) != new.properties.get(name):
+      return f'property {name!r} changed'
+  for path, digest in new.files.items():
+    if path not in old.files:
+      return f'input file {path!r} was added'
+    if old.files[path] != digest:
+      return f'input file {path!r} changed'
+  for path in old.files:
+    if path not in new.files:
+      return f'input file {path!r} was removed'
+  return 'the order of the input files changed'
+
+
+@dataclasses.dataclass
+class TaskCheck:
+  """
+  The result of #check_task().
+  """
+
+  #: The reason why the task is outdated, or #None if it is up to date.
+  reason: t.Optional[str]
+
+  #: The time spent to check if the task is up to date.
+  seconds: float
+
+  #: The input files that were checked and hashed to check if the task is up to date.
+  stats: DigestStats
+
+  @property
+  def outdated(self) -> bool:
+    return self.reason is not None
+
+  def describe(self) -> str:
+    """
+    Describes the reason why the task is outdated (if it is) and the cost of the check.
+    """
+
+    cost = (f'checked in {self.seconds * 1000:.1f}ms, hashed {self.stats.files_hashed} of '
+      f'{self.stats.files_checked} files ({format_size(self.stats.bytes_hashed)})')
+    return f'{self.reason}; {cost}' if self.reason else cost
+
+
+def check_task(task: 'Task', executed_dependencies: t.Collection['Task'] = ()) -> TaskCheck:
+  """
+  Checks if the *task* is outdated. A task is outdated if it is always outdated, if
+  #Task.explain_outdated() reports a reason, or if any of its dependencies were executed in the
+  same build (*executed_dependencies*).
+  """
 
-  return hasher.hexdigest()
+  tstart = time.perf_counter()
+  with record_stats() as stats:
+    if task.always_outdated:
+      reason: t.Optional[str] = 'the task is always outdated'
+    else:
+      reason = task.explain_outdated()
+  if reason is None and executed_dependencies:
+    reason = f'dependency {next(iter(executed_dependencies)).path!r} was executed'
+  return TaskCheck(reason, time.perf_counter() - tstart, stats)
+
+
+def format_size(num_bytes: int) -> str:
+  size = float(num_bytes)
+  for unit in ('B', 'KiB', 'MiB', 'GiB'):
+    if size < 1024 or unit == 'GiB':
+      break
+    size /= 1024
+  return f'{num_bytes} B' if unit == 'B' else f'{size:.1f} {unit}'
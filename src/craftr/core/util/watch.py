@@ -0,0 +1,251 @@
+"""
+Watch files for changes. On Linux, changes are reported by inotify (through #ctypes), on other
+systems the files are polled.
+"""
+
+import abc
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+import typing as t
+from pathlib import Path
+
+
+class FileWatcher(abc.ABC):
+  """
+  Base class for file watchers. Call #watch() with the files to watch and #poll() to wait for
+  changes to them. Directories are watched recursively, a change to any file inside of a watched
+  directory is reported as a change of the directory.
+  """
+
+  def __init__(self) -> None:
+    self._files: t.Set[str] = set()
+    self._trees: t.Set[str] = set()
+
+  def __enter__(self) -> 'FileWatcher':
+    return self
+
+  def __exit__(self, *args: t.Any) -> None:
+    self.close()
+
+  def watch(self, files: t.Iterable[t.Union[str, Path]]) -> None:
+    """ Add files to the set of watched files. Files that don't exist yet can be watched, too. """
+
+    for path in map(os.path.abspath, files):
+      self._files.add(path)
+      if os.path.isdir(path):
+        self._trees.add(path)
+
+  def _watched_trees(self, path: str) -> t.Iterator[str]:
+    """ Yields the watched directories that contain *path*. """
+
+    while True:
+      parent = os.path.dirname(path)
+      if parent == path:
+        return
+      path = parent
+      if path in self._trees:
+        yield path
+
+  @abc.abstractmethod
+  def poll(self, timeout: t.Optional[float] = None) -> t.Set[Path]:
+    """
+    Waits up to *timeout* seconds (or forever if #None) for at least one watched file to change
+    and returns the changed files. Returns an empty set if the timeout expired.
+    """
+
+  def close(self) -> None:
+    pass
+
+
+class PollingWatcher(FileWatcher):
+  """
+  Detects changes by comparing the modification time and size of the watched files every
+  *interval* seconds. Watched directories are walked every time.
+  """
+
+  def __init__(self, interval: float = 0.5) -> None:
+    super().__init__()
+    self.interval = interval
+    self._state: t.Dict[str, t.Any] = {}
+
+  @staticmethod
+  def _stat(path: str) -> t.Optional[t.Tuple[int, int]]:
+    try:
+      st = os.stat(path)
+    except OSError:
+      return None
+    return st.st_mtime_ns, st.st_size
+
+  def _get_state(self, path: str) -> t.Any:
+    if path not in self._trees:
+      return self._stat(path)
+    state = []
+    for root, dirnames, filenames in os.walk(path):
+      dirnames.sort()
+      for name in [''] + sorted(filenames):
+        child = os.path.join(root, name) if name else root
+        state.append((child, self._stat(child)))
+    return state
+
+  def watch(self, files: t.Iterable[t.Union[str, Path]]) -> None:
+    files = [os.path.abspath(f) for f in files]
+    super().watch(files)
+    for path in files:
+      self._state.setdefault(path, self._get_state(path))
+
+  def poll(self, timeout: t.Optional[float] = None) -> t.Set[Path]:
+    deadline = None if timeout is None else time.perf_counter() + timeout
+    while True:
+      changed: t.Set[Path] = set()
+      for path, state in self._state.items():
+        new_state = self._get_state(path)
+        if new_state != state:
+          self._state[path] = new_state
+          changed.add(Path(path))
+      if changed:
+        return changed
+      if deadline is not None and time.perf_counter() >= deadline:
+        return changed
+      delay = self.interval if deadline is None else min(self.interval, max(0.0, deadline - time.perf_counter()))
+      time.sleep(delay)
+
+
+class InotifyWatcher(FileWatcher):
+  """
+  Uses the Linux inotify API. The parent directories of the watched files are watched instead of
+  the files themselves, because many editors save a file by replacing it. Watched directories and
+  all of their subdirectories are watched, including subdirectories that are created later.
+  """
+
+  IN_MODIFY = 0x00000002
+  IN_ATTRIB = 0x00000004
+  IN_CLOSE_WRITE = 0x00000008
+  IN_MOVED_FROM = 0x00000040
+  IN_MOVED_TO = 0x00000080
+  IN_CREATE = 0x00000100
+  IN_DELETE = 0x00000200
+  IN_ISDIR = 0x40000000
+  IN_NONBLOCK = 0o4000
+  IN_CLOEXEC = 0o2000000
+
+  MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+  _EVENT = struct.Struct('iIII')
+
+  def __init__(self) -> None:
+    super().__init__()
+    self._libc = _load_libc()
+    if self._libc is None:
+      raise OSError('inotify is not available')
+    self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+    if self._fd < 0:
+      errno = ctypes.get_errno()
+      raise OSError(errno, os.strerror(errno))
+    self._directories: t.Dict[str, int] = {}
+    self._descriptors: t.Dict[int, str] = {}
+
+  def watch(self, files: t.Iterable[t.Union[str, Path]]) -> None:
+    files = [os.path.abspath(f) for f in files]
+    super().watch(files)
+    for directory in sorted(set(map(os.path.dirname, files))):
+      self._add_watch(directory)
+    for path in files:
+      if path in self._trees:
+        self._add_tree(path)
+
+  def _add_watch(self, directory: str) -> None:
+    if directory in self._directories:
+      return
+    wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), self.MASK)
+    if wd < 0:
+      return  # The directory does not exist (yet).
+    self._directories[directory] = wd
+    self._descriptors[wd] = directory
+
+  def _add_tree(self, directory: str) -> None:
+    for root, _dirnames, _filenames in os.walk(directory):
+      self._add_watch(root)
+
+  def _read_events(self) -> t.Set[Path]:
+    changed: t.Set[Path] = set()
+    while True:
+      try:
+        data = os.read(self._fd, 65536)
+      except BlockingIOError:
+        return changed
+      offset = 0
+      while offset < len(data):
+        wd, mask, _cookie, length = self._EVENT.unpack_from(data, offset)
+        offset += self._EVENT.size
+        name = data[offset:offset + length].rstrip(b'\0')
+        offset += length
+        directory = self._descriptors.get(wd)
+        if directory is None or not name:
+          continue
+        path = os.path.join(directory, os.fsdecode(name))
+        if path in self._files:
+          changed.add(Path(path))
+        trees = [Path(x) for x in self._watched_trees(path)]
+        if trees and mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+          self._add_tree(path)
+        changed.update(trees)
+
+  def poll(self, timeout: t.Optional[float] = None) -> t.Set[Path]:
+    deadline = None if timeout is None else time.perf_counter() + timeout
+    while True:
+      remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+      if select.select([self._fd], [], [], remaining)[0]:
+        changed = self._read_events()
+        if changed:
+          return changed
+      elif deadline is not None:
+        return set()
+
+  def close(self) -> None:
+    if self._fd >= 0:
+      os.close(self._fd)
+      self._fd = -1
+
+
+def _load_libc() -> t.Optional[ctypes.CDLL]:
+  if not sys.platform.startswith('linux'):
+    return None
+  try:
+    libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+  except OSError:
+    return None
+  if not hasattr(libc, 'inotify_init1'):
+    return None
+  libc.inotify_init1.argtypes = [ctypes.c_int]
+  libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+  return libc
+
+
+def create_watcher(polling_interval: float = 0.5) -> FileWatcher:
+  """
+  Returns an #InotifyWatcher if inotify is available, a #PollingWatcher otherwise.
+  """
+
+  try:
+    return InotifyWatcher()
+  except OSError:
+    return PollingWatcher(polling_interval)
+
+
+def wait_for_changes(watcher: FileWatcher, debounce: float = 0.2) -> t.Set[Path]:
+  """
+  Waits for changes and returns once no more changes were reported for *debounce* seconds, so that
+  a burst of changes (e.g. an editor saving a file in multiple steps) is reported only once.
+  """
+
+  changed = watcher.poll()
+  while True:
+    more = watcher.poll(debounce)
+    if not more:
+      return changed
+    changed |= more
@@ -0,0 +1,256 @@
+"""
+A background process that keeps the projects of a build loaded between invocations of `craftr`.
+Run `craftr --daemon [args]` to forward the command-line to the daemon, which is started if it is
+not already running. The daemon listens on a Unix socket in the build directory.
+
+The client passes its stdout and stderr file descriptors to the daemon, which writes the output
+of the build (including that of the commands it executes) directly to them. The client's working
+directory and environment variables are applied while the command-line runs. The build scripts
+are loaded again only if the settings, the working directory or the environment changed, or if any
+of the inputs of the configuration changed since they were last loaded (the build scripts, the
+modules of the applied plugins and the directories listed by #Project.glob(), see
+#craftr.core.util.configuration_cache). Any state that is kept in the #Context (e.g. file hash
+caches) is kept as well.
+"""
+
+import argparse
+import array
+import os
+import socket
+import subprocess as sp
+import sys
+import time
+import traceback
+import typing as t
+from pathlib import Path
+
+from craftr.core.context import Context
+from craftr.core.settings import Settings
+from craftr.core.util.configuration_cache import inputs_current
+from craftr.core.util.remote import recv_message, send_message
+
+#: The time in seconds after which an idle daemon shuts itself down.
+DEFAULT_IDLE_TIMEOUT = 3 * 60 * 60
+
+
+def get_socket_path(settings: Settings, directory: Path) -> Path:
+  """
+  Returns the path of the daemon's socket for a build in *directory*.
+  """
+
+  build_directory = settings.get('core.build_directory', None)
+  base = Path(build_directory) if build_directory else directory / '.build'
+  return base.absolute() / 'craftr-daemon.sock'
+
+
+def _send_fds(sock: socket.socket, fds: t.List[int]) -> None:
+  sock.sendmsg([b'F'], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', fds))])
+
+
+def _recv_fds(sock: socket.socket, maxfds: int) -> t.List[int]:
+  fds = array.array('i')
+  _, ancdata, _, _ = sock.recvmsg(1, socket.CMSG_SPACE(maxfds * fds.itemsize))
+  for level, type_, data in ancdata:
+    if level == socket.SOL_SOCKET and type_ == socket.SCM_RIGHTS:
+      fds.frombytes(data[:len(data) - (len(data) % fds.itemsize)])
+  return list(fds)
+
+
+def _settings_key(settings: Settings) -> t.List[t.Tuple[str, str]]:
+  return sorted((key, str(settings[key])) for key in settings)
+
+
+class _LoadedBuild:
+  """
+  A #Context with its root project loaded from *directory*, and the state of everything that the
+  configuration of the projects depends on.
+  """
+
+  def __init__(self, settings: Settings, directory: Path, environ: t.Dict[str, str]) -> None:
+    self.settings_key = _settings_key(settings)
+    self.directory = directory
+    self.environ = environ
+    self.context = Context(settings=settings)
+    self.context.load_project(directory)
+
+  def is_current(self, settings: Settings, directory: Path, environ: t.Dict[str, str]) -> bool:
+    return (
+      _settings_key(settings) == self.settings_key and
+      directory == self.directory and
+      environ == self.environ and
+      inputs_current(self.context.configuration_inputs)
+    )
+
+
+class DaemonServer:
+  """
+  Accepts requests on a Unix socket and handles them one after another.
+  """
+
+  def __init__(self, socket_path: Path, directory: Path, idle_timeout: float = DEFAULT_IDLE_TIMEOUT) -> None:
+    self.socket_path = socket_path
+    self.directory = directory
+    self.idle_timeout = idle_timeout
+    self._build: t.Optional[_LoadedBuild] = None
+    self._running = False
+
+  def serve_forever(self) -> None:
+    from craftr.__main__ import parser
+
+    self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+    if self.socket_path.exists():
+      self.socket_path.unlink()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(self.socket_path))
+    server.listen()
+    server.settimeout(self.idle_timeout)
+    self._running = True
+    try:
+      while self._running:
+        try:
+          conn, _ = server.accept()
+        except socket.timeout:
+          break
+        with conn:
+          conn.settimeout(None)
+          self._handle(conn, parser)
+    finally:
+      server.close()
+      if self.socket_path.exists():
+        self.socket_path.unlink()
+
+  def _handle(self, conn: socket.socket, parser: argparse.ArgumentParser) -> None:
+    fds = _recv_fds(conn, 2)
+    try:
+      request = recv_message(conn)
+      if request is None:
+        return
+      if request.get('type') == 'stop':
+        self._running = False
+        send_message(conn, {'returncode': 0})
+        return
+      directory = Path(request.get('cwd') or self.directory)
+      environ = request.get('env') or dict(os.environ)
+      returncode = self._run_redirected(fds, request['argv'], parser, directory, environ)
+      send_message(conn, {'returncode': returncode})
+    finally:
+      for fd in fds:
+        os.close(fd)
+
+  def _run_redirected(
+    self,
+    fds: t.List[int],
+    argv: t.List[str],
+    parser: argparse.ArgumentParser,
+    directory: Path,
+    environ: t.Dict[str, str],
+  ) -> int:
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = [os.dup(1), os.dup(2)]
+    saved_cwd, saved_environ = os.getcwd(), dict(os.environ)
+    os.dup2(fds[0], 1)
+    os.dup2(fds[1], 2)
+    try:
+      os.chdir(directory)
+      os.environ.clear()
+      os.environ.update(environ)
+      return self._run(argv, parser, directory, environ)
+    finally:
+      sys.stdout.flush()
+      sys.stderr.flush()
+      os.dup2(saved[0], 1)
+      os.dup2(saved[1], 2)
+      for fd in saved:
+        os.close(fd)
+      os.environ.clear()
+      os.environ.update(saved_environ)
+      os.chdir(saved_cwd)
+
+  def _run(self, argv: t.List[str], parser: argparse.ArgumentParser, directory: Path, environ: t.Dict[str, str]) -> int:
+    from craftr.__main__ import load_settings, run
+
+    try:
+      args = parser.parse_args(argv)
+      settings = load_settings(args)
+      if self._build is None or not self._build.is_current(settings, directory, environ):
+        self._build = None
+        self._build = _LoadedBuild(settings, directory, environ)
+      else:
+        self._build.context.graph = self._build.context.create_graph()
+      run(args, argv, self._build.context)
+    except SystemExit as exc:
+      return exc.code if isinstance(exc.code, int) else (0 if exc.code is None else 1)
+    except Exception:
+      traceback.print_exc()
+      return 1
+    return 0
+
+
+def _connect(socket_path: Path) -> t.Optional[socket.socket]:
+  sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  try:
+    sock.connect(str(socket_path))
+  except (FileNotFoundError, ConnectionRefusedError):
+    sock.close()
+    return None
+  return sock
+
+
+def start_daemon(socket_path: Path, timeout: float = 10.0) -> socket.socket:
+  """
+  Starts the daemon in the background and returns a connection to it.
+  """
+
+  socket_path.parent.mkdir(parents=True, exist_ok=True)
+  with open(socket_path.with_suffix('.log'), 'ab') as log:
+    sp.Popen([sys.executable, '-m', 'craftr.daemon', str(socket_path)],
+      stdin=sp.DEVNULL, stdout=log, stderr=log, start_new_session=True)
+  deadline = time.perf_counter() + timeout
+  while time.perf_counter() < deadline:
+    sock = _connect(socket_path)
+    if sock is not None:
+      return sock
+    time.sleep(0.05)
+  raise RuntimeError(f'the Craftr daemon did not start, see {socket_path.with_suffix(".log")}')
+
+
+def run_client(socket_path: Path, argv: t.List[str]) -> int:
+  """
+  Runs the command-line *argv* in the daemon and returns its exit code.
+  """
+
+  sock = _connect(socket_path) or start_daemon(socket_path)
+  with sock:
+    sys.stdout.flush()
+    sys.stderr.flush()
+    _send_fds(sock, [sys.stdout.fileno(), sys.stderr.fileno()])
+    send_message(sock, {
+      'type': 'run',
+      'argv': [x for x in argv if x != '--daemon'],
+      'cwd': os.getcwd(),
+      'env': dict(os.environ),
+    })
+    response = recv_message(sock)
+  if response is None:
+    print('error: the Craftr daemon closed the connection', file=sys.stderr)
+    return 1
+  return response['returncode']
+
+
+def stop_daemon(socket_path: Path) -> None:
+  sock = _connect(socket_path)
+  if sock is not None:
+    with sock:
+      _send_fds(sock, [])
+      send_message(sock, {'type': 'stop'})
+      recv_message(sock)
+
+
+def main() -> None:
+  socket_path = Path(sys.argv[1])
+  DaemonServer(socket_path, Path.cwd()).serve_forever()
+
+
+if __name__ == '__main__':
+  main()
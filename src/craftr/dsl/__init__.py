@@ -4,6 +4,7 @@ This package implements the Craftr DSL laguage.
 """
 
 import typing as t
+from .cache import compile_cached
 from .rewrite import SyntaxError
 from .transpiler import TranspileOptions, transpile_to_ast, transpile_to_source
 
@@ -25,6 +26,5 @@ def execute(
   assert isinstance(code, str)
   filename = filename or '<string>'
 
-  ast = transpile_to_ast(code, filename, options)
-  compiled_code = compile(ast, filename, 'exec')
+  compiled_code = compile_cached(code, filename, options or TranspileOptions())
   exec(compiled_code, globals, locals or globals)
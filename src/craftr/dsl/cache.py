@@ -0,0 +1,153 @@
+"""
+A cache for the code objects of build scripts, similar to the `__pycache__` directories of Python.
+Code objects are stored with #marshal, keyed by a hash of the source code, the filename, the
+#TranspileOptions (or the absence of them for plain Python code) and the versions of Craftr and
+Python. Scripts that did not change are thus not tokenized, rewritten or compiled again.
+
+The cache directory is `$XDG_CACHE_HOME/craftr/code` (defaulting to `~/.cache/craftr/code`) and
+can be changed with the `CRAFTR_CODE_CACHE` environment variable. Setting it to an empty string
+disables the cache.
+"""
+
+import collections
+import dataclasses
+import hashlib
+import importlib.util
+import json
+import marshal
+import os
+import threading
+import types
+import typing as t
+from pathlib import Path
+
+import craftr
+from .transpiler import TranspileOptions, transpile_to_ast
+
+
+def _options_key(options: t.Optional[TranspileOptions]) -> t.Any:
+  if options is None:
+    return None
+  result = {}
+  for field in dataclasses.fields(options):
+    value = getattr(options, field.name)
+    if isinstance(value, (set, frozenset)):
+      value = sorted(value)
+    result[field.name] = value
+  return result
+
+
+class CodeCache:
+  """
+  Compiles scripts and caches the code objects in *directory*. If no *directory* is specified,
+  code objects are only cached in memory. At most *memory_size* code objects are kept in memory,
+  the least recently used ones are evicted first (e.g. those of scripts that were changed by the
+  time a long-running process loads them again).
+  """
+
+  def __init__(self, directory: t.Optional[Path] = None, memory_size: int = 256) -> None:
+    self.directory = directory
+    self.memory_size = memory_size
+    self._lock = threading.Lock()
+    self._memory: 't.OrderedDict[str, types.CodeType]' = collections.OrderedDict()
+
+  def __repr__(self) -> str:
+    return f'{type(self).__name__}(directory={str(self.directory) if self.directory else None!r})'
+
+  def get_key(self, code: str, filename: str, options: t.Optional[TranspileOptions]) -> str:
+    """
+    Returns the hash that the code object for the given parameters is cached by.
+    """
+
+    header = json.dumps({
+      'craftr': craftr.__version__,
+      'python': importlib.util.MAGIC_NUMBER.hex(),
+      'filename': filename,
+      'options': _options_key(options),
+    }, sort_keys=True)
+    return hashlib.sha256(header.encode() + b'\0' + code.encode('utf-8', 'surrogatepass')).hexdigest()
+
+  def _path(self, key: str) -> Path:
+    assert self.directory is not None
+    return self.directory / key[:2] / key[2:]
+
+  def _load(self, key: str) -> t.Optional[types.CodeType]:
+    if self.directory is None:
+      return None
+    try:
+      code = marshal.loads(self._path(key).read_bytes())
+    except (OSError, EOFError, ValueError, TypeError):
+      return None
+    return code if isinstance(code, types.CodeType) else None
+
+  def _store(self, key: str, code: types.CodeType) -> None:
+    if self.directory is None:
+      return
+    path = self._path(key)
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    try:
+      path.parent.mkdir(parents=True, exist_ok=True)
+      tmp.write_bytes(marshal.dumps(code))
+      os.replace(tmp, path)
+    except OSError:
+      # Like Python with an unwritable `__pycache__`, continue without caching the code.
+      pass
+
+  def compile(self, code: str, filename: str = '<string>', options: t.Optional[TranspileOptions] = None) -> types.CodeType:
+    """
+    Returns the code object for the Craftr DSL *code*, transpiled with the given *options*. If
+    *options* is #None, the *code* is compiled as plain Python code.
+    """
+
+    key = self.get_key(code, filename, options)
+    with self._lock:
+      result = self._memory.get(key)
+      if result is not None:
+        self._memory.move_to_end(key)
+    if result is None:
+      result = self._load(key)
+      if result is None:
+        if options is None:
+          result = compile(code, filename, 'exec')
+        else:
+          result = compile(transpile_to_ast(code, filename, options), filename, 'exec')
+        self._store(key, result)
+      with self._lock:
+        self._memory[key] = result
+        while len(self._memory) > self.memory_size:
+          self._memory.popitem(last=False)
+    return result
+
+
+def get_default_directory() -> t.Optional[Path]:
+  """
+  Returns the directory of the #default_cache, or #None if the cache is disabled.
+  """
+
+  directory = os.environ.get('CRAFTR_CODE_CACHE')
+  if directory is not None:
+    return Path(directory) if directory else None
+  cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+  return Path(cache_home) / 'craftr' / 'code'
+
+
+_default_cache: t.Optional[CodeCache] = None
+
+
+def default_cache() -> CodeCache:
+  """
+  Returns the #CodeCache that is shared by the project loaders and #craftr.dsl.execute().
+  """
+
+  global _default_cache
+  if _default_cache is None:
+    _default_cache = CodeCache(get_default_directory())
+  return _default_cache
+
+
+def compile_cached(code: str, filename: str = '<string>', options: t.Optional[TranspileOptions] = None) -> types.CodeType:
+  """
+  Shorthand for `default_cache().compile()`.
+  """
+
+  return default_cache().compile(code, filename, options)
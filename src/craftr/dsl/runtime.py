@@ -11,7 +11,8 @@ import types
 import typing as t
 # import weakref
 
-from craftr.dsl.transpiler import TranspileOptions, transpile_to_ast
+from craftr.dsl.cache import compile_cached
+from craftr.dsl.transpiler import TranspileOptions
 
 undefined = object()
 
@@ -210,7 +211,7 @@ class Closure(Context):
       Closure.init_options(options)
     else:
       options = Closure.get_options()
-    module = compile(transpile_to_ast(code, filename, options), filename, 'exec')
+    module = compile_cached(code, filename, options)
     if scope is None:
       scope = {}
     assert options.closure_target
@@ -0,0 +1,146 @@
+"""
+A worker process that executes actions on behalf of a remote Craftr build, see
+#craftr.core.util.remote for the protocol. Every action is executed in a new sandbox directory
+that contains only the input files that were sent with the action.
+
+A worker executes arbitrary commands for its clients. Unless it only accepts connections from the
+local machine, it should require a shared *token* from its clients.
+"""
+
+import base64
+import hmac
+import os
+import shutil
+import socketserver
+import subprocess as sp
+import tempfile
+import threading
+import typing as t
+
+from craftr.core.util.remote import (PROTOCOL_VERSION, decode_file, is_within, recv_message, replace_directory,
+  send_message)
+
+
+class _Sandbox:
+
+  def __init__(self, root: str, directory: str) -> None:
+    self.root = root
+    self.directory = directory
+
+  def path(self, path: str) -> str:
+    if not os.path.isabs(path) or not is_within(os.path.normpath(path), self.root):
+      raise ValueError(f'path {path!r} is not located in {self.root!r}')
+    return os.path.join(self.directory, os.path.relpath(os.path.normpath(path), self.root))
+
+  def argument(self, arg: str) -> str:
+    return replace_directory(arg, self.root, self.directory)
+
+  def restore(self, data: bytes) -> bytes:
+    """ Replaces the sandbox directory in *data* (e.g. the output of a command) with the root. """
+
+    root = self.root.encode()
+    for directory in dict.fromkeys([self.directory, os.path.realpath(self.directory)]):
+      data = replace_directory(data, directory.encode(), root)
+    return data
+
+
+def execute_request(request: t.Dict[str, t.Any], sandbox_dir: t.Optional[str] = None) -> t.Dict[str, t.Any]:
+  """
+  Executes an `execute` request in a new sandbox directory and returns the response.
+  """
+
+  directory = tempfile.mkdtemp(prefix='craftr-worker-', dir=sandbox_dir)
+  try:
+    sandbox = _Sandbox(os.path.normpath(request['root']), directory)
+    for path, data in request['inputs'].items():
+      decode_file(sandbox.path(path), data)
+    for path in request['outputs']:
+      os.makedirs(os.path.dirname(sandbox.path(path)), exist_ok=True)
+    cwd = sandbox.path(request['working_directory'])
+    os.makedirs(cwd, exist_ok=True)
+
+    output: t.List[bytes] = []
+    for command in request['commands']:
+      try:
+        process = sp.run([sandbox.argument(x) for x in command], cwd=cwd, stdout=sp.PIPE, stderr=sp.STDOUT)
+        returncode = process.returncode
+        output.append(process.stdout)
+      except OSError as exc:
+        returncode = 127
+        output.append(f'{exc}\n'.encode())
+      if returncode != 0:
+        output_data = _b64(sandbox.restore(b''.join(output)))
+        return {'returncode': returncode, 'failed_command': command, 'output': output_data, 'outputs': {}}
+
+    outputs: t.Dict[str, str] = {}
+    for path in request['outputs']:
+      if os.path.isfile(sandbox.path(path)):
+        with open(sandbox.path(path), 'rb') as fp:
+          data = fp.read()
+        if path == request.get('depfile'):
+          data = sandbox.restore(data)
+        outputs[path] = _b64(data)
+    return {'returncode': 0, 'failed_command': None, 'output': _b64(sandbox.restore(b''.join(output))), 'outputs': outputs}
+  finally:
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def _b64(data: bytes) -> str:
+  return base64.b64encode(data).decode('ascii')
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+  server: 'Worker'
+
+  def handle(self) -> None:
+    authenticated = False
+    while True:
+      message = recv_message(self.request)
+      if message is None:
+        return
+      if message.get('type') == 'hello':
+        if not self.server.authenticate(message.get('token')):
+          send_message(self.request, {'error': 'invalid token'})
+          return
+        authenticated = True
+        send_message(self.request, {'version': PROTOCOL_VERSION, 'jobs': self.server.jobs})
+      elif message.get('type') == 'execute' and authenticated:
+        with self.server.slots:
+          response = execute_request(message, self.server.sandbox_dir)
+        send_message(self.request, response)
+      else:
+        return
+
+
+class Worker(socketserver.ThreadingTCPServer):
+  """
+  A TCP server that executes up to *jobs* actions concurrently. Use #serve_forever() to run it. If a
+  *token* is specified, clients must send it to execute actions.
+  """
+
+  daemon_threads = True
+  allow_reuse_address = True
+
+  def __init__(
+    self,
+    address: t.Tuple[str, int],
+    jobs: t.Optional[int] = None,
+    sandbox_dir: t.Optional[str] = None,
+    token: t.Optional[str] = None,
+  ) -> None:
+    super().__init__(address, _Handler)
+    self.jobs = jobs or os.cpu_count() or 1
+    self.sandbox_dir = sandbox_dir
+    self.token = token
+    self.slots = threading.BoundedSemaphore(self.jobs)
+
+  def authenticate(self, token: t.Optional[str]) -> bool:
+    if self.token is None:
+      return True
+    return isinstance(token, str) and hmac.compare_digest(token.encode(), self.token.encode())
+
+  @property
+  def address(self) -> str:
+    host, port = self.server_address[:2]
+    return f'{host}:{port}'
@@ -0,0 +1,48 @@
+import argparse
+import ipaddress
+import os
+import sys
+
+from craftr.core.util.remote import parse_address
+from . import Worker
+
+parser = argparse.ArgumentParser(prog=os.path.basename(sys.executable) + ' -m craftr.worker')
+parser.add_argument('--listen', metavar='HOST:PORT', required=True,
+  help='The address to listen on. Use port 0 to pick a free port. If HOST is omitted, the worker '
+       'only accepts connections from the local machine.')
+parser.add_argument('--token', metavar='TOKEN', default=os.environ.get('CRAFTR_WORKER_TOKEN'),
+  help='The token that clients must send to execute actions (set core.remote.token or '
+       'CRAFTR_WORKER_TOKEN for the clients). Required unless HOST is a loopback address. '
+       '(default: $CRAFTR_WORKER_TOKEN)')
+parser.add_argument('-j', '--jobs', type=int, metavar='N',
+  help='Execute up to N actions concurrently. (default: number of CPUs)')
+parser.add_argument('--sandbox-dir', metavar='DIR',
+  help='The directory in which to create the sandbox directories. (default: system temp directory)')
+
+
+def _is_loopback(host: str) -> bool:
+  if host == 'localhost':
+    return True
+  try:
+    return ipaddress.ip_address(host).is_loopback
+  except ValueError:
+    return False
+
+
+def main():
+  args = parser.parse_args()
+  address = parse_address(args.listen)
+  if not args.token and not _is_loopback(address[0]):
+    parser.error(f'--token is required to listen on {address[0]!r}, the worker executes any command it receives')
+  worker = Worker(address, args.jobs, args.sandbox_dir, args.token or None)
+  print('Listening on', worker.address, flush=True)
+  try:
+    worker.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    worker.server_close()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,10 @@
+import pytest
+
+from craftr.dsl import cache
+
+
+@pytest.fixture(autouse=True)
+def code_cache(tmp_path_factory, monkeypatch):
+  # Keep the code objects that the tests compile out of the user's cache directory.
+  monkeypatch.setenv('CRAFTR_CODE_CACHE', str(tmp_path_factory.mktemp('code-cache')))
+  monkeypatch.setattr(cache, '_default_cache', None)
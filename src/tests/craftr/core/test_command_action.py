@@ -0,0 +1,112 @@
+import os
+import sys
+
+from nr.caching.api import KeyDoesNotExist, KeyValueStore
+
+from craftr.core.base import ActionContext
+from craftr.core.impl.actions.CommandAction import CommandAction
+from craftr.core.util.caching import BufferedKeyValueStore
+from craftr.core.util.digests import FileDigestCache
+
+
+class DictStore(KeyValueStore):
+
+  def __init__(self) -> None:
+    self.values = {}
+
+  def load(self, key):
+    try:
+      return self.values[key]
+    except KeyError:
+      raise KeyDoesNotExist(key)
+
+  def store(self, key, value, expires_in=None):
+    self.values[key] = value
+
+  def expunge(self):
+    pass
+
+
+def test_command_action_is_outdated(tmp_path):
+  src = tmp_path / 'a.txt'
+  out = tmp_path / 'a.out'
+  src.write_text('a')
+  code = 'import sys, shutil; shutil.copy(sys.argv[1], sys.argv[2])'
+  action = CommandAction([sys.executable, '-c', code, str(src), str(out)], input_files=[str(src)], output_files=[str(out)])
+  context = ActionContext(verbose=False, metadata=DictStore())
+
+  assert action.is_outdated(context)
+  action.execute(context)
+  action.complete(context)
+  assert not action.is_outdated(context)
+
+  src.write_text('b')
+  assert action.is_outdated(context)
+  src.write_text('a')
+  assert not action.is_outdated(context)
+
+  out.unlink()
+  assert action.is_outdated(context)
+  action.execute(context)
+
+  other = CommandAction([sys.executable, '-c', code, str(src), str(out), '-'], input_files=[str(src)], output_files=[str(out)])
+  assert other.is_outdated(context)
+
+  assert CommandAction(['true']).is_outdated(context)
+  assert action.is_outdated(ActionContext(verbose=False))
+
+
+def test_command_action_depfile(tmp_path):
+  src = tmp_path / 'a.c'
+  header = tmp_path / 'a.h'
+  out = tmp_path / 'a.o'
+  depfile = tmp_path / 'a.d'
+  src.write_text('#include "a.h"')
+  header.write_text('1')
+  code = 'import sys; open(sys.argv[1], "w").write("a.o: a.c a.h\\n"); open(sys.argv[2], "w").write("")'
+  action = CommandAction([sys.executable, '-c', code, str(depfile), str(out)], working_directory=str(tmp_path),
+    input_files=[str(src)], output_files=[str(out)], depfile=str(depfile))
+  context = ActionContext(verbose=False, metadata=DictStore(), digests=FileDigestCache())
+
+  action.execute(context)
+  assert action.get_depfile_dependencies() == [str(header)]
+  action.complete(context)
+  assert not action.is_outdated(context)
+  header.write_text('2')
+  assert action.is_outdated(context)
+
+
+
+def test_command_action_paths_are_relative_to_the_working_directory(tmp_path, monkeypatch):
+  monkeypatch.chdir(tmp_path)
+  sub = tmp_path / 'sub'
+  sub.mkdir()
+  (sub / 'in.txt').write_text('a')
+  code = 'import shutil; shutil.copy("in.txt", "out.txt")'
+  action = CommandAction([sys.executable, '-c', code], working_directory='sub', input_files=['in.txt'], output_files=['out.txt'])
+  context = ActionContext(verbose=False, metadata=DictStore(), digests=FileDigestCache())
+
+  assert action.resolve_path('in.txt') == str(sub / 'in.txt')
+  action.execute(context)
+  action.complete(context)
+  assert not action.is_outdated(context)
+
+  (sub / 'in.txt').write_text('b')
+  assert action.is_outdated(context)
+  action.execute(context)
+  action.complete(context)
+  assert not action.is_outdated(context)
+  (sub / 'out.txt').unlink()
+  assert action.is_outdated(context)
+
+
+def test_buffered_key_value_store():
+  backend = DictStore()
+  backend.store('a', b'1')
+  store = BufferedKeyValueStore(backend)
+  assert store.load('a') == b'1'
+  store.store('b', b'2')
+  assert store.load('b') == b'2'
+  assert 'b' not in backend.values
+  store.flush()
+  assert backend.values == {'a': b'1', 'b': b'2'}
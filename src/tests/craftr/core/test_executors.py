@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+import typing as t
+from pathlib import Path
+
+import pytest
+
+from craftr.core.base import Action, ActionContext, GraphExecutor
+from craftr.core.context import Context
+from craftr.core.graph import BaseGraph, Node
+from craftr.core.impl.DefaultTask import DefaultTask
+from craftr.core.impl.DefaultTaskGraphExecutor import DefaultTaskGraphExecutor
+from craftr.core.impl.ParallelTaskGraphExecutor import ParallelTaskGraphExecutor, _action_key, _Durations
+from craftr.core.impl.PropertiesTask import TASK_HASH_NAMESPACE, PropertiesTask
+from craftr.core.impl.actions.CommandAction import CommandAction
+from craftr.core.impl.actions.LambdaAction import LambdaAction
+from craftr.core.project import Project
+from craftr.core.settings import Settings
+from craftr.core.util.caching import JsonFileStore
+from craftr.core.util.scheduling import ReadyQueue
+
+
+class _Task(PropertiesTask):
+
+  executed: t.List[str]
+
+  def get_action_graph(self) -> BaseGraph[Action]:
+    graph = BaseGraph[Action]()
+    graph.add(Node('run', LambdaAction(lambda context: self.executed.append(self.path)), []))
+    graph.finalize()
+    return graph
+
+
+def _build(tmp_path: Path, executor: GraphExecutor, count: int) -> t.Tuple[Context, BaseGraph]:
+  context = Context(
+    settings=Settings.of({'core.build_directory': str(tmp_path / 'build')}),
+    executor=executor)
+  project = Project(context, None, tmp_path)
+  context._root_project = project
+  executed: t.List[str] = []
+  tasks = []
+  for i in range(count):
+    task = project.task(f'task{i}', _Task)
+    task.executed = executed
+    if i > 0:
+      task.depends_on(tasks[(i - 1) // 2])
+    tasks.append(task)
+  graph = context.create_graph()
+  for task in tasks:
+    graph.add(task)
+  graph.finalize()
+  return context, graph
+
+
+@pytest.mark.parametrize('executor', [
+  DefaultTaskGraphExecutor(),
+  ParallelTaskGraphExecutor(jobs=8, jobserver=False),
+  ParallelTaskGraphExecutor(jobs=8, engine='asyncio', jobserver=False),
+])
+def test_execute_stores_the_hash_of_every_task(tmp_path, capsys, executor):
+  context, graph = _build(tmp_path, executor, 300)
+  executor.execute(graph)
+  tasks = graph.execution_order()
+  executed = tasks[0].executed
+  assert sorted(executed) == sorted(task.path for task in tasks)
+  for task in tasks:
+    for dep in task.dependencies:
+      assert executed.index(dep.path) < executed.index(task.path)
+
+  hashes = json.loads((tmp_path / 'build' / '.craftr-metadata' / f'{TASK_HASH_NAMESPACE}.json').read_text())
+  assert len(hashes) == 300
+
+  # A new context reads the hashes from the metadata store, so no task is executed again.
+  capsys.readouterr()
+  context, graph = _build(tmp_path, executor, 300)
+  executor.execute(graph)
+  assert graph.execution_order()[0].executed == []
+  assert capsys.readouterr().out.count('UP TO DATE') == 300
+
+
+def test_metadata_gc_does_not_keep_the_process_alive(tmp_path, monkeypatch):
+  context, _graph = _build(tmp_path, DefaultTaskGraphExecutor(), 1)
+  context.settings.set('core.gc_metadata', True)
+  event = threading.Event()
+  monkeypatch.setattr(Context, 'select_tasks', lambda self, selection: [])
+  monkeypatch.setattr(Context, '_run_metadata_gc', lambda self: event.wait())
+  context.execute()
+  try:
+    assert context._gc_thread is not None and context._gc_thread.daemon
+  finally:
+    event.set()
+    context.wait_for_metadata_gc()
+
+
+def test_durations_are_saved_at_once(tmp_path, monkeypatch):
+  saves = []
+  save = JsonFileStore._save
+  monkeypatch.setattr(JsonFileStore, '_save', lambda self: (saves.append(self), save(self)))
+  durations = _Durations(JsonFileStore(str(tmp_path / 'durations.json')))
+  for i in range(100):
+    durations.record(f':task{i}', i)
+  durations.save()
+  assert len(saves) == 1
+  durations = _Durations(JsonFileStore(str(tmp_path / 'durations.json')))
+  assert durations.weights([':task7', ':task9', ':unknown']) == [7.0, 9.0, 8.0]
+
+
+def test_action_durations_are_keyed_by_output_files(tmp_path):
+  _context, graph = _build(tmp_path, DefaultTaskGraphExecutor(), 1)
+  task = graph.execution_order()[0]
+  action = CommandAction(['true'], working_directory=str(tmp_path), output_files=['b.o', 'a.o'])
+  assert _action_key(task, 3, action) == _action_key(task, 0, action)
+  assert _action_key(task, 3, action) == f'{task.path}#{tmp_path / "a.o"}{os.pathsep}{tmp_path / "b.o"}'
+  assert _action_key(task, 3, CommandAction(['true'])) == f'{task.path}#3'
+
+
+
+def test_default_task_runs_do_first_and_do_last_around_its_actions(tmp_path):
+  executed: t.List[str] = []
+
+  class _ActionsTask(DefaultTask):
+    def get_actions(self, graph: BaseGraph[Action]) -> None:
+      graph.add(Node('a', LambdaAction(lambda context: executed.append('a')), []))
+      graph.add(Node('b', LambdaAction(lambda context: executed.append('b')), []))
+
+  context = Context(settings=Settings.of({'core.build_directory': str(tmp_path / 'build')}))
+  task = Project(context, None, tmp_path).task('task', _ActionsTask)
+  task.do_last(lambda task, context: executed.append('last'))
+  task.do_first(lambda task, context: executed.append('first1'))
+  task.do_first(lambda task, context: executed.append('first2'))
+  for action in ReadyQueue(task.get_action_graph()).values:
+    action.execute(ActionContext(verbose=False))
+  assert executed == ['first1', 'first2', 'a', 'b', 'last']
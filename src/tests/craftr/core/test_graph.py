@@ -1,7 +1,12 @@
 
 import dataclasses
+import random
+import time
 import typing as t
-from craftr.core.graph import Node, NodeGroup, NodeHandler, Graph
+
+import pytest
+
+from craftr.core.graph import BaseGraph, CyclicDependencyError, Node, NodeGroup, NodeHandler, Graph
 
 
 @dataclasses.dataclass
@@ -60,3 +65,94 @@ def test_graph2_node_groups():
   g.finalize()
   order = [x.id for x in g.execution_order()]
   assert order == ['a1', 'a2', 'b1', 'b3', 'b2', 'c1']
+
+
+def test_graph3_subgraph():
+  g = Graph(ActionHandler())
+  a1 = Action('a1')
+  a2 = Action('a2', [a1])
+  a3 = Action('a3', [a2])
+  g.add(a3)
+  g.finalize()
+
+  sub = g.subgraph([g['a3'], g['a2']])
+  assert [x.id for x in sub.execution_order()] == ['a2', 'a3']
+  assert list(sub.dependencies_of(g['a2'])) == []
+
+
+def test_graph4_cycle():
+  g = Graph(ActionHandler())
+  a1 = Action('a1')
+  a2 = Action('a2', [a1])
+  a3 = Action('a3', [a2])
+  a4 = Action('a4', [a3])
+  g.add(a4)
+  g['a2'].dependencies.append(g['a3'])
+  g.finalize()
+
+  with pytest.raises(CyclicDependencyError) as excinfo:
+    g.execution_order()
+  assert [x.id for x in excinfo.value.cycle] in (['a2', 'a3', 'a2'], ['a3', 'a2', 'a3'])
+  assert 'a2 -> a3' in str(excinfo.value) or 'a3 -> a2' in str(excinfo.value)
+
+
+def _random_graph(num_nodes: int, num_edges: int) -> BaseGraph:
+  rnd = random.Random(num_nodes)
+  g: BaseGraph = BaseGraph()
+  nodes = [Node(str(i), None, []) for i in range(num_nodes)]
+  group = NodeGroup('chain', [], [], linear=True)
+  g.add(group)
+  for i, node in enumerate(nodes):
+    g.add(node, group if i % 2 == 0 else None)
+  for i in range(num_edges - num_nodes // 2):
+    a, b = rnd.randrange(num_nodes), rnd.randrange(num_nodes)
+    if a != b:
+      nodes[max(a, b)].dependencies.append(nodes[min(a, b)])
+  g.finalize()
+  return g
+
+
+def test_graph5_execution_order_scales_linearly():
+  # See benchmarks/graph_execution_order.py for larger graphs.
+  def _measure(num_edges: int) -> float:
+    durations = []
+    for _ in range(3):
+      g = _random_graph(num_edges // 4, num_edges)
+      tstart = time.perf_counter()
+      order = g.execution_order()
+      durations.append(time.perf_counter() - tstart)
+    position = {node.id: i for i, node in enumerate(order)}
+    assert all(position[dep.id] < position[node.id] for node in order for dep in g.dependencies_of(node))
+    return min(durations) / num_edges
+
+  # The cost per edge would grow with the size of the graph for a quadratic algorithm, and be four
+  # times as high for the largest graph.
+  per_edge = [_measure(num_edges) for num_edges in (25_000, 50_000, 100_000)]
+  assert max(per_edge) / min(per_edge) < 2
+
+
+def test_graph6_frozen():
+  g = Graph(ActionHandler())
+  a1 = Action('a1')
+  a2 = Action('a2')
+  b1 = Action('b1', [a2, a1])
+  c1 = Action('c1', [b1, a1])
+  g.add(c1)
+  g.finalize()
+
+  frozen = g.freeze()
+  assert frozen is g.freeze()
+  ids = {node.id: frozen.index[node.id] for node in frozen.nodes}
+  names = {i: name for name, i in ids.items()}
+  assert sorted(names[i] for i in frozen.dependencies[ids['c1']]) == ['a1', 'b1']
+  assert sorted(names[i] for i in frozen.dependents[ids['a1']]) == ['b1', 'c1']
+  assert list(frozen.dependencies.degrees()) == [len(frozen.dependencies[i]) for i in range(len(frozen))]
+  assert [names[i] for i in frozen.execution_order()] == [x.id for x in g.execution_order()]
+  assert sorted(names[i] for i in frozen.reachable([ids['b1']])) == ['a1', 'a2', 'b1']
+  assert sorted(names[i] for i in frozen.reachable([ids['a2']], dependents=True)) == ['a2', 'b1', 'c1']
+  assert sorted(names[i] for i in frozen.ready({ids['a1']})) == ['a2']
+  assert sorted(names[i] for i in frozen.ready({ids['a1'], ids['a2']})) == ['b1']
+
+  ordered = frozen.ordered()
+  assert [x.id for x in ordered.nodes] == [x.id for x in g.execution_order()]
+  assert all(dep < i for i in range(len(ordered)) for dep in ordered.dependencies[i])
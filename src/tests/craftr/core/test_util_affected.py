@@ -0,0 +1,54 @@
+import types
+from pathlib import Path
+
+from craftr.core.graph import BaseGraph, Node
+from craftr.core.util.affected import AffectedIndex
+
+
+class FakeTask(Node):
+
+  def __init__(self, path, project, inputs, dependencies=()):
+    super().__init__(path, None, list(dependencies))
+    self.path = path
+    self.project = project
+    self.inputs = inputs
+
+
+def _make_index(tmp_path):
+  project = types.SimpleNamespace(build_script=tmp_path / 'build.craftr')
+  other = types.SimpleNamespace(build_script=None)
+  compile = FakeTask(':compile', project, [tmp_path / 'src' / 'main.c', tmp_path / 'include'])
+  link = FakeTask(':link', project, [], [compile])
+  test = FakeTask(':test', project, [tmp_path / 'test.py'], [link])
+  docs = FakeTask(':docs', other, [tmp_path / 'docs'])
+  graph = BaseGraph()
+  for task in (test, docs):
+    graph.add(task)
+  graph.finalize()
+  return AffectedIndex.from_graph('key', graph.freeze(), lambda task: task.inputs)
+
+
+def test_affected_index(tmp_path):
+  index = _make_index(tmp_path)
+  assert index.affected_by([]) == []
+  assert index.affected_by([tmp_path / 'src' / 'main.c']) == [':compile', ':link', ':test']
+  assert index.affected_by([tmp_path / 'include' / 'a' / 'b.h']) == [':compile', ':link', ':test']
+  assert index.affected_by([tmp_path / 'test.py']) == [':test']
+  assert index.affected_by([tmp_path / 'test.py', tmp_path / 'docs' / 'index.md']) == [':test', ':docs']
+  assert index.affected_by([tmp_path / 'build.craftr']) == [':compile', ':link', ':test']
+  assert index.affected_by([tmp_path / 'src' / 'other.c', Path('/unrelated')]) == []
+
+
+def test_affected_index_json(tmp_path):
+  index = _make_index(tmp_path)
+  loaded = AffectedIndex.from_json(index.to_json())
+  assert loaded.key == 'key'
+  assert loaded.tasks == index.tasks
+  assert loaded.affected_by([tmp_path / 'include' / 'c.h']) == [':compile', ':link', ':test']
+
+  filename = tmp_path / 'index.json'
+  assert AffectedIndex.load(filename) is None
+  index.save(filename)
+  assert AffectedIndex.load(filename).files == index.files
+  filename.write_text('{"key": "key"}')
+  assert AffectedIndex.load(filename) is None
@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+from nr.caching.api import KeyDoesNotExist
+
+from craftr.core.util.caching import BufferedKeyValueStore, JsonFileStore, LogDirectoryStore, LogFileStore, SqliteNamespaceStore
+
+
+def test_sqlite_namespace_store(tmp_path):
+  filename = str(tmp_path / 'metadata.sqlite3')
+  store = SqliteNamespaceStore(filename, batch_size=10, flush_interval=60)
+  a = store.namespace('a')
+  a.store('x', b'1')
+  store.namespace('b').store('x', b'2')
+  assert a.load('x') == b'1'
+
+  # Writes are only visible to other connections when they are committed.
+  other = SqliteNamespaceStore(filename)
+  with pytest.raises(KeyDoesNotExist):
+    other.namespace('a').load('x')
+  store.flush()
+  assert other.namespace('a').load('x') == b'1'
+  assert other.namespace('b').load('x') == b'2'
+
+  a.store('x', b'', expires_in=0)
+  store.flush()
+  with pytest.raises(KeyDoesNotExist):
+    other.namespace('a').load('x')
+
+
+def test_sqlite_namespace_store_threads(tmp_path):
+  store = SqliteNamespaceStore(str(tmp_path / 'metadata.sqlite3'), batch_size=7)
+  namespace = store.namespace('test')
+
+  def _worker(index: int) -> None:
+    for i in range(50):
+      namespace.store(f'{index}-{i}', str(i).encode())
+
+  threads = [threading.Thread(target=_worker, args=(i,)) for i in range(8)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  store.flush()
+
+  other = SqliteNamespaceStore(str(tmp_path / 'metadata.sqlite3')).namespace('test')
+  assert all(other.load(f'{index}-{i}') == str(i).encode() for index in range(8) for i in range(50))
+
+
+def test_log_file_store(tmp_path):
+  filename = str(tmp_path / 'test.log')
+  store = LogFileStore(filename, flush_interval=60)
+  store.store('a', b'1')
+  store.store('b', b'2')
+  store.store('a', b'3')
+  store.store('b', b'', expires_in=0)
+  assert store.load('a') == b'3'
+  with pytest.raises(KeyDoesNotExist):
+    store.load('b')
+  store.flush()
+
+  other = LogFileStore(filename)
+  assert other.load('a') == b'3'
+  with pytest.raises(KeyDoesNotExist):
+    other.load('b')
+
+  # A torn record at the end of the log is discarded.
+  with open(filename, 'ab') as fp:
+    fp.write(LogFileStore._encode('c', b'4', None)[:-1])
+  other = LogFileStore(filename)
+  assert other.load('a') == b'3'
+  with pytest.raises(KeyDoesNotExist):
+    other.load('c')
+  other.store('c', b'5')
+  other.flush()
+  assert LogFileStore(filename).load('c') == b'5'
+
+
+def test_log_file_store_compaction(tmp_path, monkeypatch):
+  monkeypatch.setattr(LogFileStore, 'MIN_COMPACTION_RECORDS', 10)
+  filename = str(tmp_path / 'test.log')
+  store = LogFileStore(filename, batch_size=5)
+  store.store('e', b'e', expires_in=60)
+  store.store('x', b'x', expires_in=-1)
+  for i in range(100):
+    store.store(str(i % 3), str(i).encode())
+  store.flush()
+  assert store._records < 10
+  other = LogFileStore(filename)
+  assert {other.load(str(i)) for i in range(3)} == {b'97', b'98', b'99'}
+  assert other.load('e') == b'e'
+  assert 'x' not in other._load()
+
+
+def test_log_directory_store(tmp_path):
+  store = LogDirectoryStore(str(tmp_path), create_dir=True)
+  assert store.namespace('a') is store.namespace('a')
+  for i in range(100000):
+    store.namespace('a').store(f'task-{i}', b'x' * 20)
+  store.flush()
+  tstart = time.perf_counter()
+  assert LogDirectoryStore(str(tmp_path)).namespace('a').load('task-99999') == b'x' * 20
+  assert time.perf_counter() - tstart < 5
+
+
+def test_buffered_key_value_store_flushes_at_once(tmp_path, monkeypatch):
+  saves = []
+  save = JsonFileStore._save
+  monkeypatch.setattr(JsonFileStore, '_save', lambda self: (saves.append(self), save(self)))
+  store = BufferedKeyValueStore(JsonFileStore(str(tmp_path / 'a.json')))
+  for i in range(1000):
+    store.store(f'task-{i}', str(i).encode())
+  assert store.load('task-999') == b'999'
+  assert saves == []
+  store.flush()
+  assert len(saves) == 1
+  store.flush()
+  assert len(saves) == 1
+  assert JsonFileStore(str(tmp_path / 'a.json')).load('task-999') == b'999'
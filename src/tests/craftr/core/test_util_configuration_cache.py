@@ -0,0 +1,87 @@
+import os
+import typing as t
+from pathlib import Path
+
+import pytest
+
+from craftr.core.impl.PropertiesTask import PropertiesTask
+from craftr.core.project import Project
+from craftr.core.property import Property
+from craftr.core.util.configuration_cache import PICKLE_ERRORS, ConfigurationCache
+from craftr.core.util.snapshot import FileSystemSnapshot
+
+
+class FakeContext:
+
+  def __init__(self) -> None:
+    self._root_project = None
+    self.applied_plugins = {}
+    self.file_snapshot = FileSystemSnapshot()
+
+  def iter_projects(self) -> t.Iterator[Project]:
+    def _recurse(project):
+      yield project
+      for subproject in project.subprojects():
+        yield from _recurse(subproject)
+    yield from _recurse(self._root_project)
+
+
+class CopyTask(PropertiesTask):
+  source = Property(Path, is_input=True)
+  message = Property(str)
+
+
+def _make_project(tmp_path: Path, context: FakeContext) -> Project:
+  (tmp_path / 'build.craftr').write_text('# build script')
+  (tmp_path / 'src').mkdir(exist_ok=True)
+  project = Project(context, None, tmp_path)
+  project.build_script = tmp_path / 'build.craftr'
+  compile = project.task('compile', CopyTask)
+  compile.source.set(tmp_path / 'a.txt')
+  link = project.task('link')
+  link.depends_on(compile)
+  context.file_snapshot.glob(tmp_path / 'src', '*.c')
+  project.finalize()
+  return project
+
+
+def test_configuration_cache(tmp_path):
+  context = FakeContext()
+  project = _make_project(tmp_path, context)
+  cache = ConfigurationCache(tmp_path / '.build' / 'cache.pickle', 'key')
+  assert cache.load(context) is None
+  cache.save(context, project)
+
+  other = FakeContext()
+  restored = cache.load(other)
+  assert restored is not None and restored is not project
+  assert restored.context is other
+  assert restored.directory == tmp_path
+  compile, link = restored.tasks.compile, restored.tasks.link
+  assert type(compile) is CopyTask
+  assert compile.finalized and link.finalized
+  assert compile.project is restored
+  assert link.dependencies == [compile] and link.dependencies[0] is compile
+  assert compile.source.get() == tmp_path / 'a.txt'
+  assert compile.message.or_none() is None
+
+  assert ConfigurationCache(cache.filename, 'other').load(FakeContext()) is None
+  (tmp_path / 'src' / 'b.c').write_text('')
+  assert cache.load(FakeContext()) is None
+  context = FakeContext()
+  cache.save(context, _make_project(tmp_path, context))
+  assert cache.load(FakeContext()) is not None
+  (tmp_path / 'build.craftr').write_text('# changed build script')
+  assert cache.load(FakeContext()) is None
+
+
+def test_configuration_cache_not_picklable(tmp_path):
+  context = FakeContext()
+  project = _make_project(tmp_path, context)
+  cache = ConfigurationCache(tmp_path / '.build' / 'cache.pickle', 'key')
+  cache.save(context, project)
+
+  project.tasks.link.do_last(lambda task, context: None)
+  with pytest.raises(PICKLE_ERRORS):
+    cache.save(context, project)
+  assert not os.path.exists(cache.filename)
@@ -0,0 +1,22 @@
+from craftr.core.util.depfile import parse_depfile, read_dependencies
+
+
+def test_parse_depfile():
+  text = (
+    'build/main.o: src/main.c include/a\\ b.h \\\n'
+    '  include/c.h\n'
+    '\n'
+    'include/c.h:\n'
+    'x.o y.o: $$dollar.h C:\\sdk\\win.h\n')
+  assert parse_depfile(text) == {
+    'build/main.o': ['src/main.c', 'include/a b.h', 'include/c.h'],
+    'include/c.h': [],
+    'x.o': ['$dollar.h', 'C:\\sdk\\win.h'],
+    'y.o': ['$dollar.h', 'C:\\sdk\\win.h'],
+  }
+
+
+def test_read_dependencies(tmp_path):
+  path = tmp_path / 'main.d'
+  path.write_text('main.o: main.c a.h \\\n b.h\na.h:\nb.h:\n')
+  assert read_dependencies(str(path)) == ['main.c', 'a.h', 'b.h']
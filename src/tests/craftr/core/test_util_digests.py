@@ -0,0 +1,112 @@
+import hashlib
+
+import pytest
+
+from craftr.core.util import digests
+from craftr.core.util.caching import JsonFileStore
+from craftr.core.util.digests import FileDigestCache, file_digest
+from .test_command_action import DictStore
+
+
+def test_file_digest_cache(tmp_path, monkeypatch):
+  path = tmp_path / 'a.txt'
+  path.write_text('a')
+  store = DictStore()
+  cache = FileDigestCache(store)
+  digest = cache.digest(path)
+  assert digest is not None
+  assert cache.digest(tmp_path / 'missing') is None
+
+  # Files that were modified recently are not persisted.
+  cache.flush()
+  assert not store.values
+
+  monkeypatch.setattr(digests, '_RACY_NS', 0)
+  path.write_text('b')
+  digest = cache.digest(path)
+  assert not store.values
+  cache.flush()
+  assert list(store.values) == [str(path)]
+
+  # The digest is reused as long as the stat metadata doesn't change.
+  other = FileDigestCache(store)
+  monkeypatch.setattr(digests, 'file_digest', None)
+  assert other.digest(path) == digest
+
+
+@pytest.mark.parametrize('hash_algo', ['sha1', 'blake2b'])
+def test_file_digest(tmp_path, monkeypatch, hash_algo):
+  monkeypatch.setattr(digests, 'MMAP_THRESHOLD', 1000)
+  monkeypatch.setattr(digests, '_local', type(digests._local)())
+  monkeypatch.setattr(digests, 'BUFFER_SIZE', 64)
+  small = tmp_path / 'small'
+  large = tmp_path / 'large'
+  empty = tmp_path / 'empty'
+  small.write_bytes(bytes(range(200)))
+  large.write_bytes(bytes(range(256)) * 10)
+  empty.write_bytes(b'')
+  for path in (small, large, empty):
+    assert file_digest(path, hash_algo) == hashlib.new(hash_algo, path.read_bytes()).hexdigest()
+
+
+def test_digest_many(tmp_path):
+  paths = [tmp_path / f'{i}.txt' for i in range(20)]
+  for i, path in enumerate(paths):
+    path.write_text(str(i))
+  cache = FileDigestCache(hash_algo='blake2b')
+  expected = [hashlib.blake2b(str(i).encode()).hexdigest() for i in range(20)]
+  assert cache.digest_many(paths + [tmp_path / 'missing']) == expected + [None]
+  assert cache.digest_many(list(reversed(paths))) == list(reversed(expected))
+
+  with pytest.raises(ValueError):
+    FileDigestCache(hash_algo='nope')
+
+
+def test_digest_tree(tmp_path, monkeypatch):
+  monkeypatch.setattr(digests, '_RACY_NS', 0)
+  root = tmp_path / 'tree'
+  for i in range(3):
+    (root / f'd{i}').mkdir(parents=True)
+    for j in range(3):
+      (root / f'd{i}' / f'{j}.txt').write_text(f'{i}{j}')
+  (root / 'd0' / 'x.pyc').write_text('x')
+
+  store = DictStore()
+  cache = FileDigestCache(store)
+  digest = cache.digest_tree(root)
+  assert cache.digest_many([root]) == [digest]
+  assert cache.digest_tree(tmp_path / 'missing') is None
+  assert cache.digest_tree(root, exclude=['*.pyc']) != digest
+  assert cache.digest_tree(root, include=['d1/*']) != cache.digest_tree(root, include=['d2/*'])
+  cache.flush()
+
+  # Only the changed file is read again, and only the changed subtree is rehashed.
+  (root / 'd1' / '0.txt').write_text('changed')
+  hashed = []
+  file_digest = digests.file_digest
+  monkeypatch.setattr(digests, 'file_digest', lambda path, algo: hashed.append(path) or file_digest(path, algo))
+  other = FileDigestCache(store)
+  new_digest = other.digest_tree(root)
+  assert new_digest != digest
+  assert hashed == [str(root / 'd1' / '0.txt')]
+
+  (root / 'd1' / '0.txt').write_text('10')
+  assert other.digest_tree(root) == digest
+
+
+def test_file_digest_cache_flushes_at_once(tmp_path, monkeypatch):
+  monkeypatch.setattr(digests, '_RACY_NS', 0)
+  saves = []
+  save = JsonFileStore._save
+  monkeypatch.setattr(JsonFileStore, '_save', lambda self: (saves.append(self), save(self)))
+  paths = [tmp_path / f'{i}.txt' for i in range(100)]
+  for path in paths:
+    path.write_text(path.name)
+  cache = FileDigestCache(JsonFileStore(str(tmp_path / 'digests.json')))
+  for path in paths:
+    cache.digest(path)
+  cache.flush()
+  assert len(saves) == 1
+  other = FileDigestCache(JsonFileStore(str(tmp_path / 'digests.json')))
+  monkeypatch.setattr(digests, 'file_digest', None)
+  assert other.digest(paths[-1]) == cache.digest(paths[-1])
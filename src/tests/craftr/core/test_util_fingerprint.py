@@ -0,0 +1,90 @@
+import enum
+import typing as t
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import pytest
+
+from craftr.core.context import Context
+from craftr.core.graph import Node
+from craftr.core.project import Project
+from craftr.core.property import HavingProperties, ListProperty
+from craftr.core.settings import Settings
+from craftr.core.util.fingerprint import fingerprint
+
+
+class Color(enum.Enum):
+  RED = 1
+  GREEN = 2
+
+
+@dataclass
+class LibInfo:
+  name: str
+  libs: t.List[str] = field(default_factory=list)
+
+
+class Custom:
+
+  def __init__(self, value: str) -> None:
+    self.value = value
+
+  def __craftr_fingerprint__(self) -> t.Any:
+    return self.value
+
+
+def test_fingerprint_distinguishes_types():
+  values = [None, True, False, 0, 1, 1.0, '1', b'1', Path('1'), ['1'], ('1', '2'), {'1'}, {'1': '1'},
+    Color.RED, Color.GREEN, LibInfo('1'), Custom('1')]
+  fingerprints = [fingerprint(x) for x in values]
+  assert len(set(fingerprints)) == len(values)
+  assert fingerprint(['a', 'b']) != fingerprint(['ab'])
+  assert fingerprint(['a', 'b']) == fingerprint(('a', 'b'))
+
+
+def test_fingerprint_is_canonical():
+  assert fingerprint({'a', 'b', 'c'}) == fingerprint({'c', 'b', 'a'})
+  assert fingerprint({'a': 1, 'b': 2}) == fingerprint({'b': 2, 'a': 1})
+  assert fingerprint(LibInfo('a', ['b'])) == fingerprint(LibInfo('a', ['b']))
+  assert fingerprint(LibInfo('a', ['b'])) != fingerprint(LibInfo('a', ['c']))
+  assert fingerprint([Path('a/b')]) == fingerprint([Path('a') / 'b'])
+
+
+def test_fingerprint_rejects_objects_without_repr():
+  with pytest.raises(TypeError):
+    fingerprint(object())
+
+
+def test_fingerprint_of_tasks_and_nodes(tmp_path):
+  project = Project(Context(settings=Settings.of({})), None, tmp_path)
+  a, b = project.task('a'), project.task('b')
+  assert fingerprint([a]) == fingerprint([project.tasks.a])
+  assert fingerprint([a]) != fingerprint([b])
+  assert fingerprint(Node('a', None, [])) == fingerprint(Node('a', 'other', []))
+
+
+def test_fingerprint_of_dataclass_with_unset_fields():
+  @dataclass
+  class Partial:
+    name: str
+    value: int = field(init=False)
+
+    def __repr__(self) -> str:
+      return f'Partial({self.name!r})'
+
+  assert fingerprint(Partial('a')) == fingerprint(Partial('a'))
+  assert fingerprint(Partial('a')) != fingerprint(Partial('b'))
+
+
+def test_property_fingerprint_is_memoized_once_finalized():
+  class Obj(HavingProperties):
+    a = ListProperty(str)
+
+  obj = Obj()
+  obj.a.set(['x'])
+  assert obj.a.fingerprint() == fingerprint(['x'])
+  obj.a.set(['y'])
+  assert obj.a.fingerprint() == fingerprint(['y'])
+  obj.a.finalize()
+  assert obj.a.fingerprint() == fingerprint(['y'])
+  assert obj.a.fingerprint() is obj.a.fingerprint()
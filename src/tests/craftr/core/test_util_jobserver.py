@@ -0,0 +1,73 @@
+import os
+import subprocess as sp
+import sys
+import threading
+
+import pytest
+
+from craftr.core.util.jobserver import Jobserver
+
+pytestmark = pytest.mark.skipif(os.name != 'posix', reason='jobserver requires POSIX')
+
+
+def test_jobserver_tokens():
+  jobserver = Jobserver.create(3)
+  try:
+    for _ in range(3):
+      jobserver.acquire()
+
+    acquired = threading.Event()
+    def _acquire() -> None:
+      jobserver.acquire()
+      acquired.set()
+    thread = threading.Thread(target=_acquire)
+    thread.start()
+    assert not acquired.wait(0.1)
+    jobserver.release()
+    assert acquired.wait(1)
+    thread.join()
+
+    for _ in range(3):
+      jobserver.release()
+  finally:
+    jobserver.close()
+
+
+def test_jobserver_child_draws_from_same_pipe():
+  jobserver = Jobserver.create(2)
+  try:
+    kwargs = jobserver.get_subprocess_kwargs({'MAKEFLAGS': 'k -j8'})
+    assert kwargs['env']['MAKEFLAGS'] == f'k {jobserver.makeflags}'
+
+    # The child takes the only token that is in the pipe.
+    code = 'import os; fd = int(os.environ["MAKEFLAGS"].split("=")[-1].split(",")[0]); os.read(fd, 1)'
+    sp.check_call([sys.executable, '-c', code], **kwargs)
+
+    jobserver.acquire()  # The implicit token.
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (jobserver.acquire(), acquired.set()))
+    thread.start()
+    assert not acquired.wait(0.1)
+    os.write(jobserver.write_fd, b'+')  # The child gives its token back.
+    assert acquired.wait(1)
+    thread.join()
+  finally:
+    jobserver.close()
+
+
+def test_jobserver_from_environ():
+  assert Jobserver.from_environ(4, {}) is None
+  assert Jobserver.from_environ(4, {'MAKEFLAGS': ' -j4 --jobserver-auth=1000,1001'}) is None
+
+  server = Jobserver.create(2)
+  try:
+    client = Jobserver.from_environ(4, server.get_subprocess_kwargs({})['env'])
+    assert client is not None
+    assert (client.read_fd, client.write_fd) == (server.read_fd, server.write_fd)
+    client.acquire()
+    client.acquire()
+    client.release()
+    client.release()
+    client.close()
+  finally:
+    server.close()
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+from nr.caching.api import KeyDoesNotExist
+
+from craftr.core.util.caching import JsonDirectoryStore, LogDirectoryStore, SqliteNamespaceStore
+from craftr.core.util.metadata_gc import collect_garbage
+
+
+@pytest.mark.parametrize('store_type', ['json', 'sqlite', 'log'])
+def test_collect_garbage(tmp_path, store_type):
+  if store_type == 'json':
+    store = JsonDirectoryStore(str(tmp_path / 'metadata'), create_dir=True)
+  elif store_type == 'sqlite':
+    store = SqliteNamespaceStore(str(tmp_path / 'metadata' / 'metadata.sqlite3'))
+  else:
+    store = LogDirectoryStore(str(tmp_path / 'metadata'), create_dir=True)
+
+  existing = tmp_path / 'a.txt'
+  existing.write_text('a')
+  missing = str(tmp_path / 'b.txt')
+  store.namespace('task-hashes').store('root:a', b'1')
+  store.namespace('task-hashes').store('root:b', b'1')
+  store.namespace('task-durations').store('root:a#0', b'1')
+  store.namespace('task-durations').store('root:b#0', b'1')
+  store.namespace('file-digests').store(str(existing), b'1')
+  store.namespace('file-digests').store(missing, b'1')
+  store.namespace('file-digests').store(str(tmp_path) + os.sep + '#abc', b'1')
+  store.namespace('action-metadata').store(os.pathsep.join([str(existing), missing]), b'1')
+  store.namespace('action-metadata').store(missing, b'1')
+  if store_type != 'json':
+    store.flush()
+
+  report = collect_garbage(store, ['root:a'])
+  assert report.removed == 4
+  assert report.size > 0
+  assert report.namespaces['task-hashes'][0] == 1
+  assert store.namespace('task-hashes').load('root:a') == b'1'
+  for namespace, key in [('task-hashes', 'root:b'), ('task-durations', 'root:b#0'), ('file-digests', missing)]:
+    with pytest.raises(KeyDoesNotExist):
+      store.namespace(namespace).load(key)
+  assert store.namespace('file-digests').load(str(tmp_path) + os.sep + '#abc') == b'1'
+  assert collect_garbage(store, ['root:a']).removed == 0
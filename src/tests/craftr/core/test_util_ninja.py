@@ -0,0 +1,97 @@
+import io
+import os
+import subprocess as sp
+import typing as t
+from pathlib import Path
+
+from craftr.core.base import Action
+from craftr.core.graph import Graph, Node, NodeHandler
+from craftr.core.impl.actions.CommandAction import CommandAction
+from craftr.core.impl.actions.NoopAction import NoopAction
+from craftr.core.impl.actions.WriteFileAction import WriteFileAction
+from craftr.core.util.ninja import NinjaWriter, _Exporter, escape_path, export_ninja
+
+
+class _ActionHandler(NodeHandler[Action]):
+
+  def get_node_id(self, obj: Action) -> str:
+    return str(id(obj))
+
+  def create_node(self, obj: Action, graph: 'Graph[Action]') -> Node[Action]:
+    node = graph.allocate_node(obj)
+    node.dependencies = [graph.node(d) for d in obj.dependencies]
+    return node
+
+
+class _Task:
+
+  def __init__(self, path: str, *actions: Action) -> None:
+    self.path = path
+    self.actions = actions
+
+  def get_action_graph(self) -> Graph[Action]:
+    graph = Graph(_ActionHandler())
+    for action in self.actions:
+      graph.add(graph.node(action))
+    graph.finalize()
+    return graph
+
+
+def test_ninja_writer():
+  fp = io.StringIO()
+  writer = NinjaWriter(fp)
+  writer.build(['out dir/a.o'], 'command', ['c:/a.c'], order_only=['b'], variables={'cmd': 'cc $in'})
+  assert fp.getvalue() == 'build out$ dir/a.o: command c$:/a.c || b\n  cmd = cc $$in\n'
+  assert escape_path('a$b') == 'a$$b'
+
+
+def test_export_task():
+  compile = CommandAction(['cc', '-c', 'a.c'], input_files=['a.c'], output_files=['a.o'], depfile='a.d')
+  link = CommandAction(['cc', 'a.o'], input_files=['a.o'], output_files=['a.out'])
+  link.dependencies.append(compile)
+  last = NoopAction()
+  last.dependencies.append(link)
+
+  fp = io.StringIO()
+  outputs = _Exporter(NinjaWriter(fp)).export_task(_Task(':main', compile, link, last), [':lib'])
+  assert outputs == [os.path.abspath('a.o'), os.path.abspath('a.out')]
+
+  lines = fp.getvalue().splitlines()
+  builds = [x for x in lines if x.startswith('build ')]
+  assert builds == [
+    f'build {escape_path(os.path.abspath("a.o"))}: command_with_depfile {escape_path(os.path.abspath("a.c"))} || $:lib',
+    f'build {escape_path(os.path.abspath("a.out"))}: command {escape_path(os.path.abspath("a.o"))} || $:lib',
+  ]
+  assert f'  depfile = {os.path.abspath("a.d")}' in lines
+
+
+def test_export_resolves_paths_in_working_directory(tmp_path):
+  action = CommandAction(['cc', '-c', 'a.c'], working_directory=str(tmp_path), input_files=['a.c'],
+    output_files=['a.o'], depfile='a.d')
+
+  fp = io.StringIO()
+  outputs = _Exporter(NinjaWriter(fp)).export_task(_Task(':main', action), [])
+  assert outputs == [str(tmp_path / 'a.o')]
+  assert f'  depfile = {tmp_path / "a.d"}' in fp.getvalue().splitlines()
+
+
+def test_export_write_file_action(tmp_path):
+  path = tmp_path / 'sub' / 'file.txt'
+  fp = io.StringIO()
+  outputs = _Exporter(NinjaWriter(fp)).export_task(_Task(':main', WriteFileAction(path, text='$x\n')), [])
+  assert outputs == [str(path)]
+  assert not path.exists()
+
+  command = next(x for x in fp.getvalue().splitlines() if x.startswith('  cmd = '))[8:].replace('$$', '$')
+  sp.check_call(command, shell=True)
+  assert path.read_text() == '$x\n'
+
+
+def test_export_ninja_regenerate_edge(tmp_path, monkeypatch):
+  monkeypatch.chdir(tmp_path)
+  (tmp_path / 'out').mkdir()
+  with open('out/build.ninja', 'w') as fp:
+    export_ninja(Graph(_ActionHandler()), fp, build_files=[Path('build.craftr')],
+      regenerate_command=['--emit-ninja', 'out/build.ninja'])
+  lines = (tmp_path / 'out' / 'build.ninja').read_text().splitlines()
+  assert f'build out/build.ninja: regenerate {escape_path(str(tmp_path / "build.craftr"))}' in lines
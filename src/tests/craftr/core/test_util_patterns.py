@@ -0,0 +1,29 @@
+from craftr.core.util.patterns import PathFilter, PathPattern
+
+
+def test_path_pattern():
+  assert PathPattern('*.cpp').matches('a.cpp')
+  assert PathPattern('*.cpp').matches('src/a/a.cpp')
+  assert not PathPattern('src/*.cpp').matches('src/a/a.cpp')
+  assert PathPattern('src/**/*.cpp').matches('src/a.cpp')
+  assert PathPattern('src/**/*.cpp').matches('src/a/b/a.cpp')
+  assert not PathPattern('src/**/*.cpp').matches('lib/a.cpp')
+  assert PathPattern('src/**').matches('src/a/b')
+  assert PathPattern('?.[ch]').matches('a.h')
+  assert not PathPattern('[!a].c').matches('a.c')
+  assert PathPattern('.build/').matches('.build', is_dir=True)
+  assert not PathPattern('.build/').matches('.build')
+  assert PathPattern('**/*.c', anchored=True).matches('.build/a.c')
+  assert not PathPattern('**/*.c', anchored=True, match_hidden=False).matches('.build/a.c')
+  assert not PathPattern('**/*.c', anchored=True, match_hidden=False).matches('src/.a.c')
+  assert PathPattern('**/.git/config', anchored=True, match_hidden=False).matches('a/.git/config')
+  assert not PathPattern('src/**', anchored=True, match_hidden=False).matches('src/a/.b')
+
+
+def test_path_filter():
+  path_filter = PathFilter(['*.h'], ['internal/'])
+  assert path_filter.selects_file('a.h')
+  assert not path_filter.selects_file('a.c')
+  assert path_filter.is_excluded('a/internal', True)
+  assert PathFilter().selects_file('a.c')
+  assert path_filter.key != PathFilter(['*.h']).key
@@ -0,0 +1,162 @@
+import os
+import subprocess as sp
+import sys
+import threading
+
+import pytest
+
+from craftr.core.base import ActionContext
+from craftr.core.impl.actions.CommandAction import CommandAction
+from craftr.core.util.caching import BufferedKeyValueStore, JsonFileStore
+from craftr.core.util.remote import RemoteExecutor, replace_directory
+from craftr.worker import Worker
+
+
+@pytest.fixture
+def worker():
+  worker = Worker(('127.0.0.1', 0), jobs=2)
+  thread = threading.Thread(target=worker.serve_forever)
+  thread.start()
+  try:
+    yield worker
+  finally:
+    worker.shutdown()
+    worker.server_close()
+    thread.join()
+
+
+def test_remote_execute(worker, tmp_path):
+  src = tmp_path / 'src' / 'a.txt'
+  src.parent.mkdir()
+  src.write_text('hello')
+  out = tmp_path / 'build' / 'a.txt'
+  code = 'import sys; open(sys.argv[2], "w").write(open(sys.argv[1]).read().upper()); print("done")'
+  action = CommandAction([sys.executable, '-c', code, str(src), str(out)], input_files=[str(src)], output_files=[str(out)])
+
+  remote = RemoteExecutor([worker.address], root=str(tmp_path))
+  try:
+    assert remote.accepts(action, ActionContext(verbose=False))
+    remote.execute(action, ActionContext(verbose=False))
+    assert out.read_text() == 'HELLO'
+    assert remote.workers[0].capacity == 2
+
+    with pytest.raises(sp.CalledProcessError):
+      remote.execute(CommandAction([sys.executable, '-c', 'raise SystemExit(3)'], output_files=[str(out)]),
+        ActionContext(verbose=False))
+  finally:
+    remote.close()
+
+
+def test_remote_rejects_files_outside_root(tmp_path):
+  remote = RemoteExecutor(['127.0.0.1:1'], root=str(tmp_path / 'root'))
+  context = ActionContext(verbose=False)
+  assert not remote.accepts(CommandAction(['true']), context)
+  assert not remote.accepts(CommandAction(['true'], output_files=[str(tmp_path / 'out')]), context)
+  assert remote.accepts(CommandAction(['true'], output_files=[str(tmp_path / 'root' / 'out')]), context)
+
+
+
+def test_remote_resolves_paths_in_the_working_directory(tmp_path):
+  remote = RemoteExecutor(['127.0.0.1:1'], root=str(tmp_path))
+  context = ActionContext(verbose=False)
+  (tmp_path / 'sub').mkdir()
+  (tmp_path / 'sub' / 'in.txt').write_text('a')
+  action = CommandAction(['true'], working_directory=str(tmp_path / 'sub'), input_files=['in.txt'], output_files=['out.txt'])
+  assert remote.accepts(action, context)
+  request = remote.encode_request(action, context)
+  assert list(request['inputs']) == [str(tmp_path / 'sub' / 'in.txt')]
+  assert request['outputs'] == [str(tmp_path / 'sub' / 'out.txt')]
+
+  outside = CommandAction(['true'], working_directory=str(tmp_path / 'sub'), output_files=['../../out.txt'])
+  assert not remote.accepts(outside, context)
+
+
+def test_replace_directory():
+  assert replace_directory('/proj/a.c', '/proj', '/sandbox') == '/sandbox/a.c'
+  assert replace_directory('-I/proj', '/proj', '/sandbox') == '-I/sandbox'
+  assert replace_directory('/proj2/a.c /proj:1', '/proj', '/sandbox') == '/proj2/a.c /sandbox:1'
+  assert replace_directory(b'/proj.d/x /proj', b'/proj', b'/s') == b'/proj.d/x /s'
+
+
+def test_remote_execute_sends_depfile_dependencies(worker, tmp_path):
+  header = tmp_path / 'include' / 'a.h'
+  header.parent.mkdir()
+  header.write_text('from header')
+  src = tmp_path / 'a.c'
+  src.write_text('#include "a.h"')
+  out = tmp_path / 'build' / 'a.o'
+  out.parent.mkdir()
+  depfile = tmp_path / 'build' / 'a.d'
+  # Acts like a compiler that reads the header next to the include directory and writes a depfile.
+  code = (
+    'import os, sys; src, out, dep = sys.argv[1:]; '
+    'header = os.path.join(os.path.dirname(src), "include", "a.h"); '
+    'open(out, "w").write(open(header).read()); '
+    'open(dep, "w").write(f"{out}: {src} {header}\\n"); '
+    'print("compiled", header)'
+  )
+  action = CommandAction([sys.executable, '-c', code, str(src), str(out), str(depfile)],
+    input_files=[str(src)], output_files=[str(out)], depfile=str(depfile))
+  context = ActionContext(verbose=False, metadata=BufferedKeyValueStore(JsonFileStore(str(tmp_path / 'metadata.json'))))
+
+  remote = RemoteExecutor([worker.address], root=str(tmp_path))
+  try:
+    # The headers are not known before the action was executed once.
+    assert not remote.accepts(action, context)
+    action.execute(context)
+    action.complete(context)
+    assert action.get_known_dependencies(context) == [str(header)]
+
+    out.unlink()
+    depfile.unlink()
+    header.write_text('changed header')
+    assert remote.accepts(action, context)
+    remote.execute(action, context)
+    assert out.read_text() == 'changed header'
+    assert depfile.read_text() == f'{out}: {src} {header}\n'
+  finally:
+    remote.close()
+
+
+def test_remote_worker_requires_token(tmp_path):
+  worker = Worker(('127.0.0.1', 0), jobs=1, token='secret')
+  thread = threading.Thread(target=worker.serve_forever)
+  thread.start()
+  out = tmp_path / 'out.txt'
+  code = f'import os; open({str(out)!r}, "w").write(os.getcwd())'
+  action = CommandAction([sys.executable, '-c', code], output_files=[str(out)])
+  try:
+    remote = RemoteExecutor([worker.address], root=str(tmp_path), token='wrong')
+    remote.execute(action, ActionContext(verbose=False))
+    assert not remote.workers[0].available
+    assert out.read_text() == os.getcwd()
+
+    remote = RemoteExecutor([worker.address], root=str(tmp_path), token='secret')
+    remote.execute(action, ActionContext(verbose=False))
+    assert remote.workers[0].available
+    assert 'craftr-worker-' in out.read_text()
+    remote.close()
+  finally:
+    worker.shutdown()
+    worker.server_close()
+    thread.join()
+
+
+def test_remote_least_loaded_worker():
+  remote = RemoteExecutor(['127.0.0.1:1', '127.0.0.1:2'])
+  remote.workers[0].capacity = 4
+  first = remote._acquire_worker()
+  second = remote._acquire_worker()
+  assert (first, second) == (remote.workers[0], remote.workers[1])
+  assert remote._acquire_worker() is remote.workers[0]
+  remote.workers[0].available = False
+  assert remote._acquire_worker() is remote.workers[1]
+
+
+def test_remote_falls_back_to_local_execution(tmp_path):
+  out = tmp_path / 'out.txt'
+  action = CommandAction([sys.executable, '-c', f'open({str(out)!r}, "w").write("x")'], output_files=[str(out)])
+  remote = RemoteExecutor(['127.0.0.1:1'], root=str(tmp_path), timeout=1)
+  remote.execute(action, ActionContext(verbose=False))
+  assert out.read_text() == 'x'
+  assert not remote.workers[0].available
@@ -0,0 +1,234 @@
+import asyncio
+import concurrent.futures
+import subprocess as sp
+import sys
+import threading
+import time
+
+import pytest
+
+from craftr.core.base import ActionContext
+from craftr.core.graph import Graph
+from craftr.core.impl.actions.CommandAction import CommandAction
+from craftr.core.util.scheduling import EventLoopThread, JobLimit, ReadyQueue, execute_async, execute_concurrently
+from .test_graph import Action, ActionHandler
+
+
+def _make_graph() -> Graph[Action]:
+  g = Graph(ActionHandler())
+  a1 = Action('a1')
+  a2 = Action('a2')
+  b1 = Action('b1', [a1, a2])
+  c1 = Action('c1', [b1])
+  g.add(c1)
+  g.finalize()
+  return g
+
+
+def test_ready_queue():
+  queue = ReadyQueue(_make_graph())
+  ids = [n.id for n in queue.nodes]
+  assert sorted(queue.nodes[queue.pop()].id for _ in range(len(queue))) == ['a1', 'a2']
+  assert len(queue) == 0
+  queue.complete(ids.index('a1'))
+  assert len(queue) == 0
+  queue.complete(ids.index('a2'))
+  assert queue.nodes[queue.pop()].id == 'b1'
+  queue.complete(ids.index('b1'))
+  assert queue.nodes[queue.pop()].id == 'c1'
+  assert not queue.done
+  queue.complete(ids.index('c1'))
+  assert queue.done
+
+
+def test_ready_queue_critical_path_first():
+  g = Graph(ActionHandler())
+  leaf = Action('leaf')
+  compile = Action('compile')
+  link = Action('link', [compile])
+  g.add(leaf)
+  g.add(link)
+  g.finalize()
+
+  queue = ReadyQueue(g)
+  ids = [n.id for n in queue.nodes]
+  assert queue.nodes[queue.pop()].id == 'leaf'
+
+  queue = ReadyQueue(g)
+  weights = {'leaf': 5.0, 'compile': 1.0, 'link': 10.0}
+  queue.set_weights([weights[x] for x in ids])
+  assert queue.priorities[ids.index('compile')] == 11.0
+  assert [queue.nodes[queue.pop()].id for _ in range(2)] == ['compile', 'leaf']
+
+
+def test_execute_concurrently():
+  queue = ReadyQueue(_make_graph())
+  lock = threading.Lock()
+  finished = []
+  active = [0, 0]  # current, max
+
+  def _run(index: int) -> None:
+    with lock:
+      active[0] += 1
+      active[1] = max(active)
+    time.sleep(0.05)
+    with lock:
+      active[0] -= 1
+      finished.append(queue.nodes[index].id)
+
+  execute_concurrently(queue, _run, 4)
+  assert queue.done
+  assert sorted(finished[:2]) == ['a1', 'a2']
+  assert finished[2:] == ['b1', 'c1']
+  assert active[1] == 2
+
+
+def test_execute_concurrently_stops_on_first_failure():
+  queue = ReadyQueue(_make_graph())
+  finished = []
+
+  def _run(index: int) -> None:
+    node_id = queue.nodes[index].id
+    if node_id == 'a1':
+      raise RuntimeError('a1 failed')
+    time.sleep(0.05)
+    finished.append(node_id)
+
+  with pytest.raises(RuntimeError, match='a1 failed'):
+    execute_concurrently(queue, _run, 4)
+  assert finished == ['a2']
+
+
+def test_execute_concurrently_shares_job_limit():
+  limit = JobLimit(2)
+  lock = threading.Lock()
+  active = [0, 0]  # current, max
+
+  def _run(index: int) -> None:
+    with lock:
+      active[0] += 1
+      active[1] = max(active)
+    time.sleep(0.02)
+    with lock:
+      active[0] -= 1
+
+  def _run_graph() -> None:
+    execute_concurrently(ReadyQueue(_make_graph()), _run, 4, limit)
+
+  threads = [threading.Thread(target=_run_graph) for _ in range(3)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  assert active[1] == 2
+
+
+def test_execute_async():
+  queue = ReadyQueue(_make_graph())
+  finished = []
+
+  async def _run(index: int) -> None:
+    await asyncio.sleep(0.01)
+    finished.append(queue.nodes[index].id)
+
+  with EventLoopThread() as event_loop:
+    event_loop.run(execute_async(queue, _run, 4, JobLimit(1)))
+  assert queue.done
+  assert sorted(finished[:2]) == ['a1', 'a2']
+  assert finished[2:] == ['b1', 'c1']
+
+
+def test_job_limit_async_waiters_do_not_occupy_the_default_executor():
+  # The holder of the only slot needs the default executor to finish its job. A waiter that
+  # blocked an executor thread while waiting for the slot would deadlock.
+  limit = JobLimit(1)
+  order = []
+
+  async def _job(name: str) -> None:
+    await limit.acquire_async()
+    try:
+      await asyncio.get_running_loop().run_in_executor(None, order.append, name)
+    finally:
+      limit.release()
+
+  async def _main() -> None:
+    asyncio.get_running_loop().set_default_executor(concurrent.futures.ThreadPoolExecutor(1))
+    await asyncio.wait_for(asyncio.gather(*(_job(str(i)) for i in range(4))), 5)
+
+  asyncio.run(_main())
+  assert order == ['0', '1', '2', '3']
+
+
+def test_job_limit_shared_by_threads_and_coroutines():
+  limit = JobLimit(2)
+  lock = threading.Lock()
+  active = [0, 0]  # current, max
+
+  def _enter() -> None:
+    with lock:
+      active[0] += 1
+      active[1] = max(active)
+
+  def _leave() -> None:
+    with lock:
+      active[0] -= 1
+
+  def _thread() -> None:
+    for _ in range(5):
+      with limit:
+        _enter()
+        time.sleep(0.005)
+        _leave()
+
+  async def _coroutine() -> None:
+    for _ in range(5):
+      await limit.acquire_async()
+      _enter()
+      await asyncio.sleep(0.005)
+      _leave()
+      limit.release()
+
+  threads = [threading.Thread(target=_thread) for _ in range(2)]
+  threads += [threading.Thread(target=asyncio.run, args=(_coroutine(),)) for _ in range(2)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  assert active == [0, 2]
+  with pytest.raises(ValueError):
+    limit.release()
+
+
+def test_job_limit_cancelled_waiter_gives_back_its_slot():
+  limit = JobLimit(1)
+
+  async def _main() -> None:
+    await limit.acquire_async()
+    waiter = asyncio.ensure_future(limit.acquire_async())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    limit.release()
+    await asyncio.sleep(0)
+    await asyncio.wait_for(limit.acquire_async(), 1)
+
+  asyncio.run(_main())
+
+
+def test_command_action_execute_async_buffers_output(capfd):
+  context = ActionContext(verbose=False)
+  actions = [
+    CommandAction(commands=[[sys.executable, '-c', f'print("{i}a")'], [sys.executable, '-c', f'print("{i}b")']])
+    for i in range(4)]
+
+  async def _run_all() -> None:
+    await asyncio.gather(*(action.execute_async(context) for action in actions))
+
+  with EventLoopThread() as event_loop:
+    event_loop.run(_run_all())
+    lines = capfd.readouterr().out.splitlines()
+    assert sorted(lines) == sorted(f'{i}{x}' for i in range(4) for x in 'ab')
+    for i in range(4):
+      assert lines.index(f'{i}b') == lines.index(f'{i}a') + 1
+
+    with pytest.raises(sp.CalledProcessError):
+      event_loop.run(CommandAction([sys.executable, '-c', 'import sys; sys.exit(1)']).execute_async(context))
@@ -0,0 +1,81 @@
+import os
+
+from craftr.core.util import snapshot
+from craftr.core.util.caching import JsonFileStore
+from craftr.core.util.snapshot import FileSystemSnapshot
+from .test_command_action import DictStore
+
+
+def _make_tree(root, files):
+  for name in files:
+    path = root / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(name)
+
+
+def test_snapshot_glob(tmp_path):
+  _make_tree(tmp_path, ['a.cpp', 'src/b.cpp', 'src/c.h', 'src/sub/d.cpp', '.build/e.cpp', 'src/.build/f.cpp'])
+  fs = FileSystemSnapshot()
+
+  def glob(*patterns, exclude=()):
+    return [os.path.relpath(x, tmp_path) for x in fs.glob(tmp_path, patterns, exclude)]
+
+  assert glob('*.cpp') == ['a.cpp']
+  assert glob('src/*.cpp') == ['src/b.cpp']
+  assert glob('src/**/*.cpp') == ['src/b.cpp', 'src/sub/d.cpp']
+  assert glob('src/.build/*.cpp') == ['src/.build/f.cpp']
+  assert glob('**/.build/*.cpp') == ['.build/e.cpp', 'src/.build/f.cpp']
+  assert glob('**/*.cpp', exclude=['.build/']) == ['a.cpp', 'src/b.cpp', 'src/sub/d.cpp']
+  assert glob('src/*.cpp', 'src/*.h') == ['src/b.cpp', 'src/c.h']
+  assert glob('src/sub') == ['src/sub']
+  assert glob('missing/*') == []
+
+
+def test_snapshot_glob_skips_hidden_names(tmp_path):
+  _make_tree(tmp_path, ['src/a.c', 'src/.x.c', 'src/.hidden/b.c', '.build/gen.c'])
+  fs = FileSystemSnapshot()
+
+  def glob(*patterns):
+    return [os.path.relpath(x, tmp_path) for x in fs.glob(tmp_path, patterns)]
+
+  assert glob('**/*.c') == ['src/a.c']
+  assert str(tmp_path / '.build') not in fs.listed_directories()
+  assert str(tmp_path / 'src' / '.hidden') not in fs.listed_directories()
+  assert glob('src/*') == ['src/a.c']
+  assert glob('src/.*') == ['src/.hidden', 'src/.x.c']
+  assert glob('.build/*.c') == ['.build/gen.c']
+
+
+def test_snapshot_persists_listings(tmp_path, monkeypatch):
+  monkeypatch.setattr(snapshot, '_RACY_NS', 0)
+  _make_tree(tmp_path, ['src/a.cpp'])
+  store = DictStore()
+  fs = FileSystemSnapshot(store)
+  assert fs.glob(tmp_path, 'src/*.cpp') == [tmp_path / 'src' / 'a.cpp']
+  fs.flush()
+  assert str(tmp_path / 'src') in store.values
+
+  # A persisted listing is reused without reading the directory.
+  monkeypatch.setattr(os, 'scandir', None)
+  assert FileSystemSnapshot(store).glob(tmp_path, 'src/*.cpp') == [tmp_path / 'src' / 'a.cpp']
+  monkeypatch.undo()
+
+  # A directory whose modification time changed is listed again.
+  (tmp_path / 'src' / 'b.cpp').write_text('')
+  os.utime(tmp_path / 'src', ns=(0, os.stat(tmp_path / 'src').st_mtime_ns + 1000))
+  assert FileSystemSnapshot(store).glob(tmp_path, 'src/*.cpp') == [tmp_path / 'src' / 'a.cpp', tmp_path / 'src' / 'b.cpp']
+
+
+def test_snapshot_flushes_at_once(tmp_path, monkeypatch):
+  monkeypatch.setattr(snapshot, '_RACY_NS', 0)
+  saves = []
+  save = JsonFileStore._save
+  monkeypatch.setattr(JsonFileStore, '_save', lambda self: (saves.append(self), save(self)))
+  _make_tree(tmp_path / 'src', [f'{i}/a.c' for i in range(50)])
+  fs = FileSystemSnapshot(JsonFileStore(str(tmp_path / 'listings.json')))
+  assert len(fs.glob(tmp_path / 'src', '**/*.c')) == 50
+  fs.flush()
+  assert len(saves) == 1
+  other = FileSystemSnapshot(JsonFileStore(str(tmp_path / 'listings.json')))
+  monkeypatch.setattr(os, 'scandir', None)
+  assert len(other.glob(tmp_path / 'src', '**/*.c')) == 50
@@ -0,0 +1,40 @@
+from craftr.core.util.digests import FileDigestCache, record_stats
+from craftr.core.util.task_state import TaskState, check_task, explain_changes
+
+
+class FakeTask:
+
+  def __init__(self, path, reason=None, always_outdated=False):
+    self.path = path
+    self.reason = reason
+    self.always_outdated = always_outdated
+
+  def explain_outdated(self):
+    return self.reason
+
+
+def test_explain_changes():
+  old = TaskState('1', {'a': 'x', 'b': 'y'}, {'f1': 'd1', 'f2': 'd2'})
+  assert explain_changes(None, old) == 'no previous execution was recorded'
+  assert explain_changes(old, TaskState.from_json(old.to_json())) is None
+  assert explain_changes(old, TaskState('2', {'a': 'x', 'b': 'z'}, old.files)) == "property 'b' changed"
+  assert explain_changes(old, TaskState('2', old.properties, {'f1': 'd1', 'f2': 'd3'})) == "input file 'f2' changed"
+  assert explain_changes(old, TaskState('2', old.properties, {'f1': 'd1'})) == "input file 'f2' was removed"
+  assert explain_changes(old, TaskState('2', old.properties, {**old.files, 'f3': None})) == "input file 'f3' was added"
+
+
+def test_check_task():
+  assert not check_task(FakeTask(':a')).outdated
+  assert check_task(FakeTask(':a', always_outdated=True)).reason == 'the task is always outdated'
+  assert check_task(FakeTask(':a', 'foo'), [FakeTask(':b')]).reason == 'foo'
+  assert check_task(FakeTask(':a'), [FakeTask(':b')]).reason == "dependency ':b' was executed"
+
+
+def test_record_stats(tmp_path):
+  path = tmp_path / 'a.txt'
+  path.write_bytes(b'x' * 100)
+  cache = FileDigestCache()
+  with record_stats() as stats:
+    cache.digest_many([path, tmp_path / 'missing'])
+    cache.digest(path)
+  assert (stats.files_checked, stats.files_hashed, stats.bytes_hashed) == (3, 1, 100)
@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pytest
+
+from craftr.core.util.watch import FileWatcher, InotifyWatcher, PollingWatcher, wait_for_changes
+
+
+def _make_watcher(kind: str):
+  if kind == 'inotify':
+    try:
+      return InotifyWatcher()
+    except OSError:
+      pytest.skip('inotify is not available')
+  return PollingWatcher(0.01)
+
+
+@pytest.mark.parametrize('kind', ['inotify', 'polling'])
+def test_watcher(kind, tmp_path):
+  a = tmp_path / 'a.txt'
+  b = tmp_path / 'b.txt'
+  a.write_text('a')
+  with _make_watcher(kind) as watcher:
+    watcher.watch([a, b])
+    assert watcher.poll(0.05) == set()
+    (tmp_path / 'other.txt').write_text('x')
+    a.write_text('aa')
+    assert watcher.poll(1) == {a}
+    b.write_text('b')
+    assert watcher.poll(1) == {b}
+
+
+@pytest.mark.parametrize('kind', ['inotify', 'polling'])
+def test_wait_for_changes_coalesces_bursts(kind, tmp_path):
+  files = [tmp_path / f'{i}.txt' for i in range(3)]
+
+  def _write() -> None:
+    for i, path in enumerate(files):
+      path.write_text(str(i))
+      time.sleep(0.02)
+
+  with _make_watcher(kind) as watcher:
+    watcher.watch(files)
+    thread = threading.Thread(target=_write)
+    thread.start()
+    assert wait_for_changes(watcher, 0.2) == set(files)
+    thread.join()
+
+
+@pytest.mark.parametrize('kind', ['inotify', 'polling'])
+def test_watcher_watches_directories_recursively(kind, tmp_path):
+  src = tmp_path / 'src'
+  (src / 'sub').mkdir(parents=True)
+  (src / 'sub' / 'a.c').write_text('a')
+  with _make_watcher(kind) as watcher:
+    watcher.watch([src])
+    assert watcher.poll(0.05) == set()
+    (tmp_path / 'other.txt').write_text('x')
+    (src / 'sub' / 'a.c').write_text('aa')
+    assert watcher.poll(1) == {src}
+    (src / 'new').mkdir()
+    assert watcher.poll(1) == {src}
+    (src / 'new' / 'b.c').write_text('b')
+    assert watcher.poll(1) == {src}
+
+
+def test_file_watcher_is_abstract():
+  with pytest.raises(TypeError):
+    FileWatcher()
@@ -0,0 +1,64 @@
+
+import pytest
+from craftr.dsl import cache as cache_module
+from craftr.dsl.cache import CodeCache
+from craftr.dsl.runtime import Closure
+from craftr.dsl.transpiler import TranspileOptions
+
+code = """
+task "foobar" do: {
+  def n_times = 1
+  return n_times
+}
+"""
+
+
+def test_code_cache(tmp_path, monkeypatch):
+  options = Closure.get_options()
+  first = CodeCache(tmp_path).compile(code, 'build.craftr', options)
+  assert list(tmp_path.glob('*/*'))
+
+  def _fail(*args, **kwargs):
+    raise AssertionError('the code should be loaded from the cache')
+
+  monkeypatch.setattr(cache_module, 'transpile_to_ast', _fail)
+  cache = CodeCache(tmp_path)
+  second = cache.compile(code, 'build.craftr', Closure.get_options())
+  assert second == first
+  assert second.co_filename == 'build.craftr'
+  assert cache.compile(code, 'build.craftr', Closure.get_options()) is second
+
+  with pytest.raises(AssertionError):
+    cache.compile(code, 'other.craftr', options)
+  with pytest.raises(AssertionError):
+    cache.compile(code, 'build.craftr', TranspileOptions())
+
+  scope = {}
+  exec(CodeCache(tmp_path).compile('x = 42', 'build.craftr.py'), scope)
+  assert scope['x'] == 42
+
+
+def test_code_cache_ignores_invalid_entries(tmp_path):
+  cache = CodeCache(tmp_path)
+  key = cache.get_key('x = 1', '<string>', None)
+  path = tmp_path / key[:2] / key[2:]
+  path.parent.mkdir()
+  path.write_bytes(b'garbage')
+  scope = {}
+  exec(cache.compile('x = 1'), scope)
+  assert scope['x'] == 1
+
+
+def test_code_cache_evicts_least_recently_used_code(tmp_path):
+  cache = CodeCache(memory_size=2)
+  a = cache.compile('a = 1')
+  b = cache.compile('b = 1')
+  assert cache.compile('a = 1') is a
+  cache.compile('c = 1')
+  assert cache.compile('a = 1') is a
+  assert cache.compile('b = 1') is not b
+
+
+def test_default_cache_is_isolated_in_tests(tmp_path):
+  directory = cache_module.default_cache().directory
+  assert directory is not None and 'code-cache' in directory.name
@@ -0,0 +1,47 @@
+import shutil
+import typing as t
+
+import pytest
+
+from craftr.build.plugins.cxx import CompileTask
+from craftr.core.context import Context
+from craftr.core.impl.DefaultTaskGraphExecutor import DefaultTaskGraphExecutor
+from craftr.core.project import Project
+from craftr.core.settings import Settings
+
+
+def _build(tmp_path) -> t.Tuple[Context, CompileTask]:
+  context = Context(settings=Settings.of({'core.build_directory': str(tmp_path / 'build')}))
+  project = Project(context, None, tmp_path)
+  context._root_project = project
+  task = project.task('main', CompileTask)
+  task.sources.set([tmp_path / 'a.c', tmp_path / 'main.c'])
+  project.finalize()
+  graph = context.create_graph()
+  graph.add(task)
+  graph.finalize()
+  DefaultTaskGraphExecutor().execute(graph)
+  return context, task
+
+
+@pytest.mark.skipif(shutil.which('gcc') is None, reason='gcc is not installed')
+def test_compile_task_recompiles_objects_of_changed_headers(tmp_path, capsys):
+  (tmp_path / 'a.h').write_text('#define A 1\n')
+  (tmp_path / 'a.c').write_text('#include "a.h"\nint a(void) { return A; }\n')
+  (tmp_path / 'main.c').write_text('int a(void);\nint main(void) { return a(); }\n')
+
+  _context, task = _build(tmp_path)
+  a_o, main_o = task._get_objects_paths()
+  executable = task._get_executable_path()
+  mtimes = [x.stat().st_mtime_ns for x in (a_o, main_o, executable)]
+
+  capsys.readouterr()
+  _build(tmp_path)
+  assert 'UP TO DATE' in capsys.readouterr().out
+  assert [x.stat().st_mtime_ns for x in (a_o, main_o, executable)] == mtimes
+
+  (tmp_path / 'a.h').write_text('#define A 2\n')
+  _build(tmp_path)
+  assert a_o.stat().st_mtime_ns != mtimes[0]
+  assert main_o.stat().st_mtime_ns == mtimes[1]
+  assert executable.stat().st_mtime_ns != mtimes[2]
@@ -0,0 +1,59 @@
+import os
+import socket
+import sys
+import threading
+
+import pytest
+
+from craftr.__main__ import parser
+from craftr.core.settings import Settings
+from craftr.daemon import DaemonServer, _LoadedBuild, _recv_fds, _send_fds
+from craftr.core.util.remote import recv_message, send_message
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='daemon requires Unix sockets')
+
+
+def test_daemon_writes_to_client_fds(tmp_path, monkeypatch):
+  # The daemon redirects the file descriptors, so Python's streams must write to them directly.
+  monkeypatch.setattr(sys, 'stdout', open(1, 'w', closefd=False))
+  monkeypatch.setattr(sys, 'stderr', open(2, 'w', closefd=False))
+  server = DaemonServer(tmp_path / 'daemon.sock', tmp_path)
+  client, conn = socket.socketpair(socket.AF_UNIX)
+  read_fd, write_fd = os.pipe()
+  try:
+    thread = threading.Thread(target=server._handle, args=(conn, parser))
+    thread.start()
+    _send_fds(client, [write_fd, write_fd])
+    send_message(client, {'type': 'run', 'argv': ['--help']})
+    assert recv_message(client) == {'returncode': 0}
+    thread.join()
+    os.close(write_fd)
+    with os.fdopen(read_fd) as fp:
+      assert '--daemon' in fp.read()
+  finally:
+    client.close()
+    conn.close()
+
+
+def test_recv_fds_without_fds():
+  a, b = socket.socketpair(socket.AF_UNIX)
+  with a, b:
+    _send_fds(a, [])
+    assert _recv_fds(b, 2) == []
+
+
+def test_loaded_build_is_current(tmp_path):
+  (tmp_path / 'build.craftr').write_text("glob('src/*.c')\n")
+  (tmp_path / 'src').mkdir()
+  settings = Settings.of({})
+  environ = {'PATH': '/usr/bin'}
+  build = _LoadedBuild(settings, tmp_path, environ)
+  assert build.is_current(Settings.of({}), tmp_path, dict(environ))
+  assert not build.is_current(Settings.of({'a': 'b'}), tmp_path, environ)
+  assert not build.is_current(settings, tmp_path / 'src', environ)
+  assert not build.is_current(settings, tmp_path, {'PATH': '/bin'})
+
+  # A file that matches the glob of the build script must reload the projects.
+  (tmp_path / 'src' / 'main.c').write_text('')
+  os.utime(tmp_path / 'src', ns=(0, 0))
+  assert not build.is_current(settings, tmp_path, environ)
@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+from craftr.__main__ import main
+from craftr.core.context import Context
+
+
+@pytest.mark.parametrize('argv', [[], ['--configuration-cache']])
+def test_affected_by_uses_the_cached_index_without_loading_projects(tmp_path, monkeypatch, argv):
+  (tmp_path / 'build.craftr').write_text("glob('src/*.c')\n")
+  (tmp_path / 'src').mkdir()
+  (tmp_path / 'src' / 'a.c').write_text('')
+  monkeypatch.chdir(tmp_path)
+  main(argv + ['--affected-by', 'src/a.c'])
+  if argv:
+    main(argv + ['--affected-by', 'src/a.c'])  # Restores the projects from the configuration cache.
+
+  loaded = []
+  load_project = Context.load_project
+  monkeypatch.setattr(Context, 'load_project', lambda self, path: (loaded.append(path), load_project(self, path))[1])
+  main(argv + ['--affected-by', 'src/a.c'])
+  assert loaded == []
+
+  # A new file in a globbed directory invalidates the index.
+  (tmp_path / 'src' / 'b.c').write_text('')
+  os.utime(tmp_path / 'src', ns=(0, 0))
+  main(argv + ['--affected-by', 'src/a.c'])
+  assert loaded == [tmp_path]
+  main(argv + ['--affected-by', 'src/a.c'])
+  assert loaded == [tmp_path]